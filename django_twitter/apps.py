@@ -20,3 +20,7 @@ class DjangoTwitterConfig(AppConfig):
 
     def ready(self):
         self.update_settings()
+
+        from django_twitter.utils import load_concrete_models
+
+        load_concrete_models()
@@ -0,0 +1,113 @@
+from __future__ import print_function
+
+import os
+import threading
+import traceback
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from queue import Queue
+from tqdm import tqdm
+
+from django import db
+
+
+def write_inline(func, *args, **kwargs):
+    """
+    The default `write` function for the data collection functions in Django Twitter's management commands, \
+    which simply runs each database write in the current thread.
+    """
+
+    return func(*args, **kwargs)
+
+
+class ConcurrentCollector(object):
+    """
+    Runs a data collection function over many profiles at once, in a single process. Collecting data from the \
+    API is network-bound, so each profile gets handled by one of `concurrency` threads; database writes get handed \
+    off to a small number of dedicated writer threads, so having hundreds of profiles in flight doesn't require \
+    hundreds of database connections. Collection functions must accept a `write` keyword argument, and use it to \
+    run all of their database operations (i.e. `write(func, *args, **kwargs)`).
+
+    :param concurrency: (Optional) Number of profiles to collect at once (default 8)
+    :param db_writers: (Optional) Number of threads writing to the database (default 1)
+    :param no_progress_bar: (Optional) Disables the default `tqdm` progress bar
+    """
+
+    def __init__(self, concurrency=8, db_writers=1, no_progress_bar=False):
+
+        self.concurrency = max(1, concurrency)
+        self.db_writers = max(1, db_writers)
+        self.no_progress_bar = no_progress_bar
+        self.write_queue = Queue(maxsize=self.concurrency * 2)
+
+    def write(self, func, *args, **kwargs):
+        """
+        Runs `func(*args, **kwargs)` on one of the database writer threads, and waits for the result.
+        """
+
+        future = Future()
+        self.write_queue.put((future, func, args, kwargs))
+        return future.result()
+
+    def run(self, func, twitter_ids, *args, **kwargs):
+        """
+        Calls `func(twitter_id, *args, write=self.write, **kwargs)` for each Twitter ID.
+
+        :param func: A data collection function
+        :param twitter_ids: A list of Twitter IDs
+        :return: The number of profiles that raised an error
+        """
+
+        writers = [
+            threading.Thread(target=self._run_writer) for _ in range(self.db_writers)
+        ]
+        for writer in writers:
+            writer.daemon = True
+            writer.start()
+
+        errors = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = {
+                    executor.submit(
+                        func, twitter_id, *args, write=self.write, **kwargs
+                    ): twitter_id
+                    for twitter_id in twitter_ids
+                }
+                for future in tqdm(
+                    as_completed(futures),
+                    total=len(futures),
+                    disable=self.no_progress_bar
+                    or os.environ.get("DISABLE_TQDM", False),
+                ):
+                    try:
+                        future.result()
+                    except Exception:
+                        errors += 1
+                        print(
+                            "Error collecting data for {}: {}".format(
+                                futures[future], traceback.format_exc()
+                            )
+                        )
+        finally:
+            for _ in writers:
+                self.write_queue.put(None)
+            for writer in writers:
+                writer.join()
+
+        return errors
+
+    def _run_writer(self):
+
+        try:
+            while True:
+                task = self.write_queue.get()
+                if task is None:
+                    break
+                future, func, args, kwargs = task
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            db.connections.close_all()
@@ -0,0 +1,138 @@
+from __future__ import print_function
+
+import io
+import itertools
+import json
+import threading
+import tweepy
+
+from collections import OrderedDict
+from django.conf import settings
+from pewhooks.twitter import TwitterAPIHandler
+
+from django_twitter.ratelimit import get_credential_label
+
+
+# API error codes that mean there's something wrong with the credentials themselves, rather than the request
+# (could not authenticate, account suspended, invalid or expired token, bad authentication data, account locked)
+CREDENTIAL_ERROR_CODES = set([32, 64, 89, 215, 326])
+
+
+def load_credentials(credentials_file=None):
+    """
+    Loads a list of API credentials, from a JSON file if one is provided, otherwise from the \
+    `TWITTER_CREDENTIALS` setting. Either way, the credentials should be a list of dictionaries with \
+    `api_key`, `api_secret`, `access_token` and `access_secret` keys, and optionally a `name` to identify them by \
+    in log messages and rate limit budgets.
+
+    :param credentials_file: (Optional) Path to a JSON file
+    :return: A list of dictionaries, or None if no credentials have been configured
+    """
+
+    if credentials_file:
+        with io.open(credentials_file, "r") as infile:
+            return json.load(infile)
+    return getattr(settings, "TWITTER_CREDENTIALS", None)
+
+
+class CredentialPool(object):
+    """
+    A stand-in for a single `TwitterAPIHandler` that spreads requests across several sets of API credentials. \
+    Each attribute lookup (e.g. `pool.get_profile(...)` or `pool.api`) goes to the next set of credentials in \
+    round-robin order, so the collection functions in Django Twitter's commands can use a pool wherever they'd \
+    normally use a handler. Each set of credentials gets its own rate limit budget, and if the API rejects a set \
+    of credentials (e.g. because the account has been suspended), it gets taken out of the pool and the request \
+    is retried with the next one.
+
+    :param credentials: A list of dictionaries of credentials (see `load_credentials`)
+    :param rate_limiter: (Optional) A `RateLimiter` to install on each handler
+    """
+
+    def __init__(self, credentials, rate_limiter=None):
+
+        self.handlers = OrderedDict()
+        self.disabled = {}
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        for credential in credentials:
+            credential = dict(credential)
+            name = credential.pop("name", None)
+            handler = TwitterAPIHandler(**credential)
+            name = name or get_credential_label(handler.api.auth)
+            if rate_limiter:
+                rate_limiter.install(handler, credential=name)
+            self._install_failover(handler, name)
+            self.handlers[name] = handler
+
+    def __getattr__(self, name):
+
+        if name.startswith("_") or name in ["handlers", "disabled", "lock", "counter"]:
+            raise AttributeError(name)
+        return getattr(self.get_handler(), name)
+
+    def get_handler(self):
+        """
+        :return: The next `TwitterAPIHandler` in the pool whose credentials haven't been disabled
+        """
+
+        with self.lock:
+            active = [h for n, h in self.handlers.items() if n not in self.disabled]
+            if not active:
+                raise RuntimeError(
+                    "All of the credentials in the pool have been disabled: {}".format(
+                        self.disabled
+                    )
+                )
+            return active[next(self.counter) % len(active)]
+
+    def disable(self, name, error_code):
+        """
+        Takes a set of credentials out of the pool.
+
+        :param name: The name of the credentials
+        :param error_code: The error code the API returned
+        """
+
+        with self.lock:
+            if name not in self.disabled:
+                self.disabled[name] = error_code
+                print(
+                    "Disabling credentials {} (error code {}), {} remaining".format(
+                        name, error_code, len(self.handlers) - len(self.disabled)
+                    )
+                )
+
+    def _install_failover(self, handler, name):
+
+        api = handler.api
+        request = api.request
+
+        def failover_request(method, endpoint, *args, **kwargs):
+            try:
+                return request(method, endpoint, *args, **kwargs)
+            except tweepy.errors.HTTPException as e:
+                codes = CREDENTIAL_ERROR_CODES.intersection(e.api_codes)
+                if not codes:
+                    raise
+                self.disable(name, codes.pop())
+                return self.get_handler().api.request(
+                    method, endpoint, *args, **kwargs
+                )
+
+        api.request = failover_request
+
+
+def get_credential_pool(credentials_file=None, rate_limiter=None, **credentials):
+    """
+    Creates a `CredentialPool` for a command. If a pool of credentials has been configured (see \
+    `load_credentials`) it'll be used; otherwise the pool will just contain the credentials passed in, which \
+    `TwitterAPIHandler` will fill in from your environment variables if they're missing.
+
+    :param credentials_file: (Optional) Path to a JSON file of credentials
+    :param rate_limiter: (Optional) A `RateLimiter` to install on each handler
+    :param credentials: `api_key`, `api_secret`, `access_token` and `access_secret`
+    :return: A `CredentialPool`
+    """
+
+    pool = load_credentials(credentials_file) or [credentials]
+    return CredentialPool(pool, rate_limiter=rate_limiter)
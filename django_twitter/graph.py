@@ -0,0 +1,213 @@
+from __future__ import division
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from django_twitter.utils import get_concrete_model
+
+
+RELATIONS = {
+    "followers": "AbstractTwitterFollowerList",
+    "followings": "AbstractTwitterFollowingList",
+}
+
+
+class FollowerGraph(object):
+    """
+    A sparse adjacency matrix of the followers (or followings) of a set of profiles, built from each profile's \
+    most recently finished list. Rows correspond to the profiles in the set and columns to every profile that \
+    appears on any of their lists, which are numbered with compact integer IDs; a 1 in row `i` and column `j` \
+    means that profile `j` follows profile `i` (or, for followings, that profile `i` follows profile `j`). Use \
+    `FollowerGraph.from_profiles` to build one.
+
+    :param profile_ids: An array of the Twitter IDs of the profiles in the set (the rows)
+    :param node_ids: A sorted array of the Twitter IDs of the profiles on their lists (the columns), as integers
+    :param matrix: A `scipy.sparse.csr_matrix` of shape `(len(profile_ids), len(node_ids))`
+    :param list_ids: (Optional) The primary keys of the lists the matrix was built from
+    """
+
+    def __init__(self, profile_ids, node_ids, matrix, list_ids=None):
+
+        self.profile_ids = np.asarray(profile_ids)
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.matrix = matrix.tocsr()
+        self.list_ids = np.asarray(list_ids if list_ids is not None else [])
+
+    @classmethod
+    def from_profiles(cls, profiles, relation="followers", cache_path=None):
+        """
+        Builds a graph from the most recently finished follower or following lists of a set of profiles (see \
+        `TwitterProfileListManager.iterate_current_twitter_ids`). Profiles without a finished list get an empty row.
+
+        :param profiles: A QuerySet of TwitterProfiles
+        :param relation: (Optional) "followers" (default) or "followings"
+        :param cache_path: (Optional) Path to a `.npz` file to cache the graph in. If the file exists and was \
+        built from the same lists, it gets loaded instead of querying the lists again; otherwise it's overwritten.
+        :return: A `FollowerGraph`
+        """
+
+        TwitterList = get_concrete_model(RELATIONS[relation])
+
+        profile_pks, profile_ids = [], []
+        for pk, twitter_id in profiles.order_by("pk").values_list("pk", "twitter_id"):
+            profile_pks.append(pk)
+            profile_ids.append(twitter_id)
+        profile_ids = np.array(profile_ids)
+        list_ids = sorted(
+            TwitterList.objects.current_lists(profiles).values_list("pk", flat=True)
+        )
+
+        if cache_path and os.path.exists(cache_path):
+            graph = cls.load(cache_path)
+            if np.array_equal(graph.list_ids, np.array(list_ids)) and np.array_equal(
+                graph.profile_ids, profile_ids
+            ):
+                return graph
+
+        rows, columns = [], []
+        row_index = dict((p, i) for i, p in enumerate(profile_pks))
+        for profile_pk, twitter_ids in TwitterList.objects.iterate_current_twitter_ids(
+            profiles
+        ):
+            rows.extend([row_index[profile_pk]] * len(twitter_ids))
+            columns.extend(twitter_ids)
+
+        node_ids, columns = np.unique(
+            np.array(columns, dtype=np.int64), return_inverse=True
+        )
+        matrix = sparse.csr_matrix(
+            (np.ones(len(columns), dtype=np.int32), (rows, columns)),
+            shape=(len(profile_ids), len(node_ids)),
+        )
+        # Duplicate rows in a through table would otherwise get summed
+        matrix.data[:] = 1
+
+        graph = cls(profile_ids, node_ids, matrix, list_ids=list_ids)
+        if cache_path:
+            graph.save(cache_path)
+        return graph
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Path to a file written by `save`
+        :return: A `FollowerGraph`
+        """
+
+        data = np.load(path, allow_pickle=False)
+        matrix = sparse.csr_matrix(
+            (data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"])
+        )
+        return cls(data["profile_ids"], data["node_ids"], matrix, data["list_ids"])
+
+    def save(self, path):
+        """
+        :param path: Path to save the graph to, as a `.npz` file
+        """
+
+        np.savez_compressed(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            profile_ids=self.profile_ids.astype(str),
+            node_ids=self.node_ids,
+            list_ids=self.list_ids,
+        )
+
+    def overlap_matrix(self, normalize=None):
+        """
+        :param normalize: (Optional) "jaccard" to divide each count by the size of the union of the two lists
+        :return: A DataFrame of the number of profiles that each pair of profiles in the set have in common, \
+        indexed by Twitter ID in both directions
+        """
+
+        overlap = (self.matrix @ self.matrix.T).toarray().astype(float)
+        if normalize == "jaccard":
+            sizes = np.asarray(self.matrix.sum(axis=1)).ravel()
+            union = sizes[:, None] + sizes[None, :] - overlap
+            overlap = np.divide(
+                overlap, union, out=np.zeros_like(overlap), where=union > 0
+            )
+        return pd.DataFrame(overlap, index=self.profile_ids, columns=self.profile_ids)
+
+    def in_set_matrix(self):
+        """
+        :return: A sparse square matrix restricted to the profiles in the set, where entry `(i, k)` is 1 if \
+        profile `k` in the set is on profile `i`'s list
+        """
+
+        if not len(self.node_ids):
+            return sparse.csr_matrix((len(self.profile_ids), len(self.profile_ids)))
+        ids = np.array(
+            [int(p) if str(p).isdigit() else -1 for p in self.profile_ids],
+            dtype=np.int64,
+        )
+        positions = np.minimum(
+            np.searchsorted(self.node_ids, ids), len(self.node_ids) - 1
+        )
+        present = self.node_ids[positions] == ids
+        selector = sparse.csr_matrix(
+            (
+                np.ones(present.sum(), dtype=np.int32),
+                (positions[present], np.where(present)[0]),
+            ),
+            shape=(len(self.node_ids), len(ids)),
+        )
+        return (self.matrix @ selector).tocsr()
+
+    def in_set_degree(self):
+        """
+        :return: A DataFrame indexed by Twitter ID, with the number of other profiles in the set on each \
+        profile's list (`in_set`), and the number of lists in the set that each profile is on (`on_lists`)
+        """
+
+        in_set = self.in_set_matrix()
+        return pd.DataFrame(
+            {
+                "in_set": np.asarray(in_set.sum(axis=1)).ravel(),
+                "on_lists": np.asarray(in_set.sum(axis=0)).ravel(),
+            },
+            index=self.profile_ids,
+        )
+
+    def reciprocity(self):
+        """
+        :return: A DataFrame indexed by Twitter ID, with the number of mutual relationships each profile has with \
+        other profiles in the set (`mutual`), and the share of the in-set profiles on its list that it's mutual with \
+        (`reciprocity`)
+        """
+
+        in_set = self.in_set_matrix()
+        mutual = np.asarray(in_set.multiply(in_set.T).sum(axis=1)).ravel()
+        total = np.asarray(in_set.sum(axis=1)).ravel()
+        return pd.DataFrame(
+            {
+                "mutual": mutual,
+                "reciprocity": np.divide(
+                    mutual,
+                    total,
+                    out=np.zeros(len(total), dtype=float),
+                    where=total > 0,
+                ),
+            },
+            index=self.profile_ids,
+        )
+
+    def top_shared(self, n=100, min_lists=2):
+        """
+        :param n: (Optional) The number of profiles to return (default 100)
+        :param min_lists: (Optional) Only include profiles that are on at least this many lists (default 2)
+        :return: A Series of the profiles that are on the most lists in the set (e.g. the top shared followers), \
+        indexed by Twitter ID
+        """
+
+        counts = np.asarray(self.matrix.sum(axis=0)).ravel()
+        top = np.argsort(-counts, kind="stable")[:n]
+        top = top[counts[top] >= min_lists]
+        return pd.Series(counts[top], index=self.node_ids[top].astype(str))
@@ -3,6 +3,12 @@ import django
 import tweepy
 import json
 import datetime
+import gzip
+import os
+import threading
+import time
+
+from collections import deque
 
 from django import db
 from django.apps import apps
@@ -12,7 +18,8 @@ from django_pewtils import reset_django_connection, reset_django_connection_wrap
 from multiprocessing import Pool
 from pewhooks.twitter import TwitterAPIHandler
 
-from django_twitter.utils import safe_get_or_create
+from django_twitter.spool import SpoolWriter
+from django_twitter.utils import get_concrete_model, safe_get_or_create
 
 
 allowable_limit_types = {
@@ -33,6 +40,25 @@ class Command(BaseCommand):
 
     :param num_cores: (Optional) Number of cores to use for processes that save the tweets to the database (default 2)
     :param queue_size: (Optional) Size of the batches of tweets that will be sent to each data-saving proceess (default 500)
+    :param max_pending_batches: (Optional) Maximum number of batches that can be waiting to be saved at any one \
+    time, which puts a ceiling on the stream's memory usage (default is twice `num_cores`)
+    :param full_queue_policy: (Optional) What to do with a new batch when `max_pending_batches` are already \
+    waiting to be saved: `block` pauses the stream until a batch finishes saving, `spill` writes the batch to a \
+    gzipped JSONL file in `spill_directory` (which can be loaded later with `django_twitter_load_jsonl`), and \
+    `drop` discards it (default `block`)
+    :param spill_directory: (Optional) Where to write spilled batches (defaults to the current directory)
+    :param flush_seconds: (Optional) If provided, whatever tweets are waiting in the current batch will be sent \
+    off to be saved every `flush_seconds` seconds, even if the batch isn't full yet. Time-based limits will also \
+    be checked on this interval, rather than only when a batch fills up. Useful for low-volume streams.
+    :param spool_directory: (Optional) If provided, tweets won't be saved to the database by this command; \
+    instead, they'll be appended to segment files in this directory as soon as they're received, and you can save \
+    them with `django_twitter_replay_spool` (which can run alongside the stream). Nothing gets lost if the stream \
+    crashes, and the stream can keep up no matter how slow the database is.
+    :param spool_segment_size: (Optional) Number of tweets to write to each spool segment (default 10000)
+    :param delete_policy: (Optional) What to do when the stream sends a notice that a tweet was deleted: `flag` \
+    sets `is_deleted` on the tweet, `delete` removes it from the database, and `ignore` does nothing (default \
+    `flag`). Notices are applied in batches of `queue_size`; notices for tweets that haven't been saved yet are \
+    stored in your app's `AbstractTweetDeleteNotice` model (if it has one) and applied when the tweets get saved.
     :param keyword_query: (Optional) Query to use to filter tweets in the stream
     :param test: Use when testing to avoid resetting DB connections
 
@@ -53,6 +79,23 @@ class Command(BaseCommand):
 
         parser.add_argument("--num_cores", type=int, default=2)
         parser.add_argument("--queue_size", type=int, default=500)
+        parser.add_argument("--max_pending_batches", type=int, default=None)
+        parser.add_argument(
+            "--full_queue_policy",
+            type=str,
+            default="block",
+            choices=["block", "spill", "drop"],
+        )
+        parser.add_argument("--spill_directory", type=str)
+        parser.add_argument("--flush_seconds", type=int, default=None)
+        parser.add_argument("--spool_directory", type=str)
+        parser.add_argument("--spool_segment_size", type=int, default=10000)
+        parser.add_argument(
+            "--delete_policy",
+            type=str,
+            default="flag",
+            choices=["flag", "delete", "ignore"],
+        )
         parser.add_argument("--keyword_query", type=str)
         parser.add_argument(
             "--limit",
@@ -135,15 +178,30 @@ class Command(BaseCommand):
             profile_set=options["add_to_profile_set"],
             num_cores=options["num_cores"],
             queue_size=options["queue_size"],
+            max_pending_batches=options["max_pending_batches"],
+            full_queue_policy=options["full_queue_policy"],
+            spill_directory=options["spill_directory"],
+            flush_seconds=options["flush_seconds"],
+            spool=SpoolWriter(
+                options["spool_directory"], segment_size=options["spool_segment_size"]
+            )
+            if options["spool_directory"]
+            else None,
+            delete_policy=options["delete_policy"],
             limit=self.limit,
             test=options["test"],
         )
 
-        self.twitter.capture_stream_sample(
-            stream,
-            use_async=False,
-            keywords=[options["keyword_query"]] if options["keyword_query"] else None,
-        )
+        try:
+            self.twitter.capture_stream_sample(
+                stream,
+                use_async=False,
+                keywords=[options["keyword_query"]]
+                if options["keyword_query"]
+                else None,
+            )
+        finally:
+            stream.close()
 
 
 class Stream(tweepy.Stream):
@@ -154,6 +212,12 @@ class Stream(tweepy.Stream):
         profile_set=None,
         num_cores=2,
         queue_size=500,
+        max_pending_batches=None,
+        full_queue_policy="block",
+        spill_directory=None,
+        flush_seconds=None,
+        spool=None,
+        delete_policy="flag",
         limit=None,
         test=False,
         **kwargs,
@@ -168,8 +232,31 @@ class Stream(tweepy.Stream):
         self.tweet_queue = []
         self.pool = Pool(processes=num_cores)
         self.num_cores = num_cores
+        self.writer = WriterQueue(
+            self.pool if num_cores > 1 else None,
+            max_pending=max_pending_batches
+            if max_pending_batches
+            else num_cores * 2,
+            policy=full_queue_policy,
+            spill_directory=spill_directory,
+        )
+        self.spool = spool
+        self.delete_policy = delete_policy
+        self.delete_queue = []
         self.scanned_counter = 0
         self.processed_counter = 0
+        self.closed = False
+
+        # The flush timer runs in its own thread, so the queue needs a lock
+        self.queue_lock = threading.RLock()
+        self.flush_seconds = flush_seconds
+        self.last_flush_time = time.time()
+        self.flush_timer = None
+        self.stop_flush_timer = threading.Event()
+        if self.flush_seconds:
+            self.flush_timer = threading.Thread(target=self._run_flush_timer)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
 
         super(Stream, self).__init__(*args, **kwargs)
         print("Stream initialized")
@@ -177,11 +264,22 @@ class Stream(tweepy.Stream):
     def on_data(self, data):
 
         try:
-            data = json.loads(data)
+            raw_data = data.decode("utf8") if isinstance(data, bytes) else data
+            data = json.loads(raw_data)
 
             if "delete" in data:
-                delete = data["delete"]["status"]
-                return self.on_delete(delete["id"], delete["user_id"])
+                with self.queue_lock:
+                    if self.closed:
+                        return False
+                    if self.delete_policy == "ignore":
+                        return True
+                    if self.spool:
+                        self.spool.write(raw_data)
+                    else:
+                        self.delete_queue.append(data)
+                        if len(self.delete_queue) >= self.queue_size:
+                            self.flush_deletes()
+                return True
             elif "disconnect" in data:
                 return self.on_disconnect_message(data["disconnect"])
             elif "limit" in data:
@@ -196,63 +294,21 @@ class Stream(tweepy.Stream):
                 return self.on_warning(data["warning"])
             else:
 
-                self.scanned_counter += 1
-                self.tweet_queue.append(data)
-                if len(self.tweet_queue) >= self.queue_size:
-
-                    if self.num_cores > 1:
-                        self.pool.apply_async(
-                            save_tweets,
-                            args=[
-                                list(self.tweet_queue),
-                                self.tweet_set,
-                                self.profile_set,
-                                self.test,
-                            ],
-                        )
-                    else:
-                        save_tweets(
-                            list(self.tweet_queue),
-                            self.tweet_set,
-                            self.profile_set,
-                            self.test,
-                        )
-                        # TODO: Latest version of Django is causing errors with multiprocessing; need to fix
-                        # self.pool.apply(
-                        #     save_tweets,
-                        #     args=[
-                        #         list(self.tweet_queue),
-                        #         self.tweet_set,
-                        #         self.profile_set,
-                        #         self.test,
-                        #     ],
-                        # )
-
-                    self.tweet_queue = []
-                    self.processed_counter += self.queue_size
-                    print(
-                        "{} tweets scanned, {} sent for processing".format(
-                            self.scanned_counter, self.processed_counter
-                        )
-                    )
-                    if self.limit_exceeded():
-                        # wait for db connections
-                        try:
-                            self.pool.close()
-                        except Exception as e:
-                            print("WOMP: {}".format(e))
-                        try:
-                            self.pool.join()
-                        except Exception as e:
-                            print("WOMPIER: {}".format(e))
-                        if not self.test:
-                            db.connections.close_all()
-                        self.disconnect()
+                with self.queue_lock:
+                    if self.closed:
                         return False
+                    self.scanned_counter += 1
+                    if self.spool:
+                        self.spool.write(raw_data)
                     else:
-                        return True
-                else:
-                    return True
+                        self.tweet_queue.append(data)
+                    if self.scanned_counter - self.processed_counter >= self.queue_size:
+                        self.flush()
+                        if self.limit_exceeded():
+                            self.close()
+                            self.disconnect()
+                            return False
+                return True
 
         except Exception as e:
 
@@ -263,6 +319,109 @@ class Stream(tweepy.Stream):
 
             return True
 
+    def flush(self):
+        """
+        Sends whatever tweets are currently in the queue off to be saved, or syncs them to disk if the stream \
+        is writing to a spool.
+        """
+
+        with self.queue_lock:
+            self.last_flush_time = time.time()
+            self.flush_deletes()
+            if self.closed or self.scanned_counter == self.processed_counter:
+                return
+            if self.spool:
+                self.spool.flush()
+                self.processed_counter = self.scanned_counter
+                print(
+                    "{} tweets scanned and written to the spool".format(
+                        self.scanned_counter
+                    )
+                )
+                return
+            # Batches are saved synchronously if num_cores is 1
+            # TODO: Latest version of Django is causing errors with multiprocessing; need to fix
+            self.writer.submit(
+                save_tweets,
+                list(self.tweet_queue),
+                self.tweet_set,
+                self.profile_set,
+                self.test,
+            )
+            self.processed_counter += len(self.tweet_queue)
+            self.tweet_queue = []
+            stats = self.writer.stats()
+            print(
+                "{} tweets scanned, {} sent for processing ({} batches pending, {} dropped, {} spilled, "
+                "{:.1f}s average save time)".format(
+                    self.scanned_counter,
+                    self.processed_counter,
+                    stats["pending_batches"],
+                    stats["dropped_batches"],
+                    stats["spilled_batches"],
+                    stats["average_latency"],
+                )
+            )
+
+    def flush_deletes(self):
+        """
+        Sends whatever delete notices are currently in the queue off to be applied.
+        """
+
+        with self.queue_lock:
+            if self.closed or not self.delete_queue:
+                return
+            self.writer.submit(
+                save_deletes,
+                list(self.delete_queue),
+                self.delete_policy == "delete",
+                self.test,
+                block=True,
+            )
+            self.delete_queue = []
+
+    def close(self):
+        """
+        Saves any remaining tweets and waits for all of the pending batches to finish saving.
+        """
+
+        with self.queue_lock:
+            if self.closed:
+                return
+            self.stop_flush_timer.set()
+            self.flush()
+            self.closed = True
+            if self.spool:
+                self.spool.close()
+            # wait for db connections
+            try:
+                self.pool.close()
+            except Exception as e:
+                print("WOMP: {}".format(e))
+            try:
+                self.pool.join()
+            except Exception as e:
+                print("WOMPIER: {}".format(e))
+            if not self.test:
+                db.connections.close_all()
+
+    def _run_flush_timer(self):
+
+        while not self.stop_flush_timer.wait(1):
+            with self.queue_lock:
+                if self.closed:
+                    return
+                if time.time() - self.last_flush_time >= self.flush_seconds:
+                    self.flush()
+                if self.limit["limit_type"] in [
+                    "minute",
+                    "hour",
+                    "day",
+                ] and self.limit_exceeded():
+                    self.close()
+                    self.disconnect()
+                    return
+
     def limit_exceeded(self):
         if self.limit["limit_type"] is None:
             return True
@@ -272,6 +431,133 @@ class Stream(tweepy.Stream):
             return datetime.datetime.now() >= self.limit["limit_time"]
 
 
+class WriterQueue(object):
+    """
+    A bounded queue of batches that are waiting to be saved by a process pool. Once `max_pending` batches are in \
+    flight, new batches are handled according to `policy` (`block`, `spill` or `drop`), so a stream that's \
+    receiving tweets faster than the database can save them won't keep using more and more memory.
+
+    :param pool: A `multiprocessing.Pool`; if None, batches are saved synchronously
+    :param max_pending: (Optional) Maximum number of batches waiting to be saved (default 4)
+    :param policy: (Optional) What to do with a batch when the queue is full: `block`, `spill` or `drop` \
+    (default `block`)
+    :param spill_directory: (Optional) Where to write spilled batches (defaults to the current directory)
+    """
+
+    def __init__(self, pool, max_pending=4, policy="block", spill_directory=None):
+
+        if policy not in ["block", "spill", "drop"]:
+            raise ValueError("Unknown full queue policy: {}".format(policy))
+
+        self.pool = pool
+        self.max_pending = max_pending
+        self.policy = policy
+        self.spill_directory = spill_directory if spill_directory else os.getcwd()
+
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending_batches = 0
+        self.completed_batches = 0
+        self.failed_batches = 0
+        self.dropped_batches = 0
+        self.dropped_tweets = 0
+        self.spilled_batches = 0
+        self.spill_files = []
+        self.latencies = deque(maxlen=100)
+
+    def submit(self, func, tweets, *args, **kwargs):
+        """
+        Sends a batch of tweets off to be saved with `func(tweets, *args)`.
+
+        :param func: The function that saves the batch
+        :param tweets: A list of tweet JSON
+        :param block: (Optional) Wait for room in the queue even if the policy is `spill` or `drop`. Used for \
+        delete notices, which are tiny and can't be replayed from spill files.
+        :return: True if the batch was queued (or saved), False if it was spilled or dropped
+        """
+
+        block = kwargs.get("block", False)
+
+        if not self.pool:
+            start = time.time()
+            func(tweets, *args)
+            self._finish(start)
+            return True
+
+        if not self.slots.acquire(block or self.policy == "block"):
+            with self.lock:
+                if self.policy == "spill":
+                    self._spill(tweets)
+                else:
+                    self.dropped_batches += 1
+                    self.dropped_tweets += len(tweets)
+            return False
+
+        with self.lock:
+            self.pending_batches += 1
+        start = time.time()
+        self.pool.apply_async(
+            func,
+            args=[tweets] + list(args),
+            callback=lambda result: self._release(start),
+            error_callback=lambda e: self._release(start, error=e),
+        )
+        return True
+
+    def stats(self):
+        """
+        :return: A dictionary with the current queue depth, the number of completed, failed, dropped and spilled \
+        batches, and the average and maximum number of seconds it took to save the last 100 batches
+        """
+
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                "pending_batches": self.pending_batches,
+                "max_pending_batches": self.max_pending,
+                "completed_batches": self.completed_batches,
+                "failed_batches": self.failed_batches,
+                "dropped_batches": self.dropped_batches,
+                "dropped_tweets": self.dropped_tweets,
+                "spilled_batches": self.spilled_batches,
+                "average_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+                "max_latency": max(latencies) if latencies else 0.0,
+            }
+
+    def _finish(self, start, error=None):
+
+        with self.lock:
+            self.latencies.append(time.time() - start)
+            if error:
+                self.failed_batches += 1
+                print("Error saving batch: {}".format(error))
+            else:
+                self.completed_batches += 1
+
+    def _release(self, start, error=None):
+
+        # Runs in the pool's result handler thread
+        with self.lock:
+            self.pending_batches -= 1
+        self._finish(start, error=error)
+        self.slots.release()
+
+    def _spill(self, tweets):
+
+        path = os.path.join(
+            self.spill_directory,
+            "stream_spill_{}_{}.jsonl.gz".format(
+                datetime.datetime.now().strftime("%Y%m%d%H%M%S"), self.spilled_batches
+            ),
+        )
+        with gzip.open(path, "wt") as outfile:
+            for tweet in tweets:
+                outfile.write(json.dumps(tweet) + "\n")
+        self.spilled_batches += 1
+        self.spill_files.append(path)
+        print("Writer queue is full; spilled {} tweets to {}".format(len(tweets), path))
+
+
 def save_tweets(tweets, tweet_set, profile_set, test):
 
     if not test:
@@ -286,20 +572,28 @@ def save_tweets(tweets, tweet_set, profile_set, test):
             "AbstractTwitterProfileSet", "name", profile_set, create=True
         )
 
-    success, error = 0, 0
-    for tweet_json in tweets:
-        try:
-            tweet = safe_get_or_create(
-                "AbstractTweet", "twitter_id", tweet_json["id_str"], create=True
-            )
-            tweet.update_from_json(tweet_json)
-            if tweet_set:
-                tweet_set.tweets.add(tweet)
-            if profile_set:
-                profile_set.profiles.add(tweet.profile)
-            success += 1
-        except django.db.utils.IntegrityError:
-            error += 1
+    saved = get_concrete_model("AbstractTweet").objects.ingest_json_batch(
+        tweets, tweet_set=tweet_set, profile_set=profile_set
+    )
+    success, error = len(saved), len(tweets) - len(saved)
 
     print("{} tweets saved, {} errored".format(success, error))
     return True
+
+
+def save_deletes(notices, hard_delete, test):
+
+    if not test:
+        reset_django_connection(settings.TWITTER_APP)
+
+    deleted, pending = get_concrete_model("AbstractTweet").objects.apply_deletes(
+        [notice["delete"]["status"]["id_str"] for notice in notices],
+        hard_delete=hard_delete,
+    )
+
+    print(
+        "{} deleted tweets {}, {} notices saved for later".format(
+            deleted, "removed" if hard_delete else "flagged", pending
+        )
+    )
+    return True
@@ -7,9 +7,12 @@ from django.core.management.base import BaseCommand
 from pewhooks.twitter import TwitterAPIHandler
 from django_pewtils import reset_django_connection
 
+from django_twitter.collectors import write_inline
 from django_twitter.utils import (
+    PROFILE_NOT_FOUND_ERROR_CODE,
     get_concrete_model,
     get_twitter_profile_json,
+    get_twitter_profiles_json,
     safe_get_or_create,
 )
 
@@ -61,18 +64,76 @@ class Command(BaseCommand):
         else:
             profile_set = None
 
-        print("Collecting profile data for {}".format(options["twitter_id"]))
-        twitter_json = get_twitter_profile_json(options["twitter_id"], self.twitter)
-        if twitter_json:
-            twitter_profile = safe_get_or_create(
-                "AbstractTwitterProfile", "twitter_id", twitter_json.id_str, create=True
-            )
-            snapshot = get_concrete_model(
-                "AbstractTwitterProfileSnapshot"
-            ).objects.create(profile=twitter_profile)
-            snapshot.update_from_json(twitter_json._json)
-            twitter_profile.twitter_error_code = None
-            twitter_profile.save()
-            if profile_set:
-                profile_set.profiles.add(twitter_profile)
-            print("Successfully saved profile data for {}".format(str(twitter_profile)))
+        collect_profile(options["twitter_id"], self.twitter, profile_set=profile_set)
+
+
+def collect_profile(twitter_id, twitter, profile_set=None, write=write_inline):
+    """
+    Downloads and saves data for a Twitter profile.
+
+    :param twitter_id: The profile's unique Twitter ID or screen name
+    :param twitter: A `TwitterAPIHandler`
+    :param profile_set: (Optional) A TwitterProfileSet to add the profile to
+    :param write: (Optional) A function to run database writes with (see `ConcurrentCollector`)
+    """
+
+    print("Collecting profile data for {}".format(twitter_id))
+    twitter_json = get_twitter_profile_json(twitter_id, twitter, write=write)
+    if twitter_json:
+        twitter_profile = write(
+            save_profile_json, twitter_json._json, profile_set=profile_set
+        )
+        print("Successfully saved profile data for {}".format(str(twitter_profile)))
+
+
+def collect_profiles(twitter_ids, twitter, profile_set=None, write=write_inline):
+    """
+    Downloads and saves data for a batch of Twitter profiles using as few API calls as possible. Profiles that \
+    the API doesn't return get their `twitter_error_code` set to 50 ("User not found"); the batch endpoint \
+    doesn't say why a profile is missing, so suspended profiles get recorded this way too.
+
+    :param twitter_ids: A list of Twitter IDs or screen names
+    :param twitter: A `TwitterAPIHandler`
+    :param profile_set: (Optional) A TwitterProfileSet to add the profiles to
+    :param write: (Optional) A function to run database writes with (see `ConcurrentCollector`)
+    """
+
+    profiles_json, missing = get_twitter_profiles_json(twitter_ids, twitter)
+    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+    saved = write(
+        TwitterProfile.objects.ingest_json_batch, profiles_json, profile_set=profile_set
+    )
+    if missing:
+        write(
+            TwitterProfile.objects.set_error_codes,
+            missing,
+            PROFILE_NOT_FOUND_ERROR_CODE,
+        )
+    print(
+        "Successfully saved profile data for {} profiles ({} not found)".format(
+            len(saved), len(missing)
+        )
+    )
+
+
+def save_profile_json(profile_json, profile_set=None):
+    """
+    Saves a new snapshot for a profile from its API JSON and clears its error code.
+
+    :param profile_json: JSON for the profile from the API
+    :param profile_set: (Optional) A TwitterProfileSet to add the profile to
+    :return: The profile
+    """
+
+    twitter_profile = safe_get_or_create(
+        "AbstractTwitterProfile", "twitter_id", profile_json["id_str"], create=True
+    )
+    snapshot = get_concrete_model("AbstractTwitterProfileSnapshot").objects.create(
+        profile=twitter_profile
+    )
+    snapshot.update_from_json(profile_json)
+    twitter_profile.twitter_error_code = None
+    twitter_profile.save()
+    if profile_set:
+        profile_set.profiles.add(twitter_profile)
+    return twitter_profile
@@ -1,6 +1,5 @@
 from __future__ import print_function
 
-import datetime
 import os
 
 from django.apps import apps
@@ -12,8 +11,11 @@ from tqdm import tqdm
 from pewhooks.twitter import TwitterAPIHandler
 from django_pewtils import reset_django_connection
 
+from django_twitter.collectors import write_inline
+from django_twitter.managers import ingest_profile_list_batch
 from django_twitter.utils import (
     get_twitter_profile_json,
+    iterate_profile_list_pages,
     safe_get_or_create,
     get_concrete_model,
 )
@@ -30,8 +32,17 @@ class Command(BaseCommand):
     If you pass `hydrate=True`, the command will download the full profile data for each following, but this requires \
     heavy API usage and can take a long time.
     :param limit: (Optional) Set a limit for the number of followings to collect, for testing purposes. If a limit \
-    is passed, `finish_time` will not be set, because the data collection was forcibly aborted.
+    is passed, `finish_time` will not be set, because the data collection was forcibly aborted. A page that gets \
+    cut short by the limit isn't checkpointed, so `--resume` only picks up lists that stopped on a page boundary.
     :param no_progress_bar: (Optional) Disables the default `tqdm` progress bar.
+    :param compact: (Optional) Store the list compactly, as a sorted array of Twitter IDs (or just the \
+    differences from the profile's previous following list, if they're similar), instead of adding each \
+    following to the list's `followings` many-to-many relation. Saves a lot of space if you collect lists for large \
+    accounts repeatedly.
+    :param resume: (Optional) The following list is saved after each page of results, so if collection gets \
+    interrupted, it can be picked back up. Passing `--resume` will continue the profile's most recent \
+    unfinished list from where it left off, instead of starting a new one. `finish_time` only gets set once the \
+    list is complete.
 
     :param api_key: (Optional) Twitter API key, if you don't have the TWITTER_API_KEY environment variable set
     :param api_secret: (Optional) Twitter API secret, if you don't have the TWITTER_API_SECRET environment variable set
@@ -49,6 +60,8 @@ class Command(BaseCommand):
         parser.add_argument("--hydrate", action="store_true", default=False)
         parser.add_argument("--limit", type=int)
         parser.add_argument("--no_progress_bar", action="store_true", default=False)
+        parser.add_argument("--compact", action="store_true", default=False)
+        parser.add_argument("--resume", action="store_true", default=False)
 
         parser.add_argument("--api_key", type=str)
         parser.add_argument("--api_secret", type=str)
@@ -66,8 +79,6 @@ class Command(BaseCommand):
             access_secret=options["access_secret"],
         )
 
-        TwitterFollowingList = get_concrete_model("AbstractTwitterFollowingList")
-
         if options["add_to_profile_set"]:
             profile_set = safe_get_or_create(
                 "AbstractTwitterProfileSet",
@@ -78,60 +89,128 @@ class Command(BaseCommand):
         else:
             profile_set = None
 
-        twitter_json = get_twitter_profile_json(options["twitter_id"], self.twitter)
-        if twitter_json:
+        collect_profile_followings(
+            options["twitter_id"],
+            self.twitter,
+            profile_set=profile_set,
+            hydrate=options["hydrate"],
+            limit=options["limit"],
+            no_progress_bar=options["no_progress_bar"],
+            compact=options["compact"],
+            resume=options["resume"],
+        )
 
-            profile = safe_get_or_create(
-                "AbstractTwitterProfile", "twitter_id", twitter_json.id_str, create=True
-            )
-            profile.twitter_error_code = None
-            profile.save()
-            following_list = TwitterFollowingList.objects.create(profile=profile)
 
-            try:
+def collect_profile_followings(
+    twitter_id,
+    twitter,
+    profile_set=None,
+    hydrate=False,
+    limit=None,
+    no_progress_bar=False,
+    compact=False,
+    resume=False,
+    write=write_inline,
+):
+    """
+    Downloads and saves a Twitter profile's followings. See the `django_twitter_get_profile_followings` command for \
+    details on the options.
+
+    :param twitter_id: The profile's unique Twitter ID or screen name
+    :param twitter: A `TwitterAPIHandler`
+    :param write: (Optional) A function to run database writes with (see `ConcurrentCollector`)
+    """
 
-                # Iterate through all tweets in timeline
-                iterator = self.twitter.iterate_profile_followings(
-                    profile.twitter_id,
-                    hydrate_profiles=options["hydrate"],
-                    limit=options["limit"],
+    twitter_json = get_twitter_profile_json(twitter_id, twitter, write=write)
+    if twitter_json:
+
+        profile, following_list = write(
+            start_following_list, twitter_json.id_str, compact=compact, resume=resume
+        )
+        # If we're resuming a list, keep storing it the same way it was started
+        compact = following_list.twitter_ids is not None
+        if following_list.page_count:
+            print(
+                "Resuming following list for user {} after {} pages".format(
+                    profile.screen_name, following_list.page_count
                 )
+            )
 
-                if not options["no_progress_bar"]:
-                    iterator = tqdm(
-                        iterator,
-                        desc="Retrieving followings for user {}".format(
-                            profile.screen_name
-                        ), disable=os.environ.get("DISABLE_TQDM", False),
+        progress = tqdm(
+            desc="Retrieving followings for user {}".format(profile.screen_name),
+            disable=no_progress_bar or os.environ.get("DISABLE_TQDM", False),
+        )
+        try:
+
+            count = 0
+            for page, next_cursor in iterate_profile_list_pages(
+                twitter,
+                profile.twitter_id,
+                "followings",
+                hydrate=hydrate,
+                cursor=following_list.next_cursor if following_list.page_count else -1,
+            ):
+                if limit and len(page) > limit - count:
+                    # Don't checkpoint a page that got cut short, or resuming would skip the rest of it
+                    page, next_cursor = page[: limit - count], None
+                write(
+                    ingest_profile_list_batch,
+                    following_list,
+                    [p._json for p in page] if hydrate else page,
+                    profile_set=profile_set,
+                    compact=compact,
+                    next_cursor=next_cursor,
+                )
+                count += len(page)
+                progress.update(len(page))
+                if limit and count >= limit:
+                    break
+
+            if not limit:
+                write(following_list.finish)
+
+        except Exception as e:
+            print("Encountered an error: {}".format(e))
+            if following_list.page_count:
+                print(
+                    "Collected {} pages of followings for user {}, run again with --resume to continue".format(
+                        following_list.page_count, profile.screen_name
                     )
+                )
+            else:
+                write(following_list.delete)
+
+        progress.close()
+
+
+def start_following_list(twitter_id, compact=False, resume=False):
+    """
+    Creates a new following list for a profile, or if `resume` is True and the profile has an unfinished list that \
+    can be resumed, returns that instead.
 
-                for following_data in iterator:
-                    if not options["hydrate"]:
-                        following = safe_get_or_create(
-                            "AbstractTwitterProfile",
-                            "twitter_id",
-                            following_data,
-                            create=True,
-                        )
-                    else:
-                        following = safe_get_or_create(
-                            "AbstractTwitterProfile",
-                            "twitter_id",
-                            following_data._json["id_str"],
-                            create=True,
-                        )
-                        snapshot = get_concrete_model(
-                            "AbstractTwitterProfileSnapshot"
-                        ).objects.create(profile=following)
-                        snapshot.update_from_json(following_data._json)
-                    following_list.followings.add(following)
-                    if profile_set:
-                        profile_set.profiles.add(following)
-
-                if not options["limit"]:
-                    following_list.finish_time = datetime.datetime.now()
-                following_list.save()
-
-            except Exception as e:
-                print("Encountered an error: {}".format(e))
-                following_list.delete()
+    :param twitter_id: The profile's Twitter ID
+    :param compact: (Optional) Store the new list compactly
+    :param resume: (Optional) Look for an unfinished list to resume
+    :return: A 2-tuple of the profile and the list
+    """
+
+    TwitterList = get_concrete_model("AbstractTwitterFollowingList")
+    profile = safe_get_or_create(
+        "AbstractTwitterProfile", "twitter_id", twitter_id, create=True
+    )
+    profile.twitter_error_code = None
+    profile.save()
+    following_list = None
+    if resume:
+        following_list = (
+            TwitterList.objects.filter(
+                profile=profile, finish_time__isnull=True, page_count__gt=0
+            )
+            .order_by("-start_time")
+            .first()
+        )
+    if not following_list:
+        following_list = TwitterList.objects.create(
+            profile=profile, twitter_ids=[] if compact else None
+        )
+    return profile, following_list
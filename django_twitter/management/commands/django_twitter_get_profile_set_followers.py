@@ -1,15 +1,14 @@
-import multiprocessing
-import os
-
-from multiprocessing import Pool
-from tqdm import tqdm
-
 from django.core.management.base import BaseCommand
-from django.core.management import call_command
 
 from pewtils import is_null
 from django_pewtils import reset_django_connection
 
+from django_twitter.collectors import ConcurrentCollector
+from django_twitter.credentials import get_credential_pool
+from django_twitter.management.commands.django_twitter_get_profile_followers import (
+    collect_profile_followers,
+)
+from django_twitter.ratelimit import get_rate_limiter
 from django_twitter.utils import safe_get_or_create, get_concrete_model
 
 
@@ -18,8 +17,8 @@ class Command(BaseCommand):
     Loops over a set of profiles (as defined by an existing TwitterProfileSet's name) and \
     downloads followers for each profile in the set. Equivalent to looping over the sets \
     in a profile account and running `django_twitter_get_profile_followers`. Supports running these commands \
-    in parallel using multiprocessing and the `num_cores` parameter. Multiprocessing is enabled \
-    by default and is set to the number of cores.
+    concurrently in a single process using the `concurrency` parameter: API requests for up to `concurrency` \
+    profiles are made at once in separate threads, and the data is saved by `db_writers` dedicated database threads.
 
     :param profile_set: The `name` of the profile set in the database
     :param add_to_profile_set: (Optional) The name of a profile set to add the profiles' followers to. Can be \
@@ -30,6 +29,9 @@ class Command(BaseCommand):
     :param limit: (Optional) Set a limit for the number of followers to collect, for testing purposes. If a limit \
     is passed, `finish_time` will not be set, because the data collection was forcibly aborted.
     :param no_progress_bar: (Optional) Disables the default `tqdm` progress bar.
+    :param compact: (Optional) Store the lists compactly (see `django_twitter_get_profile_followers`)
+    :param resume: (Optional) Resume each profile's most recent unfinished list, if it has one (see \
+    `django_twitter_get_profile_followers`)
 
     :param api_key: (Optional) Twitter API key, if you don't have the TWITTER_API_KEY environment variable set
     :param api_secret: (Optional) Twitter API secret, if you don't have the TWITTER_API_SECRET environment variable set
@@ -37,8 +39,20 @@ class Command(BaseCommand):
     variable set
     :param api_secret: (Optional) Twitter API access secret, if you don't have the TWITTER_API_ACCESS_SECRET \
     environment variable set
-
-    :param num_cores: Number of cores to use in multiprocessing. Defaults to `multiprocessing.cpu_count()`.
+    :param credentials_file: (Optional) Path to a JSON file with a list of credentials (dictionaries with \
+    `api_key`, `api_secret`, `access_token`, `access_secret` and optionally `name` keys) to spread the work across; \
+    if it's not provided, the `TWITTER_CREDENTIALS` setting will be used, if you have one. Each set of \
+    credentials gets its own rate limit budget, and credentials that the API rejects (e.g. because they've been \
+    suspended) are taken out of the rotation automatically.
+
+    :param concurrency: (Optional) Number of profiles to collect data for at once (default 8)
+    :param db_writers: (Optional) Number of threads to use for saving data to the database (default 1)
+    :param num_cores: (Deprecated) Alias for `concurrency`
+    :param rate_limit_directory: (Optional) A directory to keep track of the API's rate limits in, so that \
+    every collector on the host that uses the same directory shares the same budget and paces its requests \
+    accordingly (by default, the budget is only shared within this command)
+    :param rate_limit_cache: (Optional) The name of a Django cache to keep track of the API's rate limits in, \
+    so collectors on different hosts can share the same budget (takes precedence over `rate_limit_directory`)
     :param collect_all_once: (Optional) If True, this command will attempt to ensure that at least one follower list \
     has been collected for each profile in the set. On subsequent runs, it will pick up where it left off and will \
     only fetch new follower lists for profiles that do not already have one.
@@ -52,33 +66,56 @@ class Command(BaseCommand):
         parser.add_argument("--hydrate", action="store_true", default=False)
         parser.add_argument("--limit", type=int)
         parser.add_argument("--no_progress_bar", action="store_true", default=False)
+        parser.add_argument("--compact", action="store_true", default=False)
+        parser.add_argument("--resume", action="store_true", default=False)
 
         parser.add_argument("--api_key", type=str)
         parser.add_argument("--api_secret", type=str)
         parser.add_argument("--access_token", type=str)
         parser.add_argument("--access_secret", type=str)
+        parser.add_argument("--credentials_file", type=str)
 
+        parser.add_argument("--concurrency", type=int, default=None)
+        parser.add_argument("--db_writers", type=int, default=1)
         parser.add_argument("--num_cores", type=int, default=None)
+        parser.add_argument("--rate_limit_directory", type=str)
+        parser.add_argument("--rate_limit_cache", type=str)
         parser.add_argument("--collect_all_once", action="store_true", default=False)
 
     def handle(self, *args, **options):
 
         reset_django_connection()
 
-        kwargs = {
-            "add_to_profile_set": options["add_to_profile_set"],
-            "hydrate": options["hydrate"],
-            "limit": options["limit"],
-            "no_progress_bar": options["no_progress_bar"],
-            "api_key": options["api_key"],
-            "api_secret": options["api_secret"],
-            "access_token": options["access_token"],
-            "access_secret": options["access_secret"],
-        }
-
-        if is_null(options["num_cores"]):
-            options["num_cores"] = multiprocessing.cpu_count()
-        pool = Pool(processes=options["num_cores"])
+        twitter = get_credential_pool(
+            credentials_file=options["credentials_file"],
+            rate_limiter=get_rate_limiter(
+                directory=options["rate_limit_directory"],
+                cache=options["rate_limit_cache"],
+            ),
+            api_key=options["api_key"],
+            api_secret=options["api_secret"],
+            access_token=options["access_token"],
+            access_secret=options["access_secret"],
+        )
+
+        add_to_profile_set = None
+        if options["add_to_profile_set"]:
+            add_to_profile_set = safe_get_or_create(
+                "AbstractTwitterProfileSet",
+                "name",
+                options["add_to_profile_set"],
+                create=True,
+            )
+
+        concurrency = options["concurrency"]
+        if is_null(concurrency):
+            concurrency = options["num_cores"] if options["num_cores"] else 8
+        collector = ConcurrentCollector(
+            concurrency=concurrency,
+            db_writers=options["db_writers"],
+            no_progress_bar=options["no_progress_bar"],
+        )
+
         profile_set = safe_get_or_create(
             "AbstractTwitterProfileSet", "name", options["profile_set"], create=True
         )
@@ -94,23 +131,15 @@ class Command(BaseCommand):
             ).values_list("twitter_id", flat=True)
         else:
             twitter_ids = profile_set.profiles.values_list("twitter_id", flat=True)
-        for twitter_id in tqdm(twitter_ids, total=len(twitter_ids), disable=os.environ.get("DISABLE_TQDM", False)):
-            if options["num_cores"] > 1:
-                pool.apply_async(
-                    call_command,
-                    ("django_twitter_get_profile_followers", twitter_id),
-                    kwargs,
-                )
-            else:
-                call_command(
-                    "django_twitter_get_profile_followers", twitter_id, **kwargs
-                )
-                # TODO: Latest version of Django is causing errors with multiprocessing; need to fix
-                # pool.apply(
-                #     call_command,
-                #     ("django_twitter_get_profile_followers", twitter_id),
-                #     kwargs,
-                # )
-
-        pool.close()
-        pool.join()
+
+        collector.run(
+            collect_profile_followers,
+            list(twitter_ids),
+            twitter,
+            profile_set=add_to_profile_set,
+            hydrate=options["hydrate"],
+            limit=options["limit"],
+            no_progress_bar=options["no_progress_bar"] or concurrency > 1,
+            compact=options["compact"],
+            resume=options["resume"],
+        )
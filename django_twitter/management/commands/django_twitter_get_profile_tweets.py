@@ -7,26 +7,31 @@ from builtins import str
 from tqdm import tqdm
 from dateutil.parser import parse as date_parse
 
-from django.apps import apps
-from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from pewtils import is_null
 from pewhooks.twitter import TwitterAPIHandler
 from django_pewtils import reset_django_connection
 
+from django_twitter.collectors import write_inline
+from django_twitter.management.commands.django_twitter_get_profile import (
+    save_profile_json,
+)
 from django_twitter.utils import (
     get_twitter_profile_json,
+    iterate_profile_timeline_pages,
     safe_get_or_create,
-    get_concrete_model,
 )
 
 
 class Command(BaseCommand):
     """
     Download and save the tweets for a specific profile. The first time this command is run, it will loop over \
-    the profile's tweets in reverse-chronological order as far back as it can go (~3200 tweets). In subsequent \
-    calls to this command, it will break off when it encounters an existing tweet. Passing `--ignore_backfill` \
-    will override this behavior. Additionally passing `--max_backfill_date` or `--max_backfill_days` will override \
+    the profile's tweets in reverse-chronological order as far back as it can go (~3200 tweets). The IDs of the \
+    newest and oldest tweets collected are saved on the profile, so subsequent calls to this command only request \
+    tweets that are newer than the ones it already has (using `since_id`), and if a previous backfill didn't \
+    finish, it will resume from the oldest tweet it collected (using `max_id`). Passing `--ignore_backfill` \
+    will override this behavior and iterate over the whole timeline again. Additionally passing `--max_backfill_date` or `--max_backfill_days` will override \
     this behavior but only for recent tweets. By default, Django Twitter does not update data for existing tweets \
     by default; to override this behavior you can pass `--overwrite`.
 
@@ -89,16 +94,9 @@ class Command(BaseCommand):
             access_secret=options["access_secret"],
         )
 
-        max_backfill_date = None
-        if options["max_backfill_date"]:
-            max_backfill_date = date_parse(options["max_backfill_date"])
-        elif options["max_backfill_days"]:
-            max_backfill_date = datetime.datetime.now() - datetime.timedelta(
-                days=options["max_backfill_days"]
-            )
-            max_backfill_date = datetime.datetime(
-                max_backfill_date.year, max_backfill_date.month, max_backfill_date.day
-            )
+        max_backfill_date = get_max_backfill_date(
+            options["max_backfill_date"], options["max_backfill_days"]
+        )
         tweet_set = None
         if options["add_to_tweet_set"]:
             tweet_set = safe_get_or_create(
@@ -114,107 +112,271 @@ class Command(BaseCommand):
                 create=True,
             )
 
-        scanned_count, updated_count = 0, 0
-        twitter_json = get_twitter_profile_json(options["twitter_id"], self.twitter)
-        if twitter_json:
-            twitter_profile = safe_get_or_create(
-                "AbstractTwitterProfile", "twitter_id", twitter_json.id_str
-            )
-            snapshot = get_concrete_model(
-                "AbstractTwitterProfileSnapshot"
-            ).objects.create(profile=twitter_profile)
-            snapshot.update_from_json(twitter_json._json)
-            twitter_profile.twitter_error_code = None
-            twitter_profile.save()
-
-            # Get list of current tweets
-            existing_tweets = list(
-                twitter_profile.tweets.values_list("twitter_id", flat=True)
-            )
+        collect_profile_tweets(
+            options["twitter_id"],
+            self.twitter,
+            tweet_set=tweet_set,
+            profile_set=twitter_profile_set,
+            ignore_backfill=options["ignore_backfill"],
+            overwrite=options["overwrite"],
+            max_backfill_date=max_backfill_date,
+            no_progress_bar=options["no_progress_bar"],
+            limit=options["limit"],
+        )
 
-            # Iterate through all tweets in timeline
 
-            if options["no_progress_bar"]:
-                iterator = self.twitter.iterate_profile_timeline(
-                    options["twitter_id"], return_errors=True
+def get_max_backfill_date(max_backfill_date=None, max_backfill_days=None):
+    """
+    Converts the `max_backfill_date` or `max_backfill_days` options into a datetime.
+    """
+
+    if max_backfill_date:
+        return date_parse(max_backfill_date)
+    elif max_backfill_days:
+        max_backfill_date = datetime.datetime.now() - datetime.timedelta(
+            days=max_backfill_days
+        )
+        return datetime.datetime(
+            max_backfill_date.year, max_backfill_date.month, max_backfill_date.day
+        )
+    return None
+
+
+def collect_profile_tweets(
+    twitter_id,
+    twitter,
+    tweet_set=None,
+    profile_set=None,
+    ignore_backfill=False,
+    overwrite=False,
+    max_backfill_date=None,
+    no_progress_bar=False,
+    limit=None,
+    write=write_inline,
+):
+    """
+    Downloads and saves the tweets for a Twitter profile. See the `django_twitter_get_profile_tweets` command \
+    for details on the options.
+
+    :param twitter_id: The profile's unique Twitter ID or screen name
+    :param twitter: A `TwitterAPIHandler`
+    :param write: (Optional) A function to run database writes with (see `ConcurrentCollector`)
+    """
+
+    twitter_json = get_twitter_profile_json(twitter_id, twitter, write=write)
+    if twitter_json:
+        twitter_profile = write(save_profile_json, twitter_json._json)
+        newest = twitter_profile.newest_tweet_id
+        backfilled = twitter_profile.tweet_backfilled
+
+        print("Retrieving tweets for user {}".format(twitter_profile.screen_name))
+        progress = tqdm(
+            disable=no_progress_bar or os.environ.get("DISABLE_TQDM", False),
+            desc="Retrieving tweets for user {}".format(twitter_profile.screen_name),
+        )
+        counts = {"scanned": 0, "updated": 0}
+        options = dict(
+            tweet_set=tweet_set,
+            overwrite=overwrite,
+            max_backfill_date=max_backfill_date,
+            limit=limit,
+            write=write,
+        )
+
+        # First, get everything that's newer than what we already have (or the whole timeline, if this is the
+        # first time we're collecting this profile's tweets)
+        top = []
+
+        def on_newer_page(page_top, page_bottom):
+            top.append(page_top)
+            if is_null(newest):
+                # The pages are contiguous from the top of the timeline, so they can be resumed from
+                write(
+                    save_tweet_cursors,
+                    twitter_profile,
+                    newest_tweet_id=top[0],
+                    oldest_tweet_id=page_bottom,
                 )
-            else:
-                iterator = tqdm(
-                    self.twitter.iterate_profile_timeline(
-                        options["twitter_id"], return_errors=True
-                    ), disable=os.environ.get("DISABLE_TQDM", False),
-                    desc="Retrieving tweets for user {}".format(
-                        twitter_profile.screen_name
-                    ),
+
+        status, bottom = _collect_timeline(
+            twitter,
+            twitter_profile,
+            counts,
+            progress,
+            on_newer_page,
+            since_id=None if ignore_backfill else newest,
+            stop_at_existing=backfilled and not ignore_backfill,
+            **options
+        )
+        if top and not is_null(newest):
+            if status in ["complete", "existing"] or (
+                not is_null(bottom) and bottom <= newest
+            ):
+                # We didn't leave a gap between these tweets and the ones we already had
+                write(
+                    save_tweet_cursors,
+                    twitter_profile,
+                    newest_tweet_id=max(newest, top[0]),
                 )
+        if is_null(newest) and status == "complete":
+            backfilled = True
+
+        # Then, if the profile hasn't been backfilled yet, pick up where the last backfill left off
+        if (
+            not backfilled
+            and not ignore_backfill
+            and status in ["complete", "existing"]
+            and not is_null(twitter_profile.oldest_tweet_id)
+        ):
+
+            def on_older_page(page_top, page_bottom):
+                write(save_tweet_cursors, twitter_profile, oldest_tweet_id=page_bottom)
+
+            status, bottom = _collect_timeline(
+                twitter,
+                twitter_profile,
+                counts,
+                progress,
+                on_older_page,
+                max_id=twitter_profile.oldest_tweet_id - 1,
+                **options
+            )
+            if status == "complete":
+                backfilled = True
 
-            print("Retrieving tweets for user {}".format(twitter_profile.screen_name))
-            keep_pulling = True
-            for tweet_json in iterator:
-                if type(tweet_json) == int:
-                    print("User {} is private".format(twitter_profile.screen_name))
-                    break
-                else:
-
-                    scanned_count += 1
-                    existing_related = 0
-                    if options["overwrite"] or (
-                        tweet_json.id_str not in existing_tweets
-                    ):
-                        # Only write a tweet if you're overwriting, or it doesn't already exist
-                        tweet = safe_get_or_create(
-                            "AbstractTweet",
-                            "twitter_id",
-                            tweet_json.id_str,
-                            create=True,
-                        )
-                        tweet.update_from_json(tweet_json._json)
-                        if tweet_set:
-                            tweet_set.tweets.add(tweet)
-                        updated_count += 1
-                        # Check to see if there are already existing relations that were created by another tweet
-                        existing_related += (
-                            tweet.replies.count()
-                            + tweet.retweets.count()
-                            + tweet.replies.count()
-                        )
-                        if not tweet.text:
-                            import pdb
-
-                            pdb.set_trace()
-                    if (
-                        twitter_profile.tweet_backfilled
-                        and tweet_json.id_str in existing_tweets
-                        and not options["ignore_backfill"]
-                    ):
-                        if existing_related == 0:
-                            # Only stop if the account has been backfilled and you encounter an existing tweet
-                            # With one exception: if another profile replied to, retweeted, or quoted this tweet
-                            # Then it may have already existed in the database even though we didn't necessarily
-                            # collect it when we were iterating over this user's timeline.
-                            # So if references to this tweet already exist in the database, it's not useful for
-                            # determining whether we've previously backfilled this profile
-                            print("Encountered existing tweet, stopping now")
-                            keep_pulling = False
-                    elif max_backfill_date:
-                        timestamp = date_parse(
-                            tweet_json._json["created_at"], ignoretz=True
-                        )
-                        if timestamp < max_backfill_date:
-                            print("Reached the limit of ignore_backfill")
-                            keep_pulling = False
-                    if options["limit"] and scanned_count >= options["limit"]:
-                        keep_pulling = False
-
-                if not keep_pulling:
-                    break
-
-            twitter_profile.tweet_backfilled = True
-            twitter_profile.save()
-            if twitter_profile_set:
-                twitter_profile_set.profiles.add(twitter_profile)
-            print(
-                "{}: {} tweets scanned, {} updated".format(
-                    str(twitter_profile), scanned_count, updated_count
+        progress.close()
+        write(
+            finish_profile_tweets,
+            twitter_profile,
+            profile_set=profile_set,
+            backfilled=backfilled,
+        )
+        print(
+            "{}: {} tweets scanned, {} updated".format(
+                str(twitter_profile), counts["scanned"], counts["updated"]
+            )
+        )
+
+
+def _collect_timeline(
+    twitter,
+    twitter_profile,
+    counts,
+    progress,
+    on_page,
+    since_id=None,
+    max_id=None,
+    stop_at_existing=False,
+    tweet_set=None,
+    overwrite=False,
+    max_backfill_date=None,
+    limit=None,
+    write=write_inline,
+):
+    """
+    Saves tweets from one stretch of a profile's timeline, calling `on_page(top_id, bottom_id)` after each page \
+    has been saved. Returns a 2-tuple with the reason it stopped ("complete" if it ran out of tweets, "existing" \
+    if it hit a tweet that was already saved, "stopped" if it hit `limit` or `max_backfill_date`, or "error") \
+    and the ID of the last tweet that it scanned.
+    """
+
+    bottom = None
+    for page in iterate_profile_timeline_pages(
+        twitter, twitter_profile.twitter_id, since_id=since_id, max_id=max_id
+    ):
+        if type(page) == int:
+            print("User {} is private".format(twitter_profile.screen_name))
+            return "error", bottom
+        if not page:
+            continue
+
+        # Only check the tweets on this page against the database
+        existing_tweets = set(
+            write(
+                lambda: list(
+                    twitter_profile.tweets.filter(
+                        twitter_id__in=[t.id_str for t in page]
+                    ).values_list("twitter_id", flat=True)
                 )
             )
+        )
+
+        status = None
+        for tweet_json in page:
+            counts["scanned"] += 1
+            progress.update(1)
+            bottom = tweet_json.id
+            existing_related = 0
+            if overwrite or (tweet_json.id_str not in existing_tweets):
+                # Only write a tweet if you're overwriting, or it doesn't already exist
+                existing_related += write(
+                    save_tweet_json, tweet_json._json, tweet_set=tweet_set
+                )
+                counts["updated"] += 1
+            if stop_at_existing and tweet_json.id_str in existing_tweets:
+                if existing_related == 0:
+                    # Only stop if the account has been backfilled and you encounter an existing tweet
+                    # With one exception: if another profile replied to, retweeted, or quoted this tweet
+                    # Then it may have already existed in the database even though we didn't necessarily
+                    # collect it when we were iterating over this user's timeline.
+                    # So if references to this tweet already exist in the database, it's not useful for
+                    # determining whether we've previously backfilled this profile
+                    print("Encountered existing tweet, stopping now")
+                    status = "existing"
+            elif max_backfill_date:
+                timestamp = date_parse(tweet_json._json["created_at"], ignoretz=True)
+                if timestamp < max_backfill_date:
+                    print("Reached the limit of ignore_backfill")
+                    status = "stopped"
+            if limit and counts["scanned"] >= limit:
+                status = status or "stopped"
+            if status:
+                break
+
+        on_page(page[0].id, bottom)
+        if status:
+            return status, bottom
+
+    return "complete", bottom
+
+
+def save_tweet_json(tweet_json, tweet_set=None):
+    """
+    Saves a tweet from its API JSON.
+
+    :param tweet_json: JSON for the tweet from the API
+    :param tweet_set: (Optional) A TweetSet to add the tweet to
+    :return: The number of replies and retweets that already existed for the tweet
+    """
+
+    tweet = safe_get_or_create(
+        "AbstractTweet", "twitter_id", tweet_json["id_str"], create=True,
+    )
+    tweet.update_from_json(tweet_json)
+    if tweet_set:
+        tweet_set.tweets.add(tweet)
+    # Check to see if there are already existing relations that were created by another tweet
+    existing_related = tweet.replies.count() + tweet.retweets.count() + tweet.replies.count()
+    if not tweet.text:
+        import pdb
+
+        pdb.set_trace()
+    return existing_related
+
+
+def save_tweet_cursors(twitter_profile, **cursors):
+    """
+    Saves a profile's `newest_tweet_id` and/or `oldest_tweet_id` without touching any of its other fields.
+    """
+
+    for field, value in cursors.items():
+        setattr(twitter_profile, field, value)
+    type(twitter_profile).objects.filter(pk=twitter_profile.pk).update(**cursors)
+
+
+def finish_profile_tweets(twitter_profile, profile_set=None, backfilled=True):
+
+    twitter_profile.tweet_backfilled = backfilled
+    twitter_profile.save()
+    if profile_set:
+        profile_set.profiles.add(twitter_profile)
@@ -0,0 +1,706 @@
+from __future__ import print_function
+
+import django
+import functools
+import gzip
+import io
+import itertools
+import json
+import os
+import traceback
+
+from collections import OrderedDict, deque
+from multiprocessing import Pool
+from tqdm import tqdm
+from dateutil.parser import parse as date_parse
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from django_twitter.utils import get_concrete_model, safe_get_or_create
+from django_twitter.parsers import (
+    load_json,
+    parse_profile_json,
+    parse_tweet_json,
+    get_tweet_relations,
+    flatten_tweet_json,
+)
+
+
+SNAPSHOT_FIELDS = [
+    ("screen_name", "text"),
+    ("name", "text"),
+    ("contributors_enabled", "boolean"),
+    ("description", "text"),
+    ("favorites_count", "integer"),
+    ("followers_count", "integer"),
+    ("followings_count", "integer"),
+    ("is_verified", "boolean"),
+    ("is_protected", "boolean"),
+    ("listed_count", "integer"),
+    ("location", "text"),
+    ("profile_image_url", "text"),
+    ("status", "text"),
+    ("statuses_count", "integer"),
+]
+TWEET_FIELDS = [
+    ("created_at", "timestamptz"),
+    ("retweet_count", "integer"),
+    ("favorite_count", "integer"),
+    ("language", "text"),
+    ("text", "text"),
+]
+
+STAGING_TABLES = [
+    (
+        "django_twitter_stage_profiles",
+        [("twitter_id", "text"), ("created_at", "timestamptz")]
+        + SNAPSHOT_FIELDS
+        + [("urls", "jsonb"), ("json", "jsonb")],
+    ),
+    ("django_twitter_stage_profile_stubs", [("twitter_id", "text")]),
+    (
+        "django_twitter_stage_tweets",
+        [
+            ("twitter_id", "text"),
+            ("top_level", "boolean"),
+            ("profile", "text"),
+            ("in_reply_to_status", "text"),
+            ("quoted_status", "text"),
+            ("retweeted_status", "text"),
+        ]
+        + TWEET_FIELDS
+        + [("links", "jsonb"), ("media", "jsonb"), ("json", "jsonb")],
+    ),
+    ("django_twitter_stage_replies", [("tweet", "text"), ("profile", "text")]),
+    ("django_twitter_stage_mentions", [("tweet", "text"), ("profile", "text")]),
+    ("django_twitter_stage_hashtags", [("tweet", "text"), ("name", "text")]),
+]
+
+
+class Command(BaseCommand):
+    """
+    Bulk-loads tweets from files of raw API JSON (one tweet per line, optionally gzipped), such as archives of \
+    tweets collected from the streaming API. Much faster than saving tweets through `update_from_json`: lines \
+    are parsed in parallel using multiprocessing, and each batch is copied into temporary tables using \
+    PostgreSQL's `COPY` and then merged into the tweet, profile, snapshot and hashtag tables with a handful of \
+    set-based queries. Tweets, profile snapshots and relations end up the same as they would if the tweets \
+    had been saved individually, with a few exceptions: each profile only gets one new snapshot per batch, and \
+    `simple_history` records aren't created. If a batch can't be loaded this way (e.g. because of a bad \
+    character in one of the tweets), it gets saved using `TweetManager.ingest_json_batch` instead. Requires \
+    PostgreSQL.
+
+    :param files: One or more paths to files with a tweet's JSON on each line. Files ending in `.gz` will be \
+    decompressed.
+    :param batch_size: (Optional) Number of lines to parse and load at a time (default 5000)
+    :param num_cores: (Optional) Number of cores to use for parsing (default 2)
+    :param add_to_profile_set: (Optional) The name of a profile set to add all of the tweets' authors to. Can be \
+    any arbitrary string you want to use; if the profile set doesn't already exist, it will be created
+    :param add_to_tweet_set: (Optional) The name of a tweet set to add each tweet to. Can be \
+    any arbitrary string you want to use; if the tweet set doesn't already exist, it will be created.
+    :param no_progress_bar: (Optional) Disables the default `tqdm` progress bar.
+    """
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("files", type=str, nargs="+")
+        parser.add_argument("--batch_size", type=int, default=5000)
+        parser.add_argument("--num_cores", type=int, default=2)
+        parser.add_argument("--add_to_tweet_set", type=str)
+        parser.add_argument("--add_to_profile_set", type=str)
+        parser.add_argument("--no_progress_bar", action="store_true", default=False)
+
+    def handle(self, *args, **options):
+
+        if options["num_cores"] > 1:
+            pool = Pool(processes=options["num_cores"])
+            mapper = functools.partial(
+                imap_bounded, pool, max_pending=options["num_cores"] * 2
+            )
+        else:
+            pool = None
+            mapper = map
+
+        tweet_set, profile_set = None, None
+        if options["add_to_tweet_set"]:
+            tweet_set = safe_get_or_create(
+                "AbstractTweetSet", "name", options["add_to_tweet_set"], create=True
+            )
+        if options["add_to_profile_set"]:
+            profile_set = safe_get_or_create(
+                "AbstractTwitterProfileSet",
+                "name",
+                options["add_to_profile_set"],
+                create=True,
+            )
+
+        loaded, skipped = 0, 0
+        batches = iterate_batches(options["files"], options["batch_size"])
+        for batch in tqdm(
+            mapper(parse_lines, batches),
+            disable=options["no_progress_bar"] or os.environ.get("DISABLE_TQDM", False),
+        ):
+            skipped += batch["skipped"]
+            if not batch["tweets"]:
+                continue
+            try:
+                with transaction.atomic():
+                    copy_batch(batch, tweet_set=tweet_set, profile_set=profile_set)
+                loaded += len(batch["tweets"])
+            except (django.db.utils.DataError, django.db.utils.IntegrityError):
+                print(
+                    "COPY failed, falling back to ingesting the batch: {}".format(
+                        traceback.format_exc()
+                    )
+                )
+                loaded += len(
+                    get_concrete_model("AbstractTweet").objects.ingest_json_batch(
+                        batch["tweets"], tweet_set=tweet_set, profile_set=profile_set
+                    )
+                )
+
+        if pool:
+            pool.close()
+            pool.join()
+
+        print("{} tweets loaded, {} lines skipped".format(loaded, skipped))
+
+
+def imap_bounded(pool, func, items, max_pending):
+    """
+    Like `Pool.imap`, but only reads ahead far enough to keep `max_pending` items in flight. `Pool.imap` feeds \
+    the whole iterable to the workers right away, so if results are consumed more slowly than they're produced \
+    (e.g. because the database can't keep up), all of them pile up in memory.
+
+    :param pool: A `multiprocessing.Pool`
+    :param func: The function to call on each item
+    :param items: An iterable of items
+    :param max_pending: The maximum number of items being processed or waiting to be consumed
+    :return: Yields the results in order
+    """
+
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def iterate_batches(paths, batch_size):
+    """
+    Yields lists of up to `batch_size` lines from a series of files, decompressing any that end in `.gz`.
+    """
+
+    def _iterate_lines():
+        for path in paths:
+            opener = gzip.open if path.endswith(".gz") else io.open
+            with opener(path, "rt", encoding="utf8") as infile:
+                for line in infile:
+                    yield line
+
+    lines = _iterate_lines()
+    while True:
+        batch = list(itertools.islice(lines, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def format_copy_value(value):
+    """
+    Formats a value for PostgreSQL's `COPY` text format.
+    """
+
+    if value is None:
+        return "\\N"
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value).replace("\\u0000", "")
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    elif hasattr(value, "isoformat"):
+        value = value.isoformat()
+    else:
+        value = "{}".format(value).replace("\x00", "")
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+
+
+def format_copy_rows(rows):
+
+    return "".join(
+        "\t".join(format_copy_value(v) for v in row) + "\n" for row in rows
+    )
+
+
+def parse_tweet_rows(tweet_json):
+    """
+    Parses a single tweet, along with the tweets it quoted or retweeted, into rows for the staging tables. Raises \
+    an exception if the tweet is missing any of the fields that are needed to save it.
+
+    :param tweet_json: A tweet's JSON from the API
+    :return: A 2-tuple of ordered dictionaries, mapping the Twitter IDs of each unique profile to its row in the \
+    profile staging table, and of each unique tweet to its rows in each of the tweet staging tables (with the \
+    `top_level` column of its tweet row left empty)
+    """
+
+    tweet_data, user_data = flatten_tweet_json([tweet_json])
+
+    profiles = OrderedDict()
+    for twitter_id, profile_json in user_data.items():
+        values = parse_profile_json(profile_json)
+        profiles[twitter_id] = (
+            [twitter_id, date_parse(profile_json["created_at"])]
+            + [values.get(field, None) for field, _ in SNAPSHOT_FIELDS]
+            + [values["urls"], values["json"]]
+        )
+
+    tweets = OrderedDict()
+    for twitter_id, embedded_json in tweet_data.items():
+        relations = get_tweet_relations(embedded_json)
+        values = parse_tweet_json(embedded_json)
+        rows = dict((table, []) for table, _ in STAGING_TABLES)
+        rows["django_twitter_stage_tweets"].append(
+            [
+                twitter_id,
+                None,
+                relations["profile"],
+                relations["in_reply_to_status"],
+                relations["quoted_status"],
+                relations["retweeted_status"],
+            ]
+            + [values[field] for field, _ in TWEET_FIELDS]
+            + [values["links"], values["media"], values["json"]]
+        )
+        if relations["in_reply_to_status"]:
+            rows["django_twitter_stage_replies"].append(
+                [relations["in_reply_to_status"], relations["in_reply_to_user"]]
+            )
+            if relations["in_reply_to_user"]:
+                rows["django_twitter_stage_profile_stubs"].append(
+                    [relations["in_reply_to_user"]]
+                )
+        for profile_id in relations["profile_mentions"]:
+            rows["django_twitter_stage_profile_stubs"].append([profile_id])
+            rows["django_twitter_stage_mentions"].append([twitter_id, profile_id])
+        for name in relations["hashtags"]:
+            rows["django_twitter_stage_hashtags"].append([twitter_id, name])
+        tweets[twitter_id] = rows
+
+    return profiles, tweets
+
+
+def parse_lines(lines):
+    """
+    Parses a batch of lines into `COPY` data for each of the staging tables. Runs in the worker processes, so it \
+    doesn't touch the database. Each line is parsed on its own, so a line that isn't valid tweet JSON just gets \
+    skipped. When the same tweet or profile shows up more than once, the version that was seen last wins (see \
+    `flatten_tweet_json`).
+
+    :param lines: A list of lines of tweet JSON
+    :return: A dictionary with the valid tweets, the number of lines that were skipped, and the `COPY` data for \
+    each staging table
+    """
+
+    tweets, skipped = [], 0
+    profile_rows, tweet_rows = OrderedDict(), OrderedDict()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            tweet_json = load_json(line)
+            # Archives of the streaming API also contain delete notices and other messages
+            if (
+                not isinstance(tweet_json, dict)
+                or "id_str" not in tweet_json
+                or "user" not in tweet_json
+            ):
+                skipped += 1
+                continue
+            profiles, embedded = parse_tweet_rows(tweet_json)
+        except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+            skipped += 1
+            continue
+        tweets.append(tweet_json)
+        profile_rows.update(profiles)
+        tweet_rows.update(embedded)
+
+    top_level_ids = set(t["id_str"].lower() for t in tweets)
+    rows = dict((table, []) for table, _ in STAGING_TABLES)
+    rows["django_twitter_stage_profiles"].extend(profile_rows.values())
+    for twitter_id, tweet_tables in tweet_rows.items():
+        tweet_tables["django_twitter_stage_tweets"][0][1] = twitter_id in top_level_ids
+        for table, table_rows in tweet_tables.items():
+            rows[table].extend(table_rows)
+
+    return {
+        "tweets": tweets,
+        "twitter_ids": list(tweet_rows.keys()),
+        "skipped": skipped,
+        "copy": dict((table, format_copy_rows(r)) for table, r in rows.items()),
+    }
+
+
+def get_default_columns(model, exclude, now):
+    """
+    Returns the columns and values that the ORM would fill in automatically for a new object (i.e. fields with \
+    defaults, and `auto_now` timestamps), since raw inserts don't apply them.
+    """
+
+    columns, params = [], []
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.name in exclude:
+            continue
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+            value = now
+        elif field.has_default():
+            value = field.get_default()
+        else:
+            continue
+        columns.append(connection.ops.quote_name(field.column))
+        params.append(field.get_db_prep_save(value, connection))
+    return columns, params
+
+
+def get_m2m_table(model, field_name):
+    """
+    Returns the quoted table name and source/target columns for a many-to-many field's through table.
+    """
+
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    return [
+        connection.ops.quote_name(name)
+        for name in [
+            through._meta.db_table,
+            through._meta.get_field(field.m2m_field_name()).column,
+            through._meta.get_field(field.m2m_reverse_field_name()).column,
+        ]
+    ]
+
+
+def copy_batch(batch, tweet_set=None, profile_set=None):
+    """
+    Copies a parsed batch into temporary staging tables and merges it into the Twitter tables. Must be called \
+    inside of a transaction.
+
+    :param batch: A batch returned by `parse_lines`
+    :param tweet_set: (Optional) A TweetSet to add the tweets to
+    :param profile_set: (Optional) A TwitterProfileSet to add the tweets' authors to
+    """
+
+    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+    TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
+    Tweet = get_concrete_model("AbstractTweet")
+    TwitterHashtag = get_concrete_model("AbstractTwitterHashtag")
+
+    qn = connection.ops.quote_name
+    now = timezone.now()
+
+    def _column(model, field_name):
+        return qn(model._meta.get_field(field_name).column)
+
+    profile_table = qn(TwitterProfile._meta.db_table)
+    profile_pk = qn(TwitterProfile._meta.pk.column)
+    snapshot_table = qn(TwitterProfileSnapshot._meta.db_table)
+    snapshot_pk = qn(TwitterProfileSnapshot._meta.pk.column)
+    tweet_table = qn(Tweet._meta.db_table)
+    tweet_pk = qn(Tweet._meta.pk.column)
+    hashtag_table = qn(TwitterHashtag._meta.db_table)
+    hashtag_pk = qn(TwitterHashtag._meta.pk.column)
+
+    with connection.cursor() as cursor:
+
+        # STAGING
+        for table, columns in STAGING_TABLES:
+            # If the command runs inside an outer transaction, `transaction.atomic()` is only a savepoint and the
+            # tables from the previous batch are still around, so they get reused
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS {} ({}) ON COMMIT DROP".format(
+                    table, ", ".join("{} {}".format(c, t) for c, t in columns)
+                )
+            )
+            cursor.execute("TRUNCATE {}".format(table))
+            # `copy_expert` comes straight from psycopg2, so its errors need to be translated
+            with connection.wrap_database_errors:
+                cursor.copy_expert(
+                    "COPY {} ({}) FROM STDIN".format(
+                        table, ", ".join(c for c, _ in columns)
+                    ),
+                    io.StringIO(batch["copy"][table]),
+                )
+
+        # PROFILES
+        columns, params = get_default_columns(TwitterProfile, ["twitter_id"], now)
+        cursor.execute(
+            """
+            INSERT INTO {table} ({twitter_id}{columns})
+            SELECT twitter_id{values} FROM (
+                SELECT twitter_id FROM django_twitter_stage_profiles
+                UNION SELECT twitter_id FROM django_twitter_stage_profile_stubs
+            ) ids
+            ON CONFLICT ({twitter_id}) DO NOTHING
+            """.format(
+                table=profile_table,
+                twitter_id=_column(TwitterProfile, "twitter_id"),
+                columns="".join(", " + c for c in columns),
+                values=", %s" * len(params),
+            ),
+            params,
+        )
+
+        # SNAPSHOTS
+        snapshot_fields = [f for f, _ in SNAPSHOT_FIELDS] + ["urls", "json"]
+        columns, params = get_default_columns(
+            TwitterProfileSnapshot, snapshot_fields + ["profile"], now
+        )
+        cursor.execute(
+            """
+            WITH new_snapshots AS (
+                INSERT INTO {snapshot_table} ({snapshot_profile}, {snapshot_columns}{columns})
+                SELECT p.{profile_pk}, {values}{defaults}
+                FROM django_twitter_stage_profiles s
+                JOIN {profile_table} p ON p.{twitter_id} = s.twitter_id
+                RETURNING {snapshot_pk} AS snapshot_id, {snapshot_profile} AS profile_id
+            )
+            UPDATE {profile_table} p SET
+                {most_recent_snapshot} = n.snapshot_id,
+                {screen_name} = s.screen_name,
+                {created_at} = s.created_at,
+                {last_update_time} = %s
+            FROM new_snapshots n, django_twitter_stage_profiles s
+            WHERE p.{profile_pk} = n.profile_id AND s.twitter_id = p.{twitter_id}
+            """.format(
+                snapshot_table=snapshot_table,
+                snapshot_pk=snapshot_pk,
+                snapshot_profile=_column(TwitterProfileSnapshot, "profile"),
+                snapshot_columns=", ".join(
+                    _column(TwitterProfileSnapshot, f) for f in snapshot_fields
+                ),
+                columns="".join(", " + c for c in columns),
+                values=", ".join(
+                    ["s.{}".format(f) for f, _ in SNAPSHOT_FIELDS]
+                    + ["ARRAY(SELECT jsonb_array_elements_text(s.urls))", "s.json"]
+                ),
+                defaults=", %s" * len(params),
+                profile_table=profile_table,
+                profile_pk=profile_pk,
+                twitter_id=_column(TwitterProfile, "twitter_id"),
+                most_recent_snapshot=_column(TwitterProfile, "most_recent_snapshot"),
+                screen_name=_column(TwitterProfile, "screen_name"),
+                created_at=_column(TwitterProfile, "created_at"),
+                last_update_time=_column(TwitterProfile, "last_update_time"),
+            ),
+            params + [now],
+        )
+
+        # HASHTAGS
+        columns, params = get_default_columns(TwitterHashtag, ["name"], now)
+        cursor.execute(
+            """
+            INSERT INTO {table} ({name}{columns})
+            SELECT DISTINCT name{values} FROM django_twitter_stage_hashtags
+            ON CONFLICT ({name}) DO NOTHING
+            """.format(
+                table=hashtag_table,
+                name=_column(TwitterHashtag, "name"),
+                columns="".join(", " + c for c in columns),
+                values=", %s" * len(params),
+            ),
+            params,
+        )
+
+        # TWEETS
+        columns, params = get_default_columns(Tweet, ["twitter_id"], now)
+        cursor.execute(
+            """
+            INSERT INTO {table} ({twitter_id}{columns})
+            SELECT twitter_id{values} FROM (
+                SELECT twitter_id FROM django_twitter_stage_tweets
+                UNION SELECT tweet FROM django_twitter_stage_replies
+            ) ids
+            ON CONFLICT ({twitter_id}) DO NOTHING
+            """.format(
+                table=tweet_table,
+                twitter_id=_column(Tweet, "twitter_id"),
+                columns="".join(", " + c for c in columns),
+                values=", %s" * len(params),
+            ),
+            params,
+        )
+
+        # Replied-to tweets that we haven't seen before get linked to their author
+        cursor.execute(
+            """
+            UPDATE {tweet_table} t SET {tweet_profile} = p.{profile_pk}
+            FROM django_twitter_stage_replies r
+            JOIN {profile_table} p ON p.{profile_twitter_id} = r.profile
+            WHERE t.{tweet_twitter_id} = r.tweet AND t.{tweet_profile} IS NULL
+            """.format(
+                tweet_table=tweet_table,
+                tweet_profile=_column(Tweet, "profile"),
+                tweet_twitter_id=_column(Tweet, "twitter_id"),
+                profile_table=profile_table,
+                profile_pk=profile_pk,
+                profile_twitter_id=_column(TwitterProfile, "twitter_id"),
+            )
+        )
+
+        # Links get merged with whatever the tweet already had, and related tweets are only overwritten if present
+        assignments = ["{} = s.{}".format(_column(Tweet, f), f) for f, _ in TWEET_FIELDS]
+        assignments.extend(
+            [
+                "{links} = ARRAY(SELECT DISTINCT unnest(COALESCE(t.{links}, '{{}}')::text[] || "
+                "ARRAY(SELECT jsonb_array_elements_text(s.links))))".format(
+                    links=_column(Tweet, "links")
+                ),
+                "{} = ARRAY(SELECT jsonb_array_elements(s.media))".format(
+                    _column(Tweet, "media")
+                ),
+                "{} = s.json".format(_column(Tweet, "json")),
+                "{} = p.{}".format(_column(Tweet, "profile"), profile_pk),
+                "{} = %s".format(_column(Tweet, "last_update_time")),
+            ]
+        )
+        joins = []
+        for alias, field in [
+            ("r", "in_reply_to_status"),
+            ("q", "quoted_status"),
+            ("rt", "retweeted_status"),
+        ]:
+            assignments.append(
+                "{column} = COALESCE({alias}.{pk}, t.{column})".format(
+                    column=_column(Tweet, field), alias=alias, pk=tweet_pk
+                )
+            )
+            joins.append(
+                "LEFT JOIN {table} {alias} ON {alias}.{twitter_id} = s.{field}".format(
+                    table=tweet_table,
+                    alias=alias,
+                    twitter_id=_column(Tweet, "twitter_id"),
+                    field=field,
+                )
+            )
+        cursor.execute(
+            """
+            UPDATE {tweet_table} t SET {assignments}
+            FROM django_twitter_stage_tweets s
+            JOIN {profile_table} p ON p.{profile_twitter_id} = s.profile
+            {joins}
+            WHERE t.{tweet_twitter_id} = s.twitter_id
+            """.format(
+                tweet_table=tweet_table,
+                assignments=", ".join(assignments),
+                profile_table=profile_table,
+                profile_twitter_id=_column(TwitterProfile, "twitter_id"),
+                joins="\n".join(joins),
+                tweet_twitter_id=_column(Tweet, "twitter_id"),
+            ),
+            [now],
+        )
+
+        # MANY-TO-MANY RELATIONS
+        for field_name, stage_table, related_table, related_pk, related_column, stage_column in [
+            (
+                "profile_mentions",
+                "django_twitter_stage_mentions",
+                profile_table,
+                profile_pk,
+                _column(TwitterProfile, "twitter_id"),
+                "profile",
+            ),
+            (
+                "hashtags",
+                "django_twitter_stage_hashtags",
+                hashtag_table,
+                hashtag_pk,
+                _column(TwitterHashtag, "name"),
+                "name",
+            ),
+        ]:
+            through_table, source, target = get_m2m_table(Tweet, field_name)
+            cursor.execute(
+                """
+                DELETE FROM {through_table} m
+                USING {tweet_table} t, django_twitter_stage_tweets s
+                WHERE m.{source} = t.{tweet_pk} AND t.{tweet_twitter_id} = s.twitter_id
+                """.format(
+                    through_table=through_table,
+                    source=source,
+                    tweet_table=tweet_table,
+                    tweet_pk=tweet_pk,
+                    tweet_twitter_id=_column(Tweet, "twitter_id"),
+                )
+            )
+            cursor.execute(
+                """
+                INSERT INTO {through_table} ({source}, {target})
+                SELECT DISTINCT t.{tweet_pk}, o.{related_pk}
+                FROM {stage_table} m
+                JOIN {tweet_table} t ON t.{tweet_twitter_id} = m.tweet
+                JOIN {related_table} o ON o.{related_column} = m.{stage_column}
+                ON CONFLICT DO NOTHING
+                """.format(
+                    through_table=through_table,
+                    source=source,
+                    target=target,
+                    tweet_pk=tweet_pk,
+                    related_pk=related_pk,
+                    stage_table=stage_table,
+                    tweet_table=tweet_table,
+                    tweet_twitter_id=_column(Tweet, "twitter_id"),
+                    related_table=related_table,
+                    related_column=related_column,
+                    stage_column=stage_column,
+                )
+            )
+
+        # SETS
+        for obj, field_name, related_table, related_pk, related_column, stage_column in [
+            (
+                tweet_set,
+                "tweets",
+                tweet_table,
+                tweet_pk,
+                _column(Tweet, "twitter_id"),
+                "twitter_id",
+            ),
+            (
+                profile_set,
+                "profiles",
+                profile_table,
+                profile_pk,
+                _column(TwitterProfile, "twitter_id"),
+                "profile",
+            ),
+        ]:
+            if obj:
+                through_table, source, target = get_m2m_table(type(obj), field_name)
+                cursor.execute(
+                    """
+                    INSERT INTO {through_table} ({source}, {target})
+                    SELECT DISTINCT %s, o.{related_pk}
+                    FROM django_twitter_stage_tweets s
+                    JOIN {related_table} o ON o.{related_column} = s.{stage_column}
+                    WHERE s.top_level
+                    ON CONFLICT DO NOTHING
+                    """.format(
+                        through_table=through_table,
+                        source=source,
+                        target=target,
+                        related_pk=related_pk,
+                        related_table=related_table,
+                        related_column=related_column,
+                        stage_column=stage_column,
+                    ),
+                    [obj.pk],
+                )
+
+    Tweet.objects.apply_pending_deletes(batch["twitter_ids"])
@@ -0,0 +1,106 @@
+from __future__ import print_function
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_twitter.spool import SpoolReader
+from django_twitter.utils import get_concrete_model, safe_get_or_create
+
+
+class Command(BaseCommand):
+    """
+    Saves tweets from a spool directory written by `django_twitter_collect_tweet_stream --spool_directory` to the \
+    database. Segments are replayed in the order they were written, in batches of `batch_size` tweets; after each \
+    batch is saved, its position in the segment is committed, so if the command gets interrupted it'll resume \
+    where it left off. Finished segments are renamed to `.jsonl.done` (or deleted, if you pass `--delete`). \
+    Lines that can't be parsed (e.g. a partial line at the end of a segment that was being written when the \
+    stream crashed) are skipped.
+
+    :param spool_directory: Path to the spool directory
+    :param batch_size: (Optional) Number of tweets to save at a time (default 500)
+    :param follow: (Optional) Keep running and replay new segments as they're closed, instead of stopping once \
+    the spool is empty
+    :param poll_seconds: (Optional) How often to check for new segments when using `--follow` (default 5)
+    :param delete: (Optional) Delete segments once they've been replayed
+    :param delete_policy: (Optional) What to do with delete notices in the spool: `flag` sets `is_deleted` on \
+    the tweet, `delete` removes it from the database, and `ignore` does nothing (default `flag`)
+    :param add_to_profile_set: (Optional) The name of a profile set to add all encountered profiles to. Can be \
+    any arbitrary string you want to use; if the profile set doesn't already exist, it will be created
+    :param add_to_tweet_set: (Optional) The name of a tweet set to add each tweet to. Can be \
+    any arbitrary string you want to use; if the tweet set doesn't already exist, it will be created.
+    """
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("spool_directory", type=str)
+        parser.add_argument("--batch_size", type=int, default=500)
+        parser.add_argument("--follow", action="store_true", default=False)
+        parser.add_argument("--poll_seconds", type=int, default=5)
+        parser.add_argument("--delete", action="store_true", default=False)
+        parser.add_argument(
+            "--delete_policy",
+            type=str,
+            default="flag",
+            choices=["flag", "delete", "ignore"],
+        )
+        parser.add_argument("--add_to_tweet_set", type=str)
+        parser.add_argument("--add_to_profile_set", type=str)
+
+    def handle(self, *args, **options):
+
+        tweet_set, profile_set = None, None
+        if options["add_to_tweet_set"]:
+            tweet_set = safe_get_or_create(
+                "AbstractTweetSet", "name", options["add_to_tweet_set"], create=True
+            )
+        if options["add_to_profile_set"]:
+            profile_set = safe_get_or_create(
+                "AbstractTwitterProfileSet",
+                "name",
+                options["add_to_profile_set"],
+                create=True,
+            )
+
+        Tweet = get_concrete_model("AbstractTweet")
+        reader = SpoolReader(options["spool_directory"])
+        saved, skipped = 0, 0
+        while True:
+            segments = reader.segments()
+            for segment in segments:
+                for lines, offset in reader.read_batches(
+                    segment, batch_size=options["batch_size"]
+                ):
+                    tweets, deletes = [], []
+                    for line in lines:
+                        try:
+                            data = json.loads(line)
+                        except ValueError:
+                            skipped += 1
+                            continue
+                        if "delete" in data:
+                            deletes.append(data["delete"]["status"]["id_str"])
+                        else:
+                            tweets.append(data)
+                    if tweets:
+                        saved += len(
+                            Tweet.objects.ingest_json_batch(
+                                tweets, tweet_set=tweet_set, profile_set=profile_set
+                            )
+                        )
+                    if options["delete_policy"] != "ignore":
+                        Tweet.objects.apply_deletes(
+                            deletes, hard_delete=options["delete_policy"] == "delete"
+                        )
+                    reader.commit(segment, offset)
+                reader.finish(segment, delete=options["delete"])
+                print(
+                    "Replayed {}: {} tweets saved, {} lines skipped".format(
+                        segment, saved, skipped
+                    )
+                )
+            if not options["follow"]:
+                break
+            if not segments:
+                time.sleep(options["poll_seconds"])
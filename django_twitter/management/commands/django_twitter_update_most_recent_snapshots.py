@@ -0,0 +1,42 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from django_twitter.utils import get_concrete_model, safe_get_or_create
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the `most_recent_snapshot` relation for Twitter profiles, pointing each profile at its latest \
+    snapshot. Snapshots keep this relation up to date as they're created, so you should only need this command \
+    to repair existing data (e.g. after deleting snapshots in bulk, or after upgrading from an older version \
+    of Django Twitter). Runs as a single UPDATE query.
+
+    :param profile_set: (Optional) The `name` of a profile set in the database, to only update those profiles
+    """
+
+    def add_arguments(self, parser):
+
+        parser.add_argument("--profile_set", type=str)
+
+    def handle(self, *args, **options):
+
+        TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+        TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
+
+        if options["profile_set"]:
+            profiles = safe_get_or_create(
+                "AbstractTwitterProfileSet", "name", options["profile_set"], create=True
+            ).profiles.all()
+        else:
+            profiles = TwitterProfile.objects.all()
+
+        updated = profiles.update(
+            most_recent_snapshot=Subquery(
+                TwitterProfileSnapshot.objects.filter(profile_id=OuterRef("pk"))
+                .order_by("-timestamp")
+                .values("pk")[:1]
+            )
+        )
+        print("Updated the most recent snapshot for {} profiles".format(updated))
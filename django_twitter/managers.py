@@ -0,0 +1,638 @@
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import django
+import itertools
+import traceback
+
+from collections import OrderedDict
+from dateutil.parser import parse as date_parse
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Func, Value
+from django.utils import timezone
+
+from django_twitter.utils import get_concrete_model, safe_get_or_create
+from django_twitter.parsers import (
+    load_json,
+    parse_profile_json,
+    parse_tweet_json,
+    get_tweet_relations,
+    flatten_tweet_json,
+)
+
+
+BULK_BATCH_SIZE = 1000
+
+
+def bulk_update_objects(model, objs, fields, batch_size=BULK_BATCH_SIZE):
+    """
+    Wrapper around `bulk_update` that also writes `simple_history` records for models that track their history, \
+    since bulk operations bypass the signals that normally create them.
+
+    :param model: The model class
+    :param objs: A list of model instances
+    :param fields: The names of the fields to update
+    :param batch_size: Number of rows to update per query
+    """
+
+    if not objs:
+        return
+    if hasattr(model, "history"):
+        from simple_history.utils import bulk_update_with_history
+
+        bulk_update_with_history(objs, model, fields, batch_size=batch_size)
+    else:
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+
+def bulk_create_objects(model, objs, batch_size=BULK_BATCH_SIZE, ignore_conflicts=False):
+    """
+    Wrapper around `bulk_create` that also writes `simple_history` records for models that track their history \
+    (see `bulk_update_objects`). When conflicts are ignored, history can only be written efficiently if none of \
+    the rows already exist, so callers should filter out existing objects first; if some turn up anyway (e.g. \
+    because another process just created them), each row gets looked back up individually.
+
+    :param model: The model class
+    :param objs: A list of model instances
+    :param batch_size: Number of rows to insert per query
+    :param ignore_conflicts: (Optional) Skip rows that violate a unique constraint
+    :return: The created objects
+    """
+
+    if not objs:
+        return []
+    if not hasattr(model, "history"):
+        return model.objects.bulk_create(
+            objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+        )
+
+    from simple_history.utils import bulk_create_with_history
+
+    if ignore_conflicts:
+        try:
+            with transaction.atomic():
+                return bulk_create_with_history(objs, model, batch_size=batch_size)
+        except IntegrityError:
+            for obj in objs:
+                obj.pk = None
+    return bulk_create_with_history(
+        objs, model, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+    )
+
+
+def bulk_add_m2m(model, field_name, pairs, clear=None):
+    """
+    Inserts rows directly into a many-to-many through table.
+
+    :param model: The model class that owns the many-to-many field
+    :param field_name: The name of the many-to-many field
+    :param pairs: An iterable of (owner_pk, related_pk) tuples
+    :param clear: (Optional) Primary keys of owner objects whose existing relations should be removed first, \
+    equivalent to calling `.set()` on each of them
+    """
+
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = "{}_id".format(field.m2m_field_name())
+    target = "{}_id".format(field.m2m_reverse_field_name())
+    if clear:
+        through.objects.filter(**{"{}__in".format(source): list(clear)}).delete()
+    through.objects.bulk_create(
+        [through(**{source: a, target: b}) for a, b in set(pairs)],
+        batch_size=BULK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def bulk_get_or_create(model, field, values):
+    """
+    Set-based equivalent of `safe_get_or_create`: creates any missing objects in a single query and returns a \
+    dictionary of all of the requested objects, keyed by `field`.
+
+    :param model: The model class
+    :param field: A unique field to look objects up by
+    :param values: Values for `field`
+    :return: A dictionary mapping each value to its object
+    """
+
+    values = set([v for v in values if v])
+    if not values:
+        return {}
+    existing = model.objects.filter(**{"{}__in".format(field): list(values)})
+    missing = values.difference(existing.values_list(field, flat=True))
+    bulk_create_objects(
+        model, [model(**{field: v}) for v in missing], ignore_conflicts=True
+    )
+    return model.objects.in_bulk(list(values), field_name=field)
+
+
+def bulk_create_snapshots(profiles, user_data, clear_error_codes=False):
+    """
+    Creates a new snapshot for each of a batch of profiles in a single query, and points each profile's \
+    `most_recent_snapshot` at it.
+
+    :param profiles: A dictionary of TwitterProfile objects, keyed by Twitter ID
+    :param user_data: A dictionary of profile JSON from the API, keyed by Twitter ID
+    :param clear_error_codes: (Optional) Also reset each profile's `twitter_error_code`
+    :return: A dictionary of the new snapshots, keyed by Twitter ID
+    """
+
+    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+    TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
+
+    snapshots = OrderedDict()
+    for twitter_id, profile_json in user_data.items():
+        snapshots[twitter_id] = TwitterProfileSnapshot(
+            profile=profiles[twitter_id], **parse_profile_json(profile_json)
+        )
+    bulk_create_objects(TwitterProfileSnapshot, list(snapshots.values()))
+    now = timezone.now()
+    fields = ["created_at", "screen_name", "most_recent_snapshot", "last_update_time"]
+    if clear_error_codes:
+        fields.append("twitter_error_code")
+    for twitter_id, snapshot in snapshots.items():
+        profile = profiles[twitter_id]
+        profile.created_at = date_parse(user_data[twitter_id]["created_at"])
+        profile.screen_name = snapshot.screen_name
+        profile.most_recent_snapshot = snapshot
+        profile.last_update_time = now
+        if clear_error_codes:
+            profile.twitter_error_code = None
+    bulk_update_objects(
+        TwitterProfile, [profiles[twitter_id] for twitter_id in snapshots.keys()], fields
+    )
+
+    return snapshots
+
+
+def ingest_json_individually(tweets, tweet_set=None, profile_set=None, instances=None):
+    """
+    Saves a list of tweets one object at a time, along with the tweets they quoted or retweeted. Each unique tweet \
+    and profile is only parsed and saved once (using the latest version of its JSON), and embedded tweets are saved \
+    before the tweets that embed them, so nothing gets parsed recursively.
+
+    :param tweets: A list of tweet JSON from the API (dictionaries)
+    :param tweet_set: (Optional) A TweetSet to add the tweets to
+    :param profile_set: (Optional) A TwitterProfileSet to add the tweets' authors to
+    :param instances: (Optional) A dictionary of existing Tweet objects to update, keyed by Twitter ID
+    :return: A list of the Twitter IDs of the tweets that were successfully saved
+    """
+
+    TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
+
+    instances = instances or {}
+    tweet_data, user_data = flatten_tweet_json(tweets)
+
+    profiles = {}
+    for twitter_id, profile_json in user_data.items():
+        profile = safe_get_or_create(
+            "AbstractTwitterProfile", "twitter_id", twitter_id, create=True
+        )
+        snapshot = TwitterProfileSnapshot.objects.create(
+            profile=profile, json=profile_json
+        )
+        snapshot.update_from_json()
+        profile.refresh_from_db()
+        profiles[twitter_id] = profile
+
+    saved = {}
+    for twitter_id, tweet_json in tweet_data.items():
+        try:
+            tweet = instances.get(twitter_id, None)
+            if not tweet:
+                tweet = safe_get_or_create(
+                    "AbstractTweet", "twitter_id", twitter_id, create=True
+                )
+            tweet._update_from_json(tweet_json, profiles=profiles)
+            saved[twitter_id] = tweet
+        except django.db.utils.IntegrityError:
+            pass
+
+    top_level_ids = []
+    for tweet_json in tweets:
+        twitter_id = tweet_json["id_str"].lower()
+        if twitter_id in saved and twitter_id not in top_level_ids:
+            if tweet_set:
+                tweet_set.tweets.add(saved[twitter_id])
+            if profile_set:
+                profile_set.profiles.add(saved[twitter_id].profile)
+            top_level_ids.append(twitter_id)
+
+    get_concrete_model("AbstractTweet").objects.apply_pending_deletes(saved.keys())
+
+    return top_level_ids
+
+
+def ingest_profile_list_batch(
+    profile_list, profiles, profile_set=None, compact=False, next_cursor=None
+):
+    """
+    Adds a batch of profiles to a follower or following list in a handful of queries. Profiles that don't exist \
+    yet get created, hydrated profiles get a new snapshot, and the list's many-to-many relation is written \
+    directly to its through table.
+
+    :param profile_list: A TwitterFollowerList or TwitterFollowingList
+    :param profiles: A list of Twitter IDs, or of profile JSON if the profiles were hydrated
+    :param profile_set: (Optional) A TwitterProfileSet to add the profiles to
+    :param compact: (Optional) Instead of adding the profiles to the list's many-to-many relation, append \
+    their IDs to the list's `twitter_ids` array (see `AbstractTwitterProfileList.set_twitter_ids`)
+    :param next_cursor: (Optional) The API cursor for the page after this batch; it gets saved on the list in the \
+    same transaction as the batch, so the list can be resumed from there
+    :return: A list of the profiles' Twitter IDs
+    """
+
+    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+
+    hydrated = [p for p in profiles if isinstance(p, dict)]
+    twitter_ids = [str(p).lower() for p in profiles if not isinstance(p, dict)]
+    twitter_ids.extend([p["id_str"].lower() for p in hydrated])
+
+    with transaction.atomic():
+        if hydrated:
+            TwitterProfile.objects.ingest_json_batch(hydrated)
+        if not compact or hydrated or profile_set:
+            existing = bulk_get_or_create(TwitterProfile, "twitter_id", twitter_ids)
+        if not compact:
+            bulk_add_m2m(
+                type(profile_list),
+                profile_list.profiles_field,
+                [(profile_list.pk, existing[t].pk) for t in twitter_ids],
+            )
+        if profile_set:
+            bulk_add_m2m(
+                type(profile_set),
+                "profiles",
+                [(profile_set.pk, existing[t].pk) for t in twitter_ids],
+            )
+
+        updates = {}
+        if compact:
+            updates["twitter_ids"] = Func(
+                F("twitter_ids"),
+                Value(
+                    [int(t) for t in twitter_ids],
+                    output_field=ArrayField(models.BigIntegerField()),
+                ),
+                function="array_cat",
+            )
+        if next_cursor is not None:
+            updates["next_cursor"] = next_cursor
+            updates["page_count"] = F("page_count") + 1
+            profile_list.next_cursor = next_cursor
+            profile_list.page_count += 1
+        if updates:
+            type(profile_list).objects.filter(pk=profile_list.pk).update(**updates)
+
+    return twitter_ids
+
+
+class TwitterProfileManager(models.Manager):
+    """
+    Default manager for TwitterProfile models, with support for saving profiles from the API in bulk.
+    """
+
+    def ingest_json_batch(self, profiles, profile_set=None):
+        """
+        Set-based equivalent of creating a new snapshot for each of a list of profiles and calling \
+        `update_from_json` on it. Creates any profiles that don't exist yet, saves all of the snapshots in a \
+        single query, and clears each profile's `twitter_error_code`.
+
+        :param profiles: A list of profile JSON from the API (dictionaries or JSON strings)
+        :param profile_set: (Optional) A TwitterProfileSet to add the profiles to
+        :return: A list of the Twitter IDs of the profiles that were saved
+        """
+
+        user_data = OrderedDict()
+        for profile_json in [p for p in [load_json(p) for p in profiles] if p]:
+            user_data[profile_json["id_str"].lower()] = profile_json
+        if not user_data:
+            return []
+
+        with transaction.atomic(using=self.db):
+            existing = bulk_get_or_create(self.model, "twitter_id", user_data.keys())
+            bulk_create_snapshots(existing, user_data, clear_error_codes=True)
+            if profile_set:
+                bulk_add_m2m(
+                    type(profile_set),
+                    "profiles",
+                    [(profile_set.pk, existing[t].pk) for t in user_data.keys()],
+                )
+
+        return list(user_data.keys())
+
+    def set_error_codes(self, twitter_ids, error_code):
+        """
+        Records an error code returned by the API on a batch of existing profiles. Profiles that aren't in the \
+        database are ignored.
+
+        :param twitter_ids: A list of Twitter IDs
+        :param error_code: The error code
+        :return: The number of profiles that were updated
+        """
+
+        twitter_ids = set([str(t).lower() for t in twitter_ids if t])
+        if not twitter_ids:
+            return 0
+
+        existing = list(self.filter(twitter_id__in=twitter_ids))
+        for profile in existing:
+            profile.twitter_error_code = error_code
+        bulk_update_objects(self.model, existing, ["twitter_error_code"])
+
+        return len(existing)
+
+
+class TwitterProfileListManager(models.Manager):
+    """
+    Default manager for follower and following lists, with support for reading the most recent lists of many \
+    profiles at once.
+    """
+
+    def current_lists(self, profiles):
+        """
+        Set-based equivalent of calling `current_follower_list` (or `current_following_list`) on each of a set of \
+        profiles. Uses `DISTINCT ON` to select the most recently finished list for every profile in one query; \
+        profiles that don't have a finished list are left out.
+
+        :param profiles: A QuerySet of TwitterProfiles
+        :return: A QuerySet of lists, ordered by profile
+        """
+
+        return (
+            self.filter(profile__in=profiles.values("pk"), finish_time__isnull=False)
+            .order_by("profile_id", "-finish_time", "-pk")
+            .distinct("profile_id")
+        )
+
+    def iterate_current_twitter_ids(self, profiles, chunk_size=10000):
+        """
+        Iterates over the most recently finished list of every profile in a set (see `current_lists`). Lists \
+        stored on their many-to-many relation are streamed from a single query on the through table using a \
+        server-side cursor, so memory use doesn't grow with the size of the set; compact lists are read with \
+        `get_twitter_ids`.
+
+        :param profiles: A QuerySet of TwitterProfiles
+        :param chunk_size: (Optional) Number of rows to fetch from the server-side cursor at a time
+        :return: A generator of `(profile_id, twitter_ids)` tuples, where `profile_id` is the primary key of the \
+        profile and `twitter_ids` is a sorted list of the Twitter IDs on its list (as integers)
+        """
+
+        current = self.current_lists(profiles)
+        field = self.model._meta.get_field(self.model.profiles_field)
+        through = field.remote_field.through
+        source = "{}_id".format(field.m2m_field_name())
+        target = "{}__twitter_id".format(field.m2m_reverse_field_name())
+
+        list_profiles = {}
+        compact_ids = set()
+        for list_id, profile_id, twitter_ids, base_list_id in current.values_list(
+            "pk", "profile_id", "twitter_ids", "base_list_id"
+        ):
+            list_profiles[list_id] = profile_id
+            if twitter_ids is not None or base_list_id is not None:
+                compact_ids.add(list_id)
+
+        m2m_ids = set(list_profiles.keys()).difference(compact_ids)
+        if m2m_ids:
+            pairs = (
+                through.objects.filter(**{"{}__in".format(source): list(m2m_ids)})
+                .order_by(source)
+                .values_list(source, target)
+                .iterator(chunk_size=chunk_size)
+            )
+            for list_id, rows in itertools.groupby(pairs, key=lambda r: r[0]):
+                yield list_profiles[list_id], sorted(int(r[1]) for r in rows)
+                m2m_ids.discard(list_id)
+        # Lists on the many-to-many relation that are empty don't show up in the through table
+        for list_id in sorted(m2m_ids):
+            yield list_profiles[list_id], []
+        for profile_list in self.filter(pk__in=compact_ids):
+            yield list_profiles[profile_list.pk], profile_list.get_twitter_ids()
+
+
+class TweetManager(models.Manager):
+    """
+    Default manager for Tweet models, with support for ingesting tweets from the API in bulk.
+    """
+
+    def ingest_json_batch(self, tweets, tweet_set=None, profile_set=None):
+        """
+        Set-based equivalent of calling `update_from_json` on a list of tweets. Resolves all of the profiles, \
+        hashtags and referenced tweets for the whole batch in a handful of queries, creates a new profile snapshot \
+        for each author, and writes the many-to-many relations directly to their through tables. Tweets that \
+        the batch quoted or retweeted get parsed and saved too. If the batch can't be saved in bulk (e.g. because \
+        of a bad character in one of the tweets), it falls back to saving tweets one at a time.
+
+        :param tweets: A list of tweet JSON from the API (dictionaries or JSON strings)
+        :param tweet_set: (Optional) A TweetSet to add the tweets to
+        :param profile_set: (Optional) A TwitterProfileSet to add the tweets' authors to
+        :return: A list of the Twitter IDs of the tweets that were successfully saved
+        """
+
+        tweets = [t for t in [load_json(t) for t in tweets] if t]
+        try:
+            with transaction.atomic(using=self.db):
+                self._ingest_json_batch(
+                    tweets, tweet_set=tweet_set, profile_set=profile_set
+                )
+            return list(OrderedDict.fromkeys(t["id_str"].lower() for t in tweets))
+        except (
+            django.db.utils.IntegrityError,
+            django.db.utils.DataError,
+            ValueError,
+        ):
+            print(
+                "Batch ingestion failed, falling back to saving tweets individually: {}".format(
+                    traceback.format_exc()
+                )
+            )
+
+        return ingest_json_individually(
+            tweets, tweet_set=tweet_set, profile_set=profile_set
+        )
+
+    def apply_deletes(self, twitter_ids, hard_delete=False):
+        """
+        Applies a batch of delete notices from the streaming API. Tweets that are in the database get flagged with \
+        `is_deleted` (or deleted outright, if `hard_delete` is True) in a single query. Notices for tweets that \
+        aren't in the database yet get saved to your app's `AbstractTweetDeleteNotice` model, if it has one, \
+        and are applied whenever those tweets get saved.
+
+        :param twitter_ids: A list of Twitter IDs of deleted tweets
+        :param hard_delete: (Optional) Delete the tweets from the database instead of flagging them (default False)
+        :return: A 2-tuple with the number of tweets that were deleted or flagged, and the number of notices that \
+        were saved for later
+        """
+
+        twitter_ids = set([str(t).lower() for t in twitter_ids if t])
+        if not twitter_ids:
+            return 0, 0
+
+        TweetDeleteNotice = get_concrete_model("AbstractTweetDeleteNotice")
+        with transaction.atomic(using=self.db):
+            existing = set(
+                self.filter(twitter_id__in=twitter_ids).values_list(
+                    "twitter_id", flat=True
+                )
+            )
+            self._delete_tweets(existing, hard_delete=hard_delete)
+            pending = twitter_ids.difference(existing)
+            if pending and TweetDeleteNotice:
+                TweetDeleteNotice.objects.bulk_create(
+                    [
+                        TweetDeleteNotice(twitter_id=t, hard_delete=hard_delete)
+                        for t in pending
+                    ],
+                    batch_size=BULK_BATCH_SIZE,
+                    ignore_conflicts=True,
+                )
+            else:
+                pending = set()
+
+        return len(existing), len(pending)
+
+    def apply_pending_deletes(self, twitter_ids):
+        """
+        Checks a batch of tweets that were just saved against the delete notices saved by `apply_deletes`, and \
+        applies any that match. Called automatically when tweets are saved from JSON.
+
+        :param twitter_ids: A list of Twitter IDs
+        :return: The number of notices that were applied
+        """
+
+        TweetDeleteNotice = get_concrete_model("AbstractTweetDeleteNotice")
+        twitter_ids = set([str(t).lower() for t in twitter_ids if t])
+        if not TweetDeleteNotice or not twitter_ids:
+            return 0
+
+        notices = TweetDeleteNotice.objects.filter(twitter_id__in=twitter_ids)
+        hard_deletes, soft_deletes = set(), set()
+        for twitter_id, hard_delete in notices.values_list("twitter_id", "hard_delete"):
+            if hard_delete:
+                hard_deletes.add(twitter_id)
+            else:
+                soft_deletes.add(twitter_id)
+        if hard_deletes or soft_deletes:
+            self._delete_tweets(hard_deletes, hard_delete=True)
+            self._delete_tweets(soft_deletes, hard_delete=False)
+            notices.delete()
+
+        return len(hard_deletes) + len(soft_deletes)
+
+    def _delete_tweets(self, twitter_ids, hard_delete=False):
+
+        if twitter_ids:
+            tweets = self.filter(twitter_id__in=twitter_ids)
+            if hard_delete:
+                tweets.delete()
+            else:
+                tweets.update(is_deleted=True)
+
+    def _ingest_json_batch(self, tweets, tweet_set=None, profile_set=None):
+
+        TwitterProfile = get_concrete_model("AbstractTwitterProfile")
+        TwitterHashtag = get_concrete_model("AbstractTwitterHashtag")
+
+        tweet_data, user_data = flatten_tweet_json(tweets)
+        relations = OrderedDict(
+            (twitter_id, get_tweet_relations(t)) for twitter_id, t in tweet_data.items()
+        )
+
+        # PROFILES
+        profile_ids = set(user_data.keys())
+        for r in relations.values():
+            profile_ids.update(r["profile_mentions"])
+            if r["in_reply_to_user"]:
+                profile_ids.add(r["in_reply_to_user"])
+        profiles = bulk_get_or_create(TwitterProfile, "twitter_id", profile_ids)
+
+        # SNAPSHOTS
+        bulk_create_snapshots(profiles, user_data)
+        now = timezone.now()
+
+        # HASHTAGS
+        hashtags = bulk_get_or_create(
+            TwitterHashtag,
+            "name",
+            [h for r in relations.values() for h in r["hashtags"]],
+        )
+
+        # TWEETS
+        tweet_ids = set(tweet_data.keys())
+        for r in relations.values():
+            if r["in_reply_to_status"]:
+                tweet_ids.add(r["in_reply_to_status"])
+        existing = bulk_get_or_create(self.model, "twitter_id", tweet_ids)
+
+        # Replied-to tweets that we haven't seen before get linked to their author
+        reply_stubs = []
+        for r in relations.values():
+            if r["in_reply_to_status"] and r["in_reply_to_user"]:
+                reply = existing[r["in_reply_to_status"]]
+                if not reply.profile_id and r["in_reply_to_status"] not in tweet_data:
+                    reply.profile_id = profiles[r["in_reply_to_user"]].pk
+                    reply.last_update_time = now
+                    reply_stubs.append(reply)
+        bulk_update_objects(self.model, reply_stubs, ["profile", "last_update_time"])
+
+        updated = []
+        tweet_fields = set(["profile", "last_update_time"])
+        for twitter_id, t in tweet_data.items():
+            tweet = existing[twitter_id]
+            values = parse_tweet_json(t, existing_links=tweet.links)
+            for field, value in values.items():
+                setattr(tweet, field, value)
+            tweet_fields.update(values.keys())
+            r = relations[twitter_id]
+            tweet.profile_id = profiles[r["profile"]].pk
+            for field in ["in_reply_to_status", "quoted_status", "retweeted_status"]:
+                if r[field]:
+                    setattr(tweet, "{}_id".format(field), existing[r[field]].pk)
+                    tweet_fields.add(field)
+            tweet.last_update_time = now
+            updated.append(tweet)
+        bulk_update_objects(self.model, updated, list(tweet_fields))
+
+        # MANY-TO-MANY RELATIONS
+        tweet_pks = [tweet.pk for tweet in updated]
+        bulk_add_m2m(
+            self.model,
+            "profile_mentions",
+            [
+                (existing[twitter_id].pk, profiles[p].pk)
+                for twitter_id, r in relations.items()
+                for p in r["profile_mentions"]
+            ],
+            clear=tweet_pks,
+        )
+        bulk_add_m2m(
+            self.model,
+            "hashtags",
+            [
+                (existing[twitter_id].pk, hashtags[h].pk)
+                for twitter_id, r in relations.items()
+                for h in r["hashtags"]
+            ],
+            clear=tweet_pks,
+        )
+
+        top_level_ids = list(OrderedDict.fromkeys(t["id_str"].lower() for t in tweets))
+        if tweet_set:
+            bulk_add_m2m(
+                type(tweet_set),
+                "tweets",
+                [(tweet_set.pk, existing[twitter_id].pk) for twitter_id in top_level_ids],
+            )
+        if profile_set:
+            bulk_add_m2m(
+                type(profile_set),
+                "profiles",
+                [
+                    (profile_set.pk, profiles[relations[twitter_id]["profile"]].pk)
+                    for twitter_id in top_level_ids
+                ],
+            )
+
+        self.apply_pending_deletes(tweet_data.keys())
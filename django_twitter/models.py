@@ -7,14 +7,9 @@ import re
 import json
 import simple_history
 import django
-import itertools
-import copy
-import pytz
 import datetime
-import pandas as pd
-import traceback
 
-from django.db import models
+from django.db import DatabaseError, models
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
 from django.conf import settings
@@ -24,14 +19,30 @@ from picklefield.fields import PickledObjectField
 from simple_history import register
 from simple_history.models import HistoricalRecords
 from dateutil.parser import parse as date_parse
-from difflib import SequenceMatcher
 from collections import defaultdict
 
 from pewtils import decode_text, is_not_null, is_null
 from django_pewtils import consolidate_objects
 from future.utils import with_metaclass
 
-from django_twitter.utils import get_concrete_model, safe_get_or_create
+from django_twitter.utils import (
+    get_concrete_model,
+    get_twitter_profile_dataframe,
+    safe_get_or_create,
+    register_concrete_model,
+)
+from django_twitter.parsers import (
+    load_json,
+    parse_profile_json,
+    parse_tweet_json,
+    get_tweet_relations,
+)
+from django_twitter.managers import (
+    TweetManager,
+    TwitterProfileListManager,
+    TwitterProfileManager,
+    ingest_json_individually,
+)
 
 
 class AbstractTwitterBase(models.base.ModelBase):
@@ -58,6 +69,10 @@ class AbstractTwitterBase(models.base.ModelBase):
             model_name = re.sub("Abstract", "", base.__name__) + "Model"
             if base.__module__.startswith("django_twitter"):
                 setattr(cls, model_name, model)
+                if not model._meta.abstract and model._meta.app_label == getattr(
+                    settings, "TWITTER_APP", None
+                ):
+                    register_concrete_model(base.__name__, model)
 
         counts = defaultdict(int)
         fields_to_add = {
@@ -157,6 +172,35 @@ class AbstractTwitterBase(models.base.ModelBase):
                     None,
                 ),
             ],
+            "TwitterProfileListChurnModel": [
+                (
+                    models.ForeignKey,
+                    "TwitterProfileModel",
+                    "profile",
+                    "list_churn",
+                    None,
+                    True,
+                    models.CASCADE,
+                ),
+                (
+                    models.OneToOneField,
+                    "TwitterFollowerListModel",
+                    "follower_list",
+                    "churn",
+                    None,
+                    True,
+                    models.CASCADE,
+                ),
+                (
+                    models.OneToOneField,
+                    "TwitterFollowingListModel",
+                    "following_list",
+                    "churn",
+                    None,
+                    True,
+                    models.CASCADE,
+                ),
+            ],
             "TwitterProfileSnapshotModel": [
                 (
                     models.ForeignKey,
@@ -335,6 +379,19 @@ class AbstractTwitterProfile(
         help_text="The latest error code encountered when attempting to collect this profile's data from the API",
     )
 
+    newest_tweet_id = models.BigIntegerField(
+        null=True,
+        help_text="The ID of the newest tweet collected from the profile's timeline. Used as the `since_id` by the \
+        `django_twitter_get_profile_tweets` command, so that later syncs only request newer tweets.",
+    )
+    oldest_tweet_id = models.BigIntegerField(
+        null=True,
+        help_text="The ID of the oldest tweet collected from the profile's timeline. If the profile hasn't been \
+        backfilled yet, the `django_twitter_get_profile_tweets` command resumes from here (using `max_id`).",
+    )
+
+    objects = TwitterProfileManager()
+
     def __str__(self):
 
         return str(
@@ -343,14 +400,70 @@ class AbstractTwitterProfile(
             else self.twitter_id
         )
 
-    def save(self, *args, **kwargs):
+    def __init__(self, *args, **kwargs):
+
+        super(AbstractTwitterProfile, self).__init__(*args, **kwargs)
+        # Read from __dict__ so a deferred field doesn't get loaded
+        self._loaded_snapshot_id = self.__dict__.get("most_recent_snapshot_id")
+
+    def refresh_from_db(self, using=None, fields=None):
+
+        super(AbstractTwitterProfile, self).refresh_from_db(using=using, fields=fields)
+        if fields is None or set(fields).intersection(
+            ["most_recent_snapshot", "most_recent_snapshot_id"]
+        ):
+            self._loaded_snapshot_id = self.__dict__.get("most_recent_snapshot_id")
+
+    def save(
+        self, force_insert=False, force_update=False, using=None, update_fields=None
+    ):
         """
-        Updates the profile's `most_recent_snapshot` relation every time the profile gets saved.
+        Saves the profile. The `most_recent_snapshot` relation is kept up to date by the snapshots themselves when \
+        they're created, so if it hasn't been changed since the profile was loaded, it gets left out of the update \
+        rather than overwriting a newer snapshot with a potentially stale value. Assigning a snapshot to it \
+        explicitly still saves it.
         """
 
-        if self.snapshots.count() > 0:
-            self.most_recent_snapshot = self.snapshots.order_by("-timestamp")[0]
-        super(AbstractTwitterProfile, self).save(*args, **kwargs)
+        snapshot_id = self.__dict__.get("most_recent_snapshot_id")
+        if (
+            not self._state.adding
+            and update_fields is None
+            and not force_insert
+            and snapshot_id == self._loaded_snapshot_id
+        ):
+            deferred = self.get_deferred_fields()
+            try:
+                super(AbstractTwitterProfile, self).save(
+                    force_update=force_update,
+                    using=using,
+                    update_fields=[
+                        f.name
+                        for f in self._meta.concrete_fields
+                        if not f.primary_key
+                        and f.name != "most_recent_snapshot"
+                        and f.attname not in deferred
+                    ],
+                )
+            except DatabaseError:
+                # The row was deleted since the profile was loaded, so save it in full instead
+                if (
+                    self.__class__._base_manager.using(using or self._state.db)
+                    .filter(pk=self.pk)
+                    .exists()
+                ):
+                    raise
+                super(AbstractTwitterProfile, self).save(
+                    force_update=force_update, using=using
+                )
+        else:
+            super(AbstractTwitterProfile, self).save(
+                force_insert=force_insert,
+                force_update=force_update,
+                using=using,
+                update_fields=update_fields,
+            )
+            if update_fields is None or "most_recent_snapshot" in update_fields:
+                self._loaded_snapshot_id = snapshot_id
 
     def url(self):
         """
@@ -362,9 +475,10 @@ class AbstractTwitterProfile(
 
     def get_snapshots(self, start_date, end_date, *extra_values, **kwargs):
         """
-        Loops over the profile's snapshots for a given time range, and compiles a Pandas DataFrame of the profile's \
-        dynamic data (e.g. follower counts, description, etc.) Uses linear interpolation to fill in missing days for \
-        numeric values, and front-filling for non-numeric values.
+        Compiles a Pandas DataFrame of the profile's dynamic data (e.g. follower counts, description, etc.) from its \
+        snapshots for a given time range. Uses linear interpolation to fill in missing days for numeric values, and \
+        front-filling for non-numeric values. See `django_twitter.utils.get_twitter_profile_dataframe` to do this \
+        for many profiles at once.
 
         :param start_date: The start of the date range you want to extract
         :type start_date: `datetime.datetime` or `datetime.date`
@@ -376,203 +490,63 @@ class AbstractTwitterProfile(
         empty.
         :return: Pandas DataFrame of the profile's snapshots
         """
-        skip_interpolation = kwargs.get("skip_interpolation", False)
-
-        start_date = datetime.datetime(
-            start_date.year,
-            start_date.month,
-            start_date.day,
-            0,
-            0,
-            0,
-            tzinfo=pytz.timezone("US/Eastern"),
-        )
-        end_date = datetime.datetime(
-            end_date.year,
-            end_date.month,
-            end_date.day,
-            23,
-            59,
-            59,
-            tzinfo=pytz.timezone("US/Eastern"),
-        )
-        columns = [
-            "description",
-            "timestamp",
-            "followers_count",
-            "favorites_count",
-            "followings_count",
-            "listed_count",
-            "statuses_count",
-            "name",
-            "screen_name",
-            "status",
-            "is_verified",
-            "is_protected",
-            "location",
-            "profile__created_at",
-            "profile__twitter_error_code",
-        ]
-        columns.extend(extra_values)
-        stats = pd.DataFrame.from_records(self.snapshots.values(*columns)).rename(
-            columns={
-                "profile__created_at": "created_at",
-                "profile__twitter_error_code": "twitter_error_code",
-            }
-        )
-        if len(stats) == 0:
-            stats = pd.DataFrame(columns=columns).rename(
-                columns={
-                    "profile__created_at": "created_at",
-                    "profile__twitter_error_code": "twitter_error_code",
-                }
-            )
 
-        try:
-            stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_convert(
-                tz="US/Eastern"
-            )
-        except TypeError:
-            try:
-                stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_localize(
-                    tz="US/Eastern"
-                )
-            except:
-                stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_localize(
-                    tz="US/Eastern", ambiguous=True
-                )
-
-        if stats["timestamp"].min() > start_date:
-            stats = pd.concat([stats, pd.DataFrame([{"timestamp": start_date}])])
-        else:
-            min_date = stats[stats["timestamp"] <= start_date]["timestamp"].max()
-            stats = stats[stats["timestamp"] >= min_date]
-        if stats["timestamp"].max() < end_date:
-            stats = pd.concat([stats, pd.DataFrame([{"timestamp": end_date}])])
-        else:
-            max_date = stats[stats["timestamp"] >= end_date]["timestamp"].min()
-            stats = stats[stats["timestamp"] <= max_date]
-
-        stats = (
-            stats.sort_values("timestamp", ascending=False)
-            .set_index("timestamp")
-            .resample("D")
-            .first()
-        )
-        # Resampling drops null columns so we're adding them back in
-        for col in columns:
-            if (
-                col
-                not in [
-                    "timestamp",
-                    "profile__created_at",
-                    "profile__twitter_error_code",
-                ]
-                and col not in stats.columns
-            ):
-                stats[col] = None
-
-        if not skip_interpolation:
-            for col in [
-                "followers_count",
-                "favorites_count",
-                "followings_count",
-                "listed_count",
-                "statuses_count",
-            ]:
-                stats[col] = stats[col].interpolate(
-                    limit_area="inside", limit_direction="forward", method="linear"
-                )
-            for col in [
-                "description",
-                "name",
-                "screen_name",
-                "status",
-                "is_verified",
-                "is_protected",
-                "created_at",
-                "location",
-                "twitter_error_code",
-            ]:
-                stats[col] = stats[col].interpolate(
-                    limit_area="inside", limit_direction="forward", method="pad"
-                )
-            for col in extra_values:
-                stats[col] = stats[col].interpolate(
-                    limit_area="inside", limit_direction="forward", method="pad"
-                )
-        stats = stats.reset_index().rename(columns={"timestamp": "date"})
-        stats["date"] = stats["date"].map(lambda x: x.date())
-        stats = stats[
-            (stats["date"] >= start_date.date()) & (stats["date"] <= end_date.date())
-        ]
-
-        stats["twitter_id"] = self.twitter_id
-        stats["pk"] = self.pk
-        stats[["description", "name", "screen_name", "status", "location"]] = (
-            stats[["description", "name", "screen_name", "status", "location"]]
-            .fillna("")
-            .apply(lambda x: x.str.replace("\r", " "))
+        return get_twitter_profile_dataframe(
+            self.__class__.objects.filter(pk=self.pk),
+            start_date,
+            end_date,
+            *extra_values,
+            **kwargs
         )
 
-        return stats
-
     # TODO: these should be renamed "most_recent_followers" etc. because that's more accurate
     def current_followers(self):
         """
         Helper function to return a QuerySet of follower profiles from the profile's most recently collected \
         follower list.
-        :return: QuerySet of TwitterProfiles for followers
+        :return: QuerySet of TwitterProfiles for followers (empty if no follower list has been finished)
         """
 
-        try:
-            followers = self.follower_lists.filter(finish_time__isnull=False).order_by(
-                "-finish_time"
-            )[0]
-        except IndexError:
-            followers = None
-        return followers.followers.all()
+        followers = self.current_follower_list()
+        if not followers:
+            return self.__class__.objects.none()
+        return followers.get_profiles()
 
     def current_follower_list(self):
         """
         Helper function to return the profile's most recently collected follower list
-        :return: TwitterFollowerList
+        :return: TwitterFollowerList, or None if no follower list has been finished
         """
 
-        try:
-            followers = self.follower_lists.filter(finish_time__isnull=False).order_by(
-                "-finish_time"
-            )[0]
-        except IndexError:
-            followers = None
-        return followers
+        return (
+            self.follower_lists.filter(finish_time__isnull=False)
+            .order_by("-finish_time")
+            .first()
+        )
 
     def current_followings(self):
         """
         Helper function to return a QuerySet of following profiles from the profile's most recently collected \
         following list.
-        :return: QuerySet of TwitterProfiles for followings
+        :return: QuerySet of TwitterProfiles for followings (empty if no following list has been finished)
         """
-        try:
-            followings = self.following_lists.filter(
-                finish_time__isnull=False
-            ).order_by("-finish_time")[0]
-        except IndexError:
-            followings = None
-        return followings.followings.all()
+
+        followings = self.current_following_list()
+        if not followings:
+            return self.__class__.objects.none()
+        return followings.get_profiles()
 
     def current_following_list(self):
         """
         Helper function to return the profile's most recently collected following list
-        :return: TwitterFollowingList
+        :return: TwitterFollowingList, or None if no following list has been finished
         """
-        try:
-            followings = self.following_lists.filter(
-                finish_time__isnull=False
-            ).order_by("-finish_time")[0]
-        except IndexError:
-            followings = None
-        return followings
+
+        return (
+            self.following_lists.filter(finish_time__isnull=False)
+            .order_by("-finish_time")
+            .first()
+        )
 
 
 class AbstractTwitterProfileSnapshot(with_metaclass(AbstractTwitterBase, models.Model)):
@@ -639,6 +613,42 @@ class AbstractTwitterProfileSnapshot(with_metaclass(AbstractTwitterBase, models.
 
         return "{} AS OF {}".format(str(self.profile), self.timestamp)
 
+    def save(self, *args, **kwargs):
+        """
+        When a snapshot is first created, it becomes its profile's `most_recent_snapshot`. Snapshots are \
+        timestamped when they're created, so a new snapshot is always the profile's most recent one.
+        """
+
+        is_new = self._state.adding
+        super(AbstractTwitterProfileSnapshot, self).save(*args, **kwargs)
+        if is_new and self.profile_id:
+            get_concrete_model("AbstractTwitterProfile").objects.filter(
+                pk=self.profile_id
+            ).update(most_recent_snapshot=self)
+            if self._meta.get_field("profile").is_cached(self):
+                self.profile.most_recent_snapshot = self
+                self.profile._loaded_snapshot_id = self.pk
+
+    def delete(self, *args, **kwargs):
+        """
+        If the snapshot was its profile's `most_recent_snapshot`, the profile will be pointed at the next most \
+        recent one instead.
+        """
+
+        profile_id = self.profile_id
+        result = super(AbstractTwitterProfileSnapshot, self).delete(*args, **kwargs)
+        if profile_id:
+            get_concrete_model("AbstractTwitterProfile").objects.filter(
+                pk=profile_id, most_recent_snapshot__isnull=True
+            ).update(
+                most_recent_snapshot=models.Subquery(
+                    self.__class__.objects.filter(profile_id=profile_id)
+                    .order_by("-timestamp")
+                    .values("pk")[:1]
+                )
+            )
+        return result
+
     # TODO: these should actually try to grab the lists that are closest to the snapshot's timestamp
     # @property
     # def followers(self):
@@ -665,59 +675,16 @@ class AbstractTwitterProfileSnapshot(with_metaclass(AbstractTwitterBase, models.
         if not profile_data:
             profile_data = self.json
 
-        if not hasattr(profile_data, "keys"):
-            while not hasattr(profile_data, "keys"):
-                profile_data = json.loads(profile_data)
+        profile_data = load_json(profile_data)
 
         if profile_data:
-            for db_name, api_name in [
-                ("name", None),
-                ("contributors_enabled", None),
-                ("description", None),
-                ("followers_count", None),
-                ("followings_count", "friends_count"),
-                ("is_verified", "verified"),
-                ("is_protected", "protected"),
-                ("listed_count", None),
-                ("location", None),
-                ("profile_image_url", None),
-                ("statuses_count", None),
-            ]:
-                if not api_name or len(api_name) < 1:
-                    api_name = db_name
-
-                if api_name in profile_data:
-                    setattr(self, db_name, profile_data[api_name])
+            for field, value in parse_profile_json(profile_data).items():
+                setattr(self, field, value)
 
             self.profile.created_at = date_parse(profile_data["created_at"])
-            self.profile.screen_name = profile_data["screen_name"].lower()
+            self.profile.screen_name = self.screen_name
             self.profile.save()
 
-            self.screen_name = profile_data["screen_name"].lower()
-            self.favorites_count = (
-                profile_data["favorites_count"]
-                if "favorites_count" in list(profile_data.keys())
-                else profile_data["favourites_count"]
-            )
-            self.status = (
-                profile_data["status"]["text"]
-                if "status" in list(profile_data.keys())
-                else None
-            )
-
-            if "url" in list(profile_data.get("entities", {}).keys()):
-                urls = [
-                    url["expanded_url"]
-                    for url in profile_data.get("entities", {})
-                    .get("url", {})
-                    .get("urls", [])
-                    if url["expanded_url"]
-                ]
-            else:
-                urls = [profile_data.get("url", "")]
-            urls = [u for u in urls if is_not_null(u)]
-            self.urls = urls
-            self.json = profile_data
             try:
                 self.save()
             except (django.db.utils.IntegrityError, ValueError):
@@ -794,6 +761,14 @@ class AbstractTweet(with_metaclass(AbstractTwitterBase, AbstractTwitterObject)):
         null=True, default=dict, help_text="The raw JSON for the tweet"
     )
 
+    is_deleted = models.BooleanField(
+        default=False,
+        help_text="Whether the tweet has been deleted on Twitter, based on the delete notices received by the \
+        `django_twitter_collect_tweet_stream` command",
+    )
+
+    objects = TweetManager()
+
     def __str__(self):
 
         return "{0}, {1}:\nhttps://twitter.com/{2}/status/{3}/:\n {4}".format(
@@ -808,291 +783,373 @@ class AbstractTweet(with_metaclass(AbstractTwitterBase, AbstractTwitterObject)):
 
         """
         Parses raw JSON collected from the Twitter API into the various fields and relations. If no new JSON is passed, \
-        the tweet will update itself using whatever it already has stored in its `json` field.
+        the tweet will update itself using whatever it already has stored in its `json` field. Any tweets that it \
+        quoted or retweeted get saved too; each tweet and profile snapshot is only saved once, even if it's embedded \
+        more than once.
 
         :param tweet_data: JSON from the API
         """
 
-        TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
-
         if not tweet_data:
             tweet_data = self.json
         if tweet_data:
 
-            if not hasattr(tweet_data, "keys"):
-                while not hasattr(tweet_data, "keys"):
-                    tweet_data = json.loads(tweet_data)
+            tweet_data = load_json(tweet_data)
 
             if not self.pk:
                 self.save()
                 self.refresh_from_db()
 
-            # PROFILE
+            ingest_json_individually(
+                [tweet_data], instances={tweet_data["id_str"].lower(): self}
+            )
+
+    def _update_from_json(self, tweet_data, profiles=None):
+
+        """
+        Parses the JSON for a single tweet into its fields and relations. Quoted and retweeted tweets are linked but \
+        not parsed, and the author's snapshot isn't created here; `update_from_json` takes care of both.
+
+        :param tweet_data: JSON from the API
+        :param profiles: (Optional) A dictionary of profiles that have already been saved, keyed by Twitter ID
+        """
+
+        relations = get_tweet_relations(tweet_data)
+
+        # PROFILE
+        author = (profiles or {}).get(relations["profile"], None)
+        if not author:
             author = safe_get_or_create(
-                "AbstractTwitterProfile",
+                "AbstractTwitterProfile", "twitter_id", relations["profile"], create=True
+            )
+        self.profile = author
+
+        # PROFILE MENTIONS
+        profile_mentions = []
+        for twitter_id in relations["profile_mentions"]:
+            mentioned_profile = safe_get_or_create(
+                "AbstractTwitterProfile", "twitter_id", twitter_id, create=True
+            )
+            profile_mentions.append(mentioned_profile)
+        self.profile_mentions.set(profile_mentions)
+
+        # HASHTAGS
+        hashtags = []
+        for name in relations["hashtags"]:
+            hashtag_obj = safe_get_or_create(
+                "AbstractTwitterHashtag", "name", name, create=True
+            )
+            hashtags.append(hashtag_obj)
+        self.hashtags.set(hashtags)
+
+        # REPLY TO STATUS
+        if relations["in_reply_to_status"]:
+            tweet_obj = safe_get_or_create(
+                "AbstractTweet",
                 "twitter_id",
-                tweet_data["user"]["id_str"],
+                relations["in_reply_to_status"],
                 create=True,
             )
-            snapshot = TwitterProfileSnapshot.objects.create(
-                profile=author, json=tweet_data["user"]
-            )
-            snapshot.update_from_json()
-            self.profile = author
-
-            # PROFILE MENTIONS
-            profile_mentions = []
-            for profile_mention in tweet_data.get("entities", {}).get(
-                "user_mentions", []
-            ):
-                mentioned_profile = safe_get_or_create(
+            if not tweet_obj.profile and relations["in_reply_to_user"]:
+                reply_author_obj = safe_get_or_create(
                     "AbstractTwitterProfile",
                     "twitter_id",
-                    profile_mention["id_str"],
+                    relations["in_reply_to_user"],
                     create=True,
                 )
-                profile_mentions.append(mentioned_profile)
-            self.profile_mentions.set(profile_mentions)
-
-            # HASHTAGS
-            hashtags = []
-            for hashtag in tweet_data.get("entities", {}).get("hashtags", []):
-                hashtag_obj = safe_get_or_create(
-                    "AbstractTwitterHashtag",
-                    "name",
-                    hashtag["text"].lower(),
-                    create=True,
+                tweet_obj.profile = reply_author_obj
+                tweet_obj.save()
+            self.in_reply_to_status = tweet_obj
+
+        # QUOTE STATUS AND RETWEETED STATUS
+        # These are saved before the tweets that embed them, so they'll already exist
+        for field in ["quoted_status", "retweeted_status"]:
+            if relations[field]:
+                setattr(
+                    self,
+                    field,
+                    safe_get_or_create(
+                        "AbstractTweet", "twitter_id", relations[field], create=True
+                    ),
                 )
-                hashtags.append(hashtag_obj)
-            self.hashtags.set(hashtags)
 
-            # REPLY TO STATUS
-            if tweet_data.get("in_reply_to_status_id", None):
-                tweet_obj = safe_get_or_create(
-                    "AbstractTweet",
-                    "twitter_id",
-                    tweet_data["in_reply_to_status_id_str"].lower(),
-                    create=True,
-                )
-                tweet_obj.refresh_from_db()
-                if not tweet_obj.profile and tweet_data.get(
-                    "in_reply_to_user_id_str", None
-                ):
-                    reply_author_obj = safe_get_or_create(
-                        "AbstractTwitterProfile",
-                        "twitter_id",
-                        tweet_data["in_reply_to_user_id_str"].lower(),
-                        create=True,
-                    )
-                    tweet_obj.profile = reply_author_obj
-                    tweet_obj.save()
-                self.in_reply_to_status = tweet_obj
-
-            # QUOTE STATUS
-            if tweet_data.get("quoted_status", None):
-                tweet_obj = safe_get_or_create(
-                    "AbstractTweet",
-                    "twitter_id",
-                    tweet_data["quoted_status"]["id_str"].lower(),
-                    create=True,
-                )
-                tweet_obj.refresh_from_db()
-                tweet_obj.update_from_json(tweet_data["quoted_status"])
-                self.quoted_status = tweet_obj
-
-            # RETWEETED STATUS
-            if tweet_data.get("retweeted_status", None):
-                tweet_obj = safe_get_or_create(
-                    "AbstractTweet",
-                    "twitter_id",
-                    tweet_data["retweeted_status"]["id_str"].lower(),
-                    create=True,
+        # UPDATE TWEET (text, links, media, etc.)
+        for field, value in parse_tweet_json(
+            tweet_data, existing_links=self.links
+        ).items():
+            setattr(self, field, value)
+
+        try:
+            self.save()
+
+        except:
+            try:
+                self.text = decode_text(self.text)
+                self.json = json.loads(decode_text(json.dumps(self.json)))
+                self.save()
+
+            except Exception as e:
+                print(e)
+
+    def url(self):
+        """
+        Returns a URL for the tweet
+        """
+        return "http://www.twitter.com/statuses/{0}".format(self.twitter_id)
+
+
+MAX_DELTA_DEPTH = 10
+
+
+class AbstractTwitterProfileList(models.Model):
+    """
+    A base class for follower and following lists. By default, the profiles on a list are stored on a \
+    many-to-many relation, but lists can also be stored compactly (see `set_twitter_ids`), as a sorted array of \
+    Twitter IDs or as the difference from an earlier list, which takes up far less space for large accounts \
+    whose lists get collected repeatedly.
+    """
+
+    class Meta(object):
+        abstract = True
+
+    profiles_field = None
+    churn_field = None
+
+    objects = TwitterProfileListManager()
+
+    twitter_ids = ArrayField(
+        models.BigIntegerField(),
+        null=True,
+        help_text="If the list is stored compactly, a sorted array of the Twitter IDs of the profiles on the list",
+    )
+    base_list = models.ForeignKey(
+        "self",
+        null=True,
+        on_delete=models.RESTRICT,
+        related_name="+",
+        help_text="If the list is stored compactly as a difference from an earlier list, the earlier list",
+    )
+    added_twitter_ids = ArrayField(
+        models.BigIntegerField(),
+        null=True,
+        help_text="Twitter IDs that are on this list but not on `base_list`",
+    )
+    removed_twitter_ids = ArrayField(
+        models.BigIntegerField(),
+        null=True,
+        help_text="Twitter IDs that are on `base_list` but not on this list",
+    )
+    delta_depth = models.IntegerField(
+        default=0,
+        help_text="The number of lists that need to be read to reconstruct this one, if it's stored as a difference",
+    )
+    next_cursor = models.BigIntegerField(
+        null=True,
+        help_text="The API cursor for the next page of the list, saved after each page so that collection can be \
+        resumed if it gets interrupted (0 once the last page has been collected)",
+    )
+    page_count = models.IntegerField(
+        default=0, help_text="The number of pages of the list that have been collected"
+    )
+
+    def is_compact(self):
+        """
+        :return: True if the list is stored compactly, rather than on its many-to-many relation
+        """
+
+        return self.twitter_ids is not None or self.base_list_id is not None
+
+    def get_twitter_ids(self):
+        """
+        :return: A sorted list of the Twitter IDs of the profiles on the list (as integers)
+        """
+
+        deltas = []
+        current = self
+        while current.twitter_ids is None and current.base_list_id:
+            deltas.append((current.added_twitter_ids, current.removed_twitter_ids))
+            current = current.base_list
+        if current.twitter_ids is not None:
+            twitter_ids = set(current.twitter_ids)
+        else:
+            twitter_ids = set(
+                int(t)
+                for t in getattr(current, current.profiles_field).values_list(
+                    "twitter_id", flat=True
                 )
-                tweet_obj.refresh_from_db()
-                tweet_obj.update_from_json(tweet_data["retweeted_status"])
-                self.retweeted_status = tweet_obj
-
-            # UPDATE TWEET
-            self.created_at = date_parse(tweet_data["created_at"])
-            self.retweet_count = tweet_data.get("retweet_count", None)
-            self.favorite_count = tweet_data.get("favorite_count", None)
-            self.language = tweet_data.get("lang", None)
-
-            # Discovered full_text areas:
-            # extended_tweet/full_text/
-            # retweeted_status/extended_tweet/full_text/
-            # quoted_status/extended_tweet/full_text/
-            # retweeted_status/quoted_status/extended_tweet/full_text/
-
-            text_patterns = [[], ["extended_tweet"]]
-            additional_text_patterns = [
-                ["retweeted_status", "extended_tweet"],
-                ["quoted_status", "extended_tweet"],
-                ["retweeted_status", "quoted_status"],
-                ["retweeted_status", "quoted_status", "extended_tweet"],
-                ["retweeted_status"],
-                ["quoted_status"],
-            ]
-            text_keys = ["full_text", "text"]
-
-            def get_text(tweet_data):
-
-                all_text = []
-
-                for keys in text_patterns:
-                    subset = tweet_data
-                    for key in keys:
-                        subset = subset.get(key, {})
-                    for text_key in text_keys:
-                        if text_key in subset.keys():
-                            text = subset[text_key]
-                            if text not in all_text:
-                                all_text.append(text)
-
-                for keys in additional_text_patterns:
-                    subset = tweet_data
-                    for key in keys:
-                        subset = subset.get(key, {})
-                    for text_key in text_keys:
-                        if text_key in subset.keys():
-                            additional_text = subset[text_key]
-                            if additional_text not in all_text:
-                                all_text.append(additional_text)
-
-                all_text = [
-                    re.sub(text[-1], "", text)
-                    if text.endswith("\u2026") or text.endswith("\u2026")
-                    else text
-                    for text in all_text
-                ]
-                if len(all_text) > 1:
-                    new_all_text = copy.deepcopy(all_text)
-                    for text, additional_text in itertools.permutations(all_text, 2):
-                        s = SequenceMatcher(None, additional_text, text, autojunk=True)
-                        blocks = s.get_matching_blocks()
-                        if len(blocks) > 0:
-                            new_additional_text = None
-                            for block in blocks:
-                                if block.size > 1:
-                                    overlap = additional_text[
-                                        block.a : (block.a + block.size)
-                                    ]
-                                    if text.endswith(
-                                        overlap
-                                    ) and additional_text.startswith(overlap):
-                                        new_additional_text = additional_text.replace(
-                                            overlap, ""
-                                        )
-                            if new_additional_text is not None:
-                                new_all_text = [
-                                    t
-                                    for t in new_all_text
-                                    if t not in [text, additional_text]
-                                ]
-                                new_all_text.append(
-                                    "".join([text, new_additional_text])
-                                )
-                    all_text = new_all_text
+            )
+        for added, removed in reversed(deltas):
+            twitter_ids.difference_update(removed or [])
+            twitter_ids.update(added or [])
+        return sorted(twitter_ids)
 
-                if len(all_text) > 0:
-                    text = " ".join(all_text)
-                else:
-                    text = None
+    def get_profiles(self):
+        """
+        :return: A QuerySet of the profiles on the list, whether it's stored compactly or not
+        """
 
-                return text
+        if self.is_compact():
+            return get_concrete_model("AbstractTwitterProfile").objects.filter(
+                twitter_id__in=[str(t) for t in self.get_twitter_ids()]
+            )
+        return getattr(self, self.profiles_field).all()
 
-            self.text = get_text(tweet_data)
-            self.text = "{}".format(self.text)
+    def set_twitter_ids(self, twitter_ids, base_list=None):
+        """
+        Stores the list compactly. If a `base_list` is provided and the two lists are similar enough, only the \
+        difference between them gets stored; otherwise (or if reconstructing the base list would already involve \
+        reading too many other lists) the full array of IDs is stored. Doesn't save the list.
 
-            ### LINKS
+        :param twitter_ids: The Twitter IDs of the profiles on the list
+        :param base_list: (Optional) An earlier list for the same profile
+        """
 
-            try:
-                links = set(self.links)
-
-            except TypeError:
-                links = set()
-
-            for u in tweet_data.get("entities", {}).get("urls", []):
-                link = u.get("expanded_url", "")
-
-                if len(link) > 399:
-                    link = u.get("url", "")
-
-                if is_not_null(link):
-                    links.add(link)
-
-            self.links = list(links)
-
-            ### MEDIA
-
-            media = []
-            for m in tweet_data.get("extended_entities", {}).get("media", []):
-                try:
-                    if m["type"] == "video":
-                        element = {
-                            "url": None,
-                            "bitrate": None,
-                            "content_type": None,
-                            "duration": None,
-                            "aspect_ratio": None,
-                        }
-                        if "aspect_ratio" in m["video_info"]:
-                            element["aspect_ratio"] = ":".join(
-                                [str(a) for a in m["video_info"]["aspect_ratio"]]
-                            )
-                        if "duration_millis" in m["video_info"]:
-                            element["duration"] = m["video_info"]["duration_millis"]
-                        v = sorted(
-                            m["video_info"]["variants"],
-                            key=lambda x: x["bitrate"] if "bitrate" in x else 0,
-                            reverse=True,
-                        )[0]
-                        element["url"] = v["url"]
-                        element["bitrate"] = v["bitrate"]
-                        element["content_type"] = v["content_type"]
-
-                    else:
-                        element = {"url": m["media_url_https"]}
-                        element["width"] = m["sizes"]["large"]["w"]
-                        element["height"] = m["sizes"]["large"]["h"]
-                        element["content_type"] = (
-                            "image/gif" if m["type"] == "animated_gif" else "image"
-                        )
-
-                except:
-                    print(traceback.format_exc())
-                    element = m
-
-                media.append(element)
-
-            self.media = list(media)
-
-            self.json = tweet_data
+        twitter_ids = set(int(t) for t in twitter_ids)
+        self.twitter_ids, self.base_list = None, None
+        self.added_twitter_ids, self.removed_twitter_ids = None, None
+        self.delta_depth = 0
+        if base_list and base_list.delta_depth < MAX_DELTA_DEPTH:
+            base_ids = set(base_list.get_twitter_ids())
+            added = twitter_ids.difference(base_ids)
+            removed = base_ids.difference(twitter_ids)
+            if len(added) + len(removed) < len(twitter_ids) / 2:
+                self.base_list = base_list
+                self.added_twitter_ids = sorted(added)
+                self.removed_twitter_ids = sorted(removed)
+                self.delta_depth = base_list.delta_depth + 1
+                return
+        self.twitter_ids = sorted(twitter_ids)
+
+    def get_previous_list(self):
+        """
+        :return: The most recent list for the same profile that was finished before this one, if there is one
+        """
 
-            try:
-                self.save()
+        previous = self.__class__.objects.filter(
+            profile_id=self.profile_id, finish_time__isnull=False
+        ).exclude(pk=self.pk)
+        if self.finish_time:
+            previous = previous.filter(finish_time__lt=self.finish_time)
+        return previous.order_by("-finish_time").first()
 
-            except:
-                try:
-                    self.text = decode_text(self.text)
-                    self.json = json.loads(decode_text(json.dumps(self.json)))
-                    self.save()
+    def get_changes(self, previous_list=None):
+        """
+        Computes the profiles that were added to and removed from the list since an earlier list (e.g. followers \
+        gained and lost). If both lists are stored on their many-to-many relation, the differences are computed \
+        in the database with `EXCEPT` queries on the through table; if this list is stored as a difference from \
+        the earlier one, the stored difference is used. Otherwise, both lists get read with `get_twitter_ids`.
+
+        :param previous_list: (Optional) The list to compare against; defaults to `get_previous_list`
+        :return: A tuple of sorted lists of the Twitter IDs (as integers) that were added and removed. If there's \
+        no earlier list, every profile on the list counts as added.
+        """
 
-                except Exception as e:
-                    print(e)
+        previous_list = previous_list or self.get_previous_list()
+        if not previous_list:
+            return self.get_twitter_ids(), []
+        if self.base_list_id == previous_list.pk:
+            return (
+                sorted(self.added_twitter_ids or []),
+                sorted(self.removed_twitter_ids or []),
+            )
+        if not self.is_compact() and not previous_list.is_compact():
+            current, previous = self._get_through_ids(), previous_list._get_through_ids()
+            return (
+                sorted(int(t) for t in current.difference(previous)),
+                sorted(int(t) for t in previous.difference(current)),
+            )
+        current = set(self.get_twitter_ids())
+        previous = set(previous_list.get_twitter_ids())
+        return sorted(current.difference(previous)), sorted(previous.difference(current))
 
-    def url(self):
+    def save_churn(self):
         """
-        Returns a URL for the tweet
+        Saves the list's changes since the profile's previous list (see `get_changes`) to your app's \
+        `AbstractTwitterProfileListChurn` model, replacing any that were saved before. Gets called automatically \
+        by `finish`; does nothing if your app doesn't implement the model or the list isn't finished.
+
+        :return: The churn object, or None
         """
-        return "http://www.twitter.com/statuses/{0}".format(self.twitter_id)
 
+        TwitterProfileListChurn = get_concrete_model("AbstractTwitterProfileListChurn")
+        if not TwitterProfileListChurn or not self.finish_time:
+            return None
+        previous_list = self.get_previous_list()
+        added, removed = self.get_changes(previous_list=previous_list)
+        churn, _ = TwitterProfileListChurn.objects.update_or_create(
+            defaults={
+                "profile_id": self.profile_id,
+                "finish_time": self.finish_time,
+                "previous_finish_time": getattr(previous_list, "finish_time", None),
+                "added_twitter_ids": added,
+                "removed_twitter_ids": removed,
+                "added_count": len(added),
+                "removed_count": len(removed),
+            },
+            **{self.churn_field: self}
+        )
+        return churn
+
+    def _get_through_ids(self):
+
+        field = self._meta.get_field(self.profiles_field)
+        return field.remote_field.through.objects.filter(
+            **{"{}_id".format(field.m2m_field_name()): self.pk}
+        ).values_list("{}__twitter_id".format(field.m2m_reverse_field_name()), flat=True)
+
+    def finish(self, twitter_ids=None):
+        """
+        Marks the list as complete and saves it. If the list is being stored compactly, it gets stored as a \
+        difference from the profile's previous list if possible (see `set_twitter_ids`).
+
+        :param twitter_ids: (Optional) The Twitter IDs of the profiles on the list. By default, the IDs that were \
+        added to the list's `twitter_ids` array while it was being collected are used; if it doesn't have one, \
+        the profiles are assumed to be on its many-to-many relation.
+        """
 
-class AbstractTwitterFollowerList(with_metaclass(AbstractTwitterBase, models.Model)):
+        if twitter_ids is None and self.pk:
+            twitter_ids = (
+                self.__class__.objects.filter(pk=self.pk)
+                .values_list("twitter_ids", flat=True)
+                .first()
+            )
+        if twitter_ids is not None:
+            self.set_twitter_ids(twitter_ids, base_list=self.get_previous_list())
+        self.finish_time = datetime.datetime.now()
+        self.save()
+        self.save_churn()
+
+    def delete(self, *args, **kwargs):
+        """
+        Lists that are stored as a difference from this one get converted to full arrays of IDs first, and the \
+        churn saved for the profile's next list (see `save_churn`) gets recomputed.
+        """
+
+        for dependent in self.__class__.objects.filter(base_list=self):
+            dependent.set_twitter_ids(dependent.get_twitter_ids())
+            dependent.save()
+        next_list = None
+        if self.finish_time:
+            next_list = (
+                self.__class__.objects.filter(
+                    profile_id=self.profile_id, finish_time__gt=self.finish_time
+                )
+                .order_by("finish_time")
+                .first()
+            )
+        result = super(AbstractTwitterProfileList, self).delete(*args, **kwargs)
+        if next_list:
+            next_list.save_churn()
+        return result
+
+
+class AbstractTwitterFollowerList(
+    with_metaclass(AbstractTwitterBase, AbstractTwitterProfileList)
+):
     """
     Tracks a specific run of the `django_twitter_get_profile_followers` command. Saves the start and end time of \
-    the command, stores all of the observed followers on its `followers` many-to-many relation, and associates itself \
-    with the profile it belongs to via `profile`.
+    the command, stores all of the observed followers on its `followers` many-to-many relation (or compactly, \
+    if the command was run with `--compact`), and associates itself with the profile it belongs to via `profile`.
 
     AUTO-GENERATED RELATIONS:
         - profile = models.ForeignKey("TwitterProfile", related_name="follower_lists")
@@ -1103,15 +1160,20 @@ class AbstractTwitterFollowerList(with_metaclass(AbstractTwitterBase, models.Mod
     class Meta(object):
         abstract = True
 
+    profiles_field = "followers"
+    churn_field = "follower_list"
+
     start_time = models.DateTimeField(auto_now_add=True)
     finish_time = models.DateTimeField(null=True)
 
 
-class AbstractTwitterFollowingList(with_metaclass(AbstractTwitterBase, models.Model)):
+class AbstractTwitterFollowingList(
+    with_metaclass(AbstractTwitterBase, AbstractTwitterProfileList)
+):
     """
     Tracks a specific run of the `django_twitter_get_profile_followings` command. Saves the start and end time of \
-    the command, stores all of the observed followings on its `followings` many-to-many relation, and associates itself \
-    with the profile it belongs to via `profile`.
+    the command, stores all of the observed followings on its `followings` many-to-many relation (or compactly, \
+    if the command was run with `--compact`), and associates itself with the profile it belongs to via `profile`.
 
     AUTO-GENERATED RELATIONS:
         - profile = models.ForeignKey("TwitterProfile", related_name="following_lists")
@@ -1122,12 +1184,54 @@ class AbstractTwitterFollowingList(with_metaclass(AbstractTwitterBase, models.Mo
     class Meta(object):
         abstract = True
 
+    profiles_field = "followings"
+    churn_field = "following_list"
+
     # profile = models.ForeignKey("TwitterProfile", related_name="following_lists")
     # followings = models.ManyToManyField("TwitterProfile", related_name=None)
     start_time = models.DateTimeField(auto_now_add=True)
     finish_time = models.DateTimeField(null=True)
 
 
+class AbstractTwitterProfileListChurn(
+    with_metaclass(AbstractTwitterBase, models.Model)
+):
+    """
+    The profiles that were added to and removed from a follower or following list since the profile's previous \
+    list, saved when the list finishes (see `AbstractTwitterProfileList.save_churn`) so that follower churn can \
+    be reported on without comparing entire lists. Optional; if your app doesn't implement this model, churn is \
+    only available on demand via `AbstractTwitterProfileList.get_changes`.
+
+    AUTO-CREATED RELATIONSHIPS:
+        - profile = models.ForeignKey(your_app.TwitterProfile, related_name="list_churn")
+        - follower_list = models.OneToOneField(your_app.TwitterFollowerList, related_name="churn")
+        - following_list = models.OneToOneField(your_app.TwitterFollowingList, related_name="churn")
+    """
+
+    class Meta(object):
+        abstract = True
+
+    finish_time = models.DateTimeField(
+        help_text="When the list was finished", db_index=True
+    )
+    previous_finish_time = models.DateTimeField(
+        null=True,
+        help_text="When the previous list was finished (null if this is the profile's first list)",
+    )
+    added_twitter_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        help_text="Twitter IDs that are on the list but weren't on the previous one",
+    )
+    removed_twitter_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        help_text="Twitter IDs that were on the previous list but aren't on this one",
+    )
+    added_count = models.IntegerField(default=0)
+    removed_count = models.IntegerField(default=0)
+
+
 class AbstractTwitterHashtag(with_metaclass(AbstractTwitterBase, models.Model)):
     """
     Twitter hashtags, represented by a unique string.
@@ -1149,6 +1253,35 @@ class AbstractTwitterHashtag(with_metaclass(AbstractTwitterBase, models.Model)):
         super(AbstractTwitterHashtag, self).save(*args, **kwargs)
 
 
+class AbstractTweetDeleteNotice(with_metaclass(AbstractTwitterBase, models.Model)):
+    """
+    Delete notices for tweets that weren't in the database yet when the notice was received (e.g. because they \
+    hadn't been saved yet by the stream). Tweets are checked against this table when they're saved, and the \
+    deletion gets applied then. Optional; if your app doesn't implement this model, notices for tweets that \
+    don't exist yet are ignored.
+    """
+
+    class Meta(object):
+        abstract = True
+
+    twitter_id = models.CharField(
+        max_length=150,
+        unique=True,
+        help_text="The Twitter ID of the deleted tweet",
+    )
+    hard_delete = models.BooleanField(
+        default=False,
+        help_text="Whether the tweet should be deleted from the database, rather than flagged with `is_deleted`",
+    )
+    timestamp = models.DateTimeField(
+        auto_now_add=True, help_text="When the notice was received"
+    )
+
+    def __str__(self):
+
+        return self.twitter_id
+
+
 class AbstractTweetSet(with_metaclass(AbstractTwitterBase, models.Model)):
     """
     A table simply consisting of names associated with particular sets of tweets. You can create these automatically \
@@ -0,0 +1,299 @@
+from __future__ import unicode_literals
+from builtins import str
+
+import json
+import traceback
+
+from collections import OrderedDict
+from dateutil.parser import parse as date_parse
+
+from pewtils import is_not_null
+
+from django_twitter.text import TweetTextAssembler
+
+
+# Discovered full_text areas:
+# extended_tweet/full_text/
+# retweeted_status/extended_tweet/full_text/
+# quoted_status/extended_tweet/full_text/
+# retweeted_status/quoted_status/extended_tweet/full_text/
+
+TEXT_PATTERNS = [[], ["extended_tweet"]]
+ADDITIONAL_TEXT_PATTERNS = [
+    ["retweeted_status", "extended_tweet"],
+    ["quoted_status", "extended_tweet"],
+    ["retweeted_status", "quoted_status"],
+    ["retweeted_status", "quoted_status", "extended_tweet"],
+    ["retweeted_status"],
+    ["quoted_status"],
+]
+TEXT_KEYS = ["full_text", "text"]
+
+_text_assembler = TweetTextAssembler()
+
+
+def load_json(data):
+    """
+    Decodes JSON from the API (or from a database field) until it's a dictionary. Some older records were \
+    serialized more than once, so this will keep decoding until it gets there.
+
+    :param data: A dictionary, or a JSON string
+    :return: A dictionary
+    """
+
+    if data and not hasattr(data, "keys"):
+        while not hasattr(data, "keys"):
+            data = json.loads(data)
+    return data
+
+
+def parse_profile_json(profile_data):
+    """
+    Extracts the values that get stored on a TwitterProfileSnapshot from a profile's API JSON.
+
+    :param profile_data: JSON for a profile from the API
+    :return: A dictionary of snapshot field values
+    """
+
+    values = {}
+    for db_name, api_name in [
+        ("name", None),
+        ("contributors_enabled", None),
+        ("description", None),
+        ("followers_count", None),
+        ("followings_count", "friends_count"),
+        ("is_verified", "verified"),
+        ("is_protected", "protected"),
+        ("listed_count", None),
+        ("location", None),
+        ("profile_image_url", None),
+        ("statuses_count", None),
+    ]:
+        if not api_name or len(api_name) < 1:
+            api_name = db_name
+
+        if api_name in profile_data:
+            values[db_name] = profile_data[api_name]
+
+    values["screen_name"] = profile_data["screen_name"].lower()
+    values["favorites_count"] = (
+        profile_data["favorites_count"]
+        if "favorites_count" in list(profile_data.keys())
+        else profile_data["favourites_count"]
+    )
+    values["status"] = (
+        profile_data["status"]["text"] if "status" in list(profile_data.keys()) else None
+    )
+
+    if "url" in list(profile_data.get("entities", {}).keys()):
+        urls = [
+            url["expanded_url"]
+            for url in profile_data.get("entities", {}).get("url", {}).get("urls", [])
+            if url["expanded_url"]
+        ]
+    else:
+        urls = [profile_data.get("url", "")]
+    values["urls"] = [u for u in urls if is_not_null(u)]
+    values["json"] = profile_data
+
+    return values
+
+
+def get_tweet_text(tweet_data):
+    """
+    Assembles the full text of a tweet, including expanded text and the text of any tweets that it quoted or \
+    retweeted, stitching together truncated variants where they overlap.
+
+    :param tweet_data: JSON for a tweet from the API
+    :return: The tweet's text, or None
+    """
+
+    texts = []
+    for keys in TEXT_PATTERNS + ADDITIONAL_TEXT_PATTERNS:
+        subset = tweet_data
+        for key in keys:
+            subset = subset.get(key, {})
+        for text_key in TEXT_KEYS:
+            if text_key in subset.keys():
+                texts.append(subset[text_key])
+
+    return _text_assembler.assemble(texts)
+
+
+def get_tweet_links(tweet_data, existing_links=None):
+    """
+    Extracts the expanded links from a tweet's JSON, merged with any links that were previously stored.
+
+    :param tweet_data: JSON for a tweet from the API
+    :param existing_links: (Optional) Links already stored on the tweet
+    :return: A list of links
+    """
+
+    try:
+        links = set(existing_links)
+    except TypeError:
+        links = set()
+
+    for u in tweet_data.get("entities", {}).get("urls", []):
+        link = u.get("expanded_url", "")
+
+        if len(link) > 399:
+            link = u.get("url", "")
+
+        if is_not_null(link):
+            links.add(link)
+
+    return list(links)
+
+
+def get_tweet_media(tweet_data):
+    """
+    Extracts a simplified representation of the photos, GIFs and videos contained in a tweet.
+
+    :param tweet_data: JSON for a tweet from the API
+    :return: A list of dictionaries
+    """
+
+    media = []
+    for m in tweet_data.get("extended_entities", {}).get("media", []):
+        try:
+            if m["type"] == "video":
+                element = {
+                    "url": None,
+                    "bitrate": None,
+                    "content_type": None,
+                    "duration": None,
+                    "aspect_ratio": None,
+                }
+                if "aspect_ratio" in m["video_info"]:
+                    element["aspect_ratio"] = ":".join(
+                        [str(a) for a in m["video_info"]["aspect_ratio"]]
+                    )
+                if "duration_millis" in m["video_info"]:
+                    element["duration"] = m["video_info"]["duration_millis"]
+                v = sorted(
+                    m["video_info"]["variants"],
+                    key=lambda x: x["bitrate"] if "bitrate" in x else 0,
+                    reverse=True,
+                )[0]
+                element["url"] = v["url"]
+                element["bitrate"] = v["bitrate"]
+                element["content_type"] = v["content_type"]
+
+            else:
+                element = {"url": m["media_url_https"]}
+                element["width"] = m["sizes"]["large"]["w"]
+                element["height"] = m["sizes"]["large"]["h"]
+                element["content_type"] = (
+                    "image/gif" if m["type"] == "animated_gif" else "image"
+                )
+
+        except:
+            print(traceback.format_exc())
+            element = m
+
+        media.append(element)
+
+    return media
+
+
+def parse_tweet_json(tweet_data, existing_links=None):
+    """
+    Extracts the values that get stored directly on a Tweet from its API JSON. Relations to other objects are \
+    handled separately by `get_tweet_relations`.
+
+    :param tweet_data: JSON for a tweet from the API
+    :param existing_links: (Optional) Links already stored on the tweet, which will be preserved
+    :return: A dictionary of tweet field values
+    """
+
+    return {
+        "created_at": date_parse(tweet_data["created_at"]),
+        "retweet_count": tweet_data.get("retweet_count", None),
+        "favorite_count": tweet_data.get("favorite_count", None),
+        "language": tweet_data.get("lang", None),
+        "text": "{}".format(get_tweet_text(tweet_data)),
+        "links": get_tweet_links(tweet_data, existing_links=existing_links),
+        "media": get_tweet_media(tweet_data),
+        "json": tweet_data,
+    }
+
+
+def get_tweet_relations(tweet_data):
+    """
+    Extracts the Twitter IDs and names of the objects a tweet is related to.
+
+    :param tweet_data: JSON for a tweet from the API
+    :return: A dictionary with the author's ID, mentioned profile IDs, hashtag names, and the IDs of the tweets \
+    (and reply author) that the tweet replied to, quoted or retweeted
+    """
+
+    entities = tweet_data.get("entities", {})
+    relations = {
+        "profile": tweet_data["user"]["id_str"].lower(),
+        "profile_mentions": [
+            m["id_str"].lower() for m in entities.get("user_mentions", [])
+        ],
+        "hashtags": [h["text"].lower() for h in entities.get("hashtags", [])],
+        "in_reply_to_status": None,
+        "in_reply_to_user": None,
+        "quoted_status": None,
+        "retweeted_status": None,
+    }
+    if tweet_data.get("in_reply_to_status_id", None):
+        relations["in_reply_to_status"] = tweet_data["in_reply_to_status_id_str"].lower()
+        if tweet_data.get("in_reply_to_user_id_str", None):
+            relations["in_reply_to_user"] = tweet_data["in_reply_to_user_id_str"].lower()
+    if tweet_data.get("quoted_status", None):
+        relations["quoted_status"] = tweet_data["quoted_status"]["id_str"].lower()
+    if tweet_data.get("retweeted_status", None):
+        relations["retweeted_status"] = tweet_data["retweeted_status"]["id_str"].lower()
+
+    return relations
+
+
+def flatten_tweet_json(tweets):
+    """
+    Flattens a list of tweets, along with the tweets they quoted or retweeted, into the unique tweets and profiles \
+    that they contain, without recursion. When the same tweet or profile shows up more than once (e.g. a viral \
+    tweet that was retweeted many times), the version that was seen last wins, so its counts are the most \
+    up-to-date. Tweets are returned in dependency order: quoted and retweeted tweets always come before the \
+    tweets that embed them.
+
+    :param tweets: A list of tweet JSON from the API
+    :return: A 2-tuple of ordered dictionaries, mapping Twitter IDs to the JSON for each unique tweet and profile
+    """
+
+    tweet_data, user_data = {}, OrderedDict()
+    dependencies = OrderedDict()
+    for tweet_json in tweets:
+        stack = [tweet_json]
+        while stack:
+            t = stack.pop()
+            twitter_id = t["id_str"].lower()
+            tweet_data[twitter_id] = t
+            user_data[t["user"]["id_str"].lower()] = t["user"]
+            children = dependencies.setdefault(twitter_id, [])
+            for key in ["quoted_status", "retweeted_status"]:
+                if t.get(key, None):
+                    child_id = t[key]["id_str"].lower()
+                    if child_id not in children:
+                        children.append(child_id)
+                    stack.append(t[key])
+
+    ordered = OrderedDict()
+    for root in dependencies.keys():
+        stack = [(root, False)]
+        while stack:
+            twitter_id, expanded = stack.pop()
+            if twitter_id in ordered:
+                continue
+            if expanded:
+                ordered[twitter_id] = tweet_data[twitter_id]
+            else:
+                stack.append((twitter_id, True))
+                for child_id in reversed(dependencies[twitter_id]):
+                    if child_id not in ordered:
+                        stack.append((child_id, False))
+
+    return ordered, user_data
@@ -0,0 +1,286 @@
+from __future__ import division
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# The number of requests allowed per window (in seconds) for each endpoint; where user and app authentication
+# have different limits, the lower one is used. You can override these with `TWITTER_RATE_LIMITS` in your settings.
+DEFAULT_RATE_LIMITS = {
+    "statuses/user_timeline": (900, 900),
+    "users/lookup": (300, 900),
+    "users/show": (900, 900),
+    "followers/ids": (15, 900),
+    "followers/list": (15, 900),
+    "friends/ids": (15, 900),
+    "friends/list": (15, 900),
+}
+
+
+class MemoryStore(object):
+    """
+    Keeps rate limit budgets in memory, so they're shared by all of the threads in a single process.
+    """
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.state = {}
+
+    def update(self, key, func):
+        """
+        Atomically replaces the state stored under `key` with `func(state)`.
+
+        :param key: A string
+        :param func: A function that takes the current state (or None) and returns the new state
+        :return: The new state
+        """
+
+        with self.lock:
+            self.state[key] = func(self.state.get(key))
+            return self.state[key]
+
+
+class FileStore(object):
+    """
+    Keeps rate limit budgets in a directory of small JSON files, which are locked while they're being updated, \
+    so they're shared by all of the processes on a host that use the same directory.
+
+    :param directory: Path to the directory (will be created if it doesn't exist)
+    """
+
+    def __init__(self, directory):
+
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def update(self, key, func):
+        """
+        Atomically replaces the state stored under `key` with `func(state)`.
+
+        :param key: A string
+        :param func: A function that takes the current state (or None) and returns the new state
+        :return: The new state
+        """
+
+        import fcntl
+
+        path = os.path.join(self.directory, "{}.json".format(key))
+        with io.open(os.open(path, os.O_RDWR | os.O_CREAT), "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(f.read() or "null")
+                except ValueError:
+                    state = None
+                state = func(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return state
+
+
+class CacheStore(object):
+    """
+    Keeps rate limit budgets in one of your Django caches, so they can be shared across hosts (e.g. if you use \
+    a database, Redis or Memcached cache backend). Updates are guarded by a lock key created with `cache.add`, \
+    which is atomic on all of the shared backends.
+
+    :param alias: (Optional) The name of the cache in `settings.CACHES` (default "default")
+    :param lock_timeout: (Optional) Number of seconds after which a lock left behind by a crashed process expires
+    """
+
+    def __init__(self, alias="default", lock_timeout=10):
+
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+
+    def update(self, key, func):
+        """
+        Atomically replaces the state stored under `key` with `func(state)`.
+
+        :param key: A string
+        :param func: A function that takes the current state (or None) and returns the new state
+        :return: The new state
+        """
+
+        cache = caches[self.alias]
+        key = "django_twitter.ratelimit.{}".format(key)
+        lock = "{}.lock".format(key)
+        while not cache.add(lock, 1, timeout=self.lock_timeout):
+            time.sleep(0.01)
+        try:
+            state = func(cache.get(key))
+            cache.set(key, state, timeout=None)
+        finally:
+            cache.delete(lock)
+        return state
+
+
+class RateLimiter(object):
+    """
+    A token bucket for each API endpoint (and set of credentials), shared by every collector that uses the same \
+    store. Each bucket starts full and refills continuously at the endpoint's rate, so rather than everyone \
+    running into the limit at once and sleeping until the window resets, requests get spread out evenly across \
+    the window. The `x-rate-limit-remaining` and `x-rate-limit-reset` headers the API sends back are used to keep \
+    the buckets honest, e.g. if some other application is using the same credentials.
+
+    :param store: (Optional) A `MemoryStore`, `FileStore` or `CacheStore` (defaults to a new `MemoryStore`)
+    :param limits: (Optional) A dictionary of `(requests, window_seconds)` tuples, keyed by endpoint (e.g. \
+    "statuses/user_timeline"), to use instead of the defaults. Endpoints without a limit aren't throttled.
+    """
+
+    def __init__(self, store=None, limits=None):
+
+        self.store = store or MemoryStore()
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        self.limits.update(getattr(settings, "TWITTER_RATE_LIMITS", {}))
+        self.limits.update(limits or {})
+
+    def acquire(self, endpoint, credential="default"):
+        """
+        Waits until there's room in the budget for a request, and then uses up one request.
+
+        :param endpoint: The API endpoint (e.g. "statuses/user_timeline")
+        :param credential: (Optional) A label for the credentials the request will be made with
+        :return: The number of seconds spent waiting
+        """
+
+        if endpoint not in self.limits:
+            return 0
+        capacity, window = self.limits[endpoint]
+        rate = capacity / window
+        result = {}
+
+        def take(state):
+            state = self._refill(state, capacity, rate)
+            now = time.time()
+            if state["blocked_until"] > now:
+                wait = state["blocked_until"] - now
+            elif state["tokens"] >= 1:
+                state["tokens"] -= 1
+                wait = 0
+            else:
+                wait = (1 - state["tokens"]) / rate
+            result["wait"] = wait
+            return state
+
+        waited = 0
+        while True:
+            self.store.update(self._get_key(endpoint, credential), take)
+            if not result["wait"]:
+                return waited
+            time.sleep(result["wait"])
+            waited += result["wait"]
+
+    def observe(self, endpoint, remaining, reset, credential="default"):
+        """
+        Updates a bucket based on the rate limit headers from an API response.
+
+        :param endpoint: The API endpoint (e.g. "statuses/user_timeline")
+        :param remaining: The number of requests remaining in the current window
+        :param reset: The Unix timestamp when the current window resets
+        :param credential: (Optional) A label for the credentials the request was made with
+        """
+
+        if endpoint not in self.limits:
+            return
+        capacity, window = self.limits[endpoint]
+        rate = capacity / window
+
+        def sync(state):
+            state = self._refill(state, capacity, rate)
+            state["tokens"] = min(state["tokens"], remaining)
+            if remaining <= 0:
+                state["blocked_until"] = max(state["blocked_until"], reset)
+            return state
+
+        self.store.update(self._get_key(endpoint, credential), sync)
+
+    def install(self, twitter_handler, credential=None):
+        """
+        Makes every request a `TwitterAPIHandler` sends through the underlying Tweepy API go through the limiter.
+
+        :param twitter_handler: A `TwitterAPIHandler`
+        :param credential: (Optional) A label for the handler's credentials; by default, a hash of its access \
+        token (or consumer key) is used, so handlers that use the same credentials share the same budget
+        :return: The handler
+        """
+
+        api = twitter_handler.api
+        if not credential:
+            credential = get_credential_label(api.auth)
+        request = api.request
+
+        def limited_request(method, endpoint, *args, **kwargs):
+            self.acquire(endpoint, credential=credential)
+            try:
+                return request(method, endpoint, *args, **kwargs)
+            finally:
+                response = getattr(api, "last_response", None)
+                # Other threads may be using the same API object, so make sure it's the right response
+                if response is not None and endpoint in getattr(response, "url", ""):
+                    headers = response.headers
+                    if "x-rate-limit-remaining" in headers:
+                        self.observe(
+                            endpoint,
+                            int(headers["x-rate-limit-remaining"]),
+                            int(headers.get("x-rate-limit-reset", 0)),
+                            credential=credential,
+                        )
+
+        api.request = limited_request
+        return twitter_handler
+
+    def _get_key(self, endpoint, credential):
+
+        return "{}.{}".format(credential, endpoint.replace("/", "_"))
+
+    def _refill(self, state, capacity, rate):
+
+        now = time.time()
+        if not state:
+            return {"tokens": capacity, "updated": now, "blocked_until": 0}
+        state["tokens"] = min(
+            capacity, state["tokens"] + max(0, now - state["updated"]) * rate
+        )
+        state["updated"] = now
+        return state
+
+
+def get_credential_label(auth):
+    """
+    :param auth: A Tweepy authentication handler
+    :return: A short, non-reversible label for the handler's credentials
+    """
+
+    token = getattr(auth, "access_token", None) or getattr(auth, "consumer_key", "")
+    return hashlib.sha1(str(token).encode("utf8")).hexdigest()[:12]
+
+
+def get_rate_limiter(directory=None, cache=None):
+    """
+    Creates a `RateLimiter` from the `--rate_limit_directory` and `--rate_limit_cache` command options.
+
+    :param directory: (Optional) Path to a directory to share budgets through (see `FileStore`)
+    :param cache: (Optional) The name of a Django cache to share budgets through (see `CacheStore`)
+    :return: A `RateLimiter`
+    """
+
+    if cache:
+        return RateLimiter(CacheStore(cache))
+    elif directory:
+        return RateLimiter(FileStore(directory))
+    else:
+        return RateLimiter()
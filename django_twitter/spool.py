@@ -0,0 +1,172 @@
+from __future__ import unicode_literals
+
+import io
+import os
+import time
+
+from glob import glob
+
+
+OPEN_SUFFIX = ".jsonl.part"
+READY_SUFFIX = ".jsonl"
+DONE_SUFFIX = ".jsonl.done"
+OFFSET_SUFFIX = ".offset"
+
+
+class SpoolWriter(object):
+    """
+    Appends raw tweet JSON to a series of segment files in a spool directory, so that tweets are on disk as soon \
+    as they're received and can be saved to the database separately (using `django_twitter_replay_spool`). The \
+    segment that's currently being written to ends in `.jsonl.part`; once it has `segment_size` lines (or the \
+    writer is closed) it gets renamed to `.jsonl` and becomes available for replaying. Only one writer should \
+    use a spool directory at a time.
+
+    :param directory: Path to the spool directory (will be created if it doesn't exist)
+    :param segment_size: (Optional) Number of lines to write to each segment (default 10000)
+    """
+
+    def __init__(self, directory, segment_size=10000):
+
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segment = None
+        self.segment_path = None
+        self.segment_lines = 0
+        self.segment_counter = 0
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # Segments that were left open by a writer that crashed are complete as far as they go
+        for path in glob(os.path.join(directory, "*{}".format(OPEN_SUFFIX))):
+            os.rename(path, path[: -len(OPEN_SUFFIX)] + READY_SUFFIX)
+
+    def write(self, line):
+        """
+        :param line: The raw JSON for a tweet
+        """
+
+        if not self.segment:
+            self.segment_counter += 1
+            self.segment_path = os.path.join(
+                self.directory,
+                "{}_{}_{:06d}{}".format(
+                    time.strftime("%Y%m%d%H%M%S"),
+                    os.getpid(),
+                    self.segment_counter,
+                    OPEN_SUFFIX,
+                ),
+            )
+            self.segment = io.open(self.segment_path, "a", encoding="utf8")
+            self.segment_lines = 0
+        self.segment.write(line.strip() + "\n")
+        self.segment_lines += 1
+        if self.segment_lines >= self.segment_size:
+            self.close()
+
+    def flush(self):
+        """
+        Forces everything that's been written so far to disk.
+        """
+
+        if self.segment:
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+
+    def close(self):
+        """
+        Closes the current segment and makes it available for replaying.
+        """
+
+        if self.segment:
+            self.flush()
+            self.segment.close()
+            os.rename(
+                self.segment_path, self.segment_path[: -len(OPEN_SUFFIX)] + READY_SUFFIX
+            )
+            self.segment = None
+            self.segment_path = None
+
+
+class SpoolReader(object):
+    """
+    Reads closed segments from a spool directory in the order they were written. The reader keeps track of how \
+    far it's gotten in each segment with a small `.offset` file next to it, so if it's interrupted it'll pick \
+    up where it last committed.
+
+    :param directory: Path to the spool directory
+    """
+
+    def __init__(self, directory):
+
+        self.directory = directory
+
+    def segments(self):
+        """
+        :return: A list of paths to segments that are ready to be replayed, oldest first
+        """
+
+        return sorted(glob(os.path.join(self.directory, "*{}".format(READY_SUFFIX))))
+
+    def get_offset(self, segment):
+        """
+        :param segment: Path to a segment
+        :return: The last committed byte offset in the segment
+        """
+
+        try:
+            with io.open(segment + OFFSET_SUFFIX, "r") as infile:
+                return int(infile.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def commit(self, segment, offset):
+        """
+        Records that everything up to `offset` in a segment has been saved.
+
+        :param segment: Path to a segment
+        :param offset: A byte offset returned by `read_batches`
+        """
+
+        path = segment + OFFSET_SUFFIX
+        with io.open(path + ".tmp", "w") as outfile:
+            outfile.write("{}".format(offset))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(path + ".tmp", path)
+
+    def read_batches(self, segment, batch_size=500):
+        """
+        Iterates over the lines in a segment that haven't been committed yet.
+
+        :param segment: Path to a segment
+        :param batch_size: (Optional) Number of lines per batch (default 500)
+        :return: Yields 2-tuples of a list of lines and the byte offset at the end of the batch
+        """
+
+        with io.open(segment, "rb") as infile:
+            infile.seek(self.get_offset(segment))
+            lines = []
+            for line in iter(infile.readline, b""):
+                line = line.decode("utf8", "replace").strip()
+                if line:
+                    lines.append(line)
+                if len(lines) >= batch_size:
+                    yield lines, infile.tell()
+                    lines = []
+            if lines:
+                yield lines, infile.tell()
+
+    def finish(self, segment, delete=False):
+        """
+        Marks a segment as done, so it won't be replayed again.
+
+        :param segment: Path to a segment
+        :param delete: (Optional) Delete the segment instead of renaming it to `.jsonl.done`
+        """
+
+        if delete:
+            os.remove(segment)
+        else:
+            os.rename(segment, segment[: -len(READY_SUFFIX)] + DONE_SUFFIX)
+        if os.path.exists(segment + OFFSET_SUFFIX):
+            os.remove(segment + OFFSET_SUFFIX)
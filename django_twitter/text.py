@@ -0,0 +1,85 @@
+from __future__ import unicode_literals
+
+
+def find_overlap(text, additional_text, min_length=2):
+    """
+    Finds the longest suffix of `text` that is also a prefix of `additional_text`, in linear time (using the \
+    Knuth-Morris-Pratt prefix function over the prefix of `additional_text` followed by the suffix of `text`).
+
+    :param text: The string whose ending should overlap
+    :param additional_text: The string whose beginning should overlap
+    :param min_length: (Optional) The shortest overlap to return (default 2)
+    :return: The length of the overlap, or 0 if there isn't one of at least `min_length` characters
+    """
+
+    max_length = min(len(text), len(additional_text))
+    if max_length < min_length:
+        return 0
+    # A sentinel that can't match any character keeps overlaps from spanning both strings
+    sequence = list(additional_text[:max_length]) + [None] + list(text[-max_length:])
+    prefix = [0] * len(sequence)
+    for i in range(1, len(sequence)):
+        k = prefix[i - 1]
+        while k > 0 and sequence[i] != sequence[k]:
+            k = prefix[k - 1]
+        if sequence[i] == sequence[k]:
+            k += 1
+        prefix[i] = k
+    overlap = prefix[-1]
+    return overlap if overlap >= min_length else 0
+
+
+class TweetTextAssembler(object):
+    """
+    Assembles a single block of text from the different versions of a tweet's text that the API returns (the \
+    truncated text, the extended text, the text of a retweeted or quoted tweet, etc.) Versions that were \
+    truncated with an ellipsis get stitched back together with the versions they overlap with; everything else \
+    is joined with spaces.
+
+    :param min_overlap: (Optional) The minimum number of overlapping characters required to stitch two versions \
+    together (default 2)
+    """
+
+    def __init__(self, min_overlap=2):
+
+        self.min_overlap = min_overlap
+
+    def assemble(self, texts):
+        """
+        :param texts: A list of versions of the tweet's text, in order of priority
+        :return: The assembled text, or None if there wasn't any
+        """
+
+        all_text, truncated = [], set()
+        for text in texts:
+            if text.endswith("\u2026"):
+                text = text.replace("\u2026", "")
+                truncated.add(text)
+            if text not in all_text:
+                all_text.append(text)
+
+        if len(all_text) > 1:
+            new_all_text = list(all_text)
+            for i, text in enumerate(all_text):
+                for j, additional_text in enumerate(all_text):
+                    if i == j:
+                        continue
+                    overlap = find_overlap(
+                        text, additional_text, min_length=self.min_overlap
+                    )
+                    # Only stitch where one version contains the whole of the other, or where the text was cut
+                    # off and most of it overlaps; short overlaps between unrelated texts are usually coincidences
+                    if overlap and (
+                        overlap in (len(text), len(additional_text))
+                        or (text in truncated and overlap * 2 >= len(text))
+                    ):
+                        new_all_text = [
+                            t for t in new_all_text if t not in (text, additional_text)
+                        ]
+                        new_all_text.append(text + additional_text[overlap:])
+            all_text = new_all_text
+
+        if len(all_text) > 0:
+            return " ".join(all_text)
+        else:
+            return None
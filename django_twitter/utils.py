@@ -2,31 +2,65 @@ import datetime
 
 import django.db
 import pytz
-import itertools
+import numpy as np
 import pandas as pd
 
-from collections import Counter
+from collections import OrderedDict
 from django.apps import apps
 from django.conf import settings
-from django.db.models import Count
-from django.db.models.functions import TruncMonth
+from django.db.models import Count, DateField
+from django.db.models.functions import Cast, TruncMonth
 from pewanalytics.text import TextDataFrame
-from sklearn.metrics.pairwise import cosine_similarity
-from tqdm import tqdm
+from sklearn.preprocessing import normalize
 import datetime
-import itertools
-import os
 import pandas as pd
 import pytz
+import tweepy
 
 
-def get_concrete_model(abstract_model_name):
+_CONCRETE_MODELS = {}
+_CONCRETE_MODELS_LOADED = False
+
+
+def register_concrete_model(abstract_model_name, model):
+    """
+    Registers the model in your app that implements one of Django Twitter's abstract models. This gets called \
+    automatically by `AbstractTwitterBase` when your models are initialized, and by `load_concrete_models` once \
+    the app registry is ready. If more than one model implements the same abstract model, the first one wins.
+
+    :param abstract_model_name: The name of the abstract model (e.g. "AbstractTweet")
+    :param model: The concrete model class
+    """
+
+    _CONCRETE_MODELS.setdefault(abstract_model_name, model)
+
+
+def load_concrete_models():
+    """
+    Scans the models in `settings.TWITTER_APP` and registers each one under the names of its base classes, so \
+    that `get_concrete_model` lookups don't need to scan the app. Called by `DjangoTwitterConfig.ready()`.
+    """
 
+    global _CONCRETE_MODELS_LOADED
     for model in apps.get_app_config(settings.TWITTER_APP).get_models():
         for base in model.__bases__:
-            if base.__name__ == abstract_model_name:
-                return model
-    return None
+            register_concrete_model(base.__name__, model)
+    _CONCRETE_MODELS_LOADED = True
+
+
+def get_concrete_model(abstract_model_name):
+    """
+    Returns the model in `settings.TWITTER_APP` that implements an abstract model.
+
+    :param abstract_model_name: The name of the abstract model (e.g. "AbstractTweet")
+    :return: The concrete model class, or None if your app doesn't implement it
+    """
+
+    model = _CONCRETE_MODELS.get(abstract_model_name, None)
+    if model is None and not _CONCRETE_MODELS_LOADED:
+        load_concrete_models()
+        model = _CONCRETE_MODELS.get(abstract_model_name, None)
+    return model
 
 
 def safe_get_or_create(model_name, field, value, create=False):
@@ -88,7 +122,7 @@ def get_twitter_profile(twitter_id, create=False):
     )
 
 
-def get_twitter_profile_json(twitter_id, twitter_handler):
+def get_twitter_profile_json(twitter_id, twitter_handler, write=None):
 
     """
     Helper function to get a profile JSON from a Twitter ID. Grabs the JSON from the API, but if an error is returned
@@ -96,31 +130,189 @@ def get_twitter_profile_json(twitter_id, twitter_handler):
 
     :param twitter_id: A Twitter ID or username
     :param twitter_handler: a TwitterAPIHandler instance
+    :param write: (Optional) A function to run the database update with, e.g. `ConcurrentCollector.write`
     :return: JSON for the profile
     """
 
     twitter_json = twitter_handler.get_profile(twitter_id, return_errors=True)
     if isinstance(twitter_json, int):
-        error_code = twitter_json
-        existing_profile = safe_get_or_create(
-            "AbstractTwitterProfile", "twitter_id", twitter_id
-        )
-        if existing_profile:
-            existing_profile.twitter_error_code = error_code
-            existing_profile.save()
+        if write:
+            write(save_twitter_error_code, twitter_id, twitter_json)
+        else:
+            save_twitter_error_code(twitter_id, twitter_json)
         return None
     else:
         return twitter_json
 
 
+PROFILE_LOOKUP_SIZE = 100
+PROFILE_NOT_FOUND_ERROR_CODE = 50
+
+
+def get_twitter_profiles_json(twitter_ids, twitter_handler):
+
+    """
+    Helper function to get profile JSON for a list of Twitter IDs in as few API calls as possible, using the \
+    `users/lookup` endpoint (which returns up to 100 profiles per call). Unlike `get_profile`, the endpoint \
+    silently leaves out profiles it can't return (whether they've been deleted, suspended, etc.) instead of \
+    returning an error code for each one, so those are returned separately.
+
+    :param twitter_ids: A list of Twitter IDs or usernames (up to 100 at a time is most efficient)
+    :param twitter_handler: a TwitterAPIHandler instance
+    :return: A 2-tuple with a list of profile JSON, and a list of the IDs that weren't returned by the API
+    """
+
+    twitter_ids = list(OrderedDict.fromkeys([str(t).lower() for t in twitter_ids if t]))
+    user_ids = [t for t in twitter_ids if t.isdigit()]
+    screen_names = [t for t in twitter_ids if not t.isdigit()]
+
+    results = []
+    for key, values in [("user_id", user_ids), ("screen_name", screen_names)]:
+        for i in range(0, len(values), PROFILE_LOOKUP_SIZE):
+            try:
+                results.extend(
+                    twitter_handler.api.lookup_users(
+                        **{key: values[i : i + PROFILE_LOOKUP_SIZE]}
+                    )
+                )
+            except tweepy.errors.NotFound:
+                # The endpoint returns a 404 when none of the requested profiles exist
+                pass
+
+    found = set()
+    for profile in results:
+        found.add(profile.id_str)
+        found.add(profile.screen_name.lower())
+    missing = [t for t in twitter_ids if t not in found]
+
+    return [profile._json for profile in results], missing
+
+
+TIMELINE_PAGE_SIZE = 200
+
+
+def iterate_profile_timeline_pages(
+    twitter_handler, twitter_id, since_id=None, max_id=None
+):
+
+    """
+    Helper function to iterate over pages of a profile's timeline, newest first. Unlike \
+    `TwitterAPIHandler.iterate_profile_timeline`, this lets you restrict the timeline to tweets newer than \
+    `since_id` and/or no newer than `max_id`, so you can avoid re-requesting tweets you already have.
+
+    :param twitter_handler: a TwitterAPIHandler instance
+    :param twitter_id: A Twitter ID or username
+    :param since_id: (Optional) Only return tweets with IDs greater than this
+    :param max_id: (Optional) Only return tweets with IDs less than or equal to this
+    :return: Yields lists of tweets; if the API returns an error, yields the error code instead and stops
+    """
+
+    kwargs = {"count": TIMELINE_PAGE_SIZE, "tweet_mode": "extended"}
+    if str(twitter_id).isdigit():
+        kwargs["user_id"] = twitter_id
+    else:
+        kwargs["screen_name"] = twitter_id
+    if since_id:
+        kwargs["since_id"] = since_id
+    if max_id:
+        kwargs["max_id"] = max_id
+
+    try:
+        for page in tweepy.Cursor(twitter_handler.api.user_timeline, **kwargs).pages():
+            yield page
+    except tweepy.errors.HTTPException as e:
+        yield e.api_codes[0] if e.api_codes else e.response.status_code
+
+
+PROFILE_LIST_METHODS = {
+    ("followers", False): ("get_follower_ids", 5000),
+    ("followers", True): ("get_followers", 200),
+    ("followings", False): ("get_friend_ids", 5000),
+    ("followings", True): ("get_friends", 200),
+}
+
+
+def iterate_profile_list_pages(
+    twitter_handler, twitter_id, relation, hydrate=False, cursor=-1
+):
+
+    """
+    Helper function to iterate over pages of a profile's followers or followings, along with the cursor for \
+    each following page, so that collection can be picked back up from any page.
+
+    :param twitter_handler: a TwitterAPIHandler instance
+    :param twitter_id: A Twitter ID or username
+    :param relation: "followers" or "followings"
+    :param hydrate: (Optional) Return full profiles instead of just Twitter IDs (with far fewer per page)
+    :param cursor: (Optional) The cursor to start from (default -1, the first page)
+    :return: Yields 2-tuples of a list of Twitter IDs (or profiles, if `hydrate` is True) and the cursor for \
+    the next page, which is 0 on the last page
+    """
+
+    method_name, count = PROFILE_LIST_METHODS[(relation, hydrate)]
+    kwargs = {"count": count}
+    if str(twitter_id).isdigit():
+        kwargs["user_id"] = twitter_id
+    else:
+        kwargs["screen_name"] = twitter_id
+    if not hydrate:
+        kwargs["stringify_ids"] = True
+
+    while cursor:
+        page, (previous_cursor, cursor) = getattr(twitter_handler.api, method_name)(
+            cursor=cursor, return_cursors=True, **kwargs
+        )
+        yield page, cursor
+
+
+def save_twitter_error_code(twitter_id, error_code):
+
+    """
+    Records an error code returned by the API on an existing profile.
+
+    :param twitter_id: A Twitter ID or username
+    :param error_code: The error code
+    """
+
+    existing_profile = safe_get_or_create(
+        "AbstractTwitterProfile", "twitter_id", twitter_id
+    )
+    if existing_profile:
+        existing_profile.twitter_error_code = error_code
+        existing_profile.save()
+
+
+UNUSUAL_TEXT_CHUNK_SIZE = 5000
+
+
+def _get_average_cosine_similarities(tfidf, chunk_size=UNUSUAL_TEXT_CHUNK_SIZE):
+    """
+    Computes each row's average cosine similarity with every row in a matrix (including itself) without building \
+    the full n x n similarity matrix. Once the rows are L2-normalized, the average of a row's dot products with \
+    all of the rows is just its dot product with the mean row, so this takes a single pass over the sparse matrix.
+
+    :param tfidf: A sparse matrix (e.g. TF-IDF scores), one row per document
+    :param chunk_size: (Optional) Number of rows to multiply at a time
+    :return: A NumPy array of average cosine similarities
+    """
+
+    tfidf = normalize(tfidf, norm="l2", copy=True).tocsr()
+    mean = np.asarray(tfidf.mean(axis=0)).ravel()
+    scores = np.zeros(tfidf.shape[0])
+    for start in range(0, tfidf.shape[0], chunk_size):
+        scores[start : start + chunk_size] = tfidf[start : start + chunk_size].dot(mean)
+    return scores
+
+
 def _identify_unusual_text(profiles, text_col):
 
-    not_empty = profiles[~(profiles[text_col].isnull()) & ~(profiles[text_col] == "")]
+    not_empty = profiles[
+        ~(profiles[text_col].isnull()) & ~(profiles[text_col] == "")
+    ].copy()
     tdf = TextDataFrame(
         not_empty, text_col, min_df=1, analyzer="char", ngram_range=(1, 10)
     )
-    similarities = cosine_similarity(tdf.tfidf, tdf.tfidf)
-    not_empty["avg_cosine"] = pd.DataFrame(similarities, index=not_empty.index).mean()
+    not_empty["avg_cosine"] = _get_average_cosine_similarities(tdf.tfidf)
     upper = not_empty["avg_cosine"].mean() + not_empty["avg_cosine"].std() * 2
     most_similar = not_empty[not_empty["avg_cosine"] >= upper].sort_values(
         "avg_cosine", ascending=False
@@ -132,6 +324,48 @@ def _identify_unusual_text(profiles, text_col):
     return (most_similar, most_unique)
 
 
+def get_most_recent_tweet_text(profiles, most_recent_n=10):
+    """
+    Concatenates the text of the most recent tweets of each of a set of profiles. The tweets are selected in a \
+    single query, using `ROW_NUMBER()` to rank each profile's tweets by when they were created.
+
+    :param profiles: A QuerySet of profiles
+    :param most_recent_n: The number of tweets to use for each profile (sorted by most recent)
+    :return: A Pandas Series of text, indexed by profile primary key. Profiles without any tweets are left out.
+    """
+
+    Tweet = get_concrete_model("AbstractTweet")
+    qn = django.db.connection.ops.quote_name
+
+    def _column(field_name):
+        return qn(Tweet._meta.get_field(field_name).column)
+
+    profile_sql, params = profiles.values("pk").query.sql_with_params()
+    with django.db.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT profile_id, text FROM (
+                SELECT {profile} AS profile_id, {text} AS text, ROW_NUMBER() OVER (
+                    PARTITION BY {profile} ORDER BY {created_at} DESC
+                ) AS tweet_rank
+                FROM {table}
+                WHERE {text} IS NOT NULL AND {profile} IN ({profiles})
+            ) ranked
+            WHERE tweet_rank <= %s
+            ORDER BY profile_id, tweet_rank
+            """.format(
+                table=qn(Tweet._meta.db_table),
+                profile=_column("profile"),
+                text=_column("text"),
+                created_at=_column("created_at"),
+                profiles=profile_sql,
+            ),
+            list(params) + [most_recent_n],
+        )
+        tweets = pd.DataFrame(cursor.fetchall(), columns=["profile_id", "text"])
+    return tweets.groupby("profile_id", sort=False)["text"].agg(" ".join)
+
+
 def identify_unusual_profiles_by_tweet_text(profiles, most_recent_n=10):
 
     """
@@ -145,18 +379,12 @@ def identify_unusual_profiles_by_tweet_text(profiles, most_recent_n=10):
     :return: A 2-tuple of dataframes (most_similar, most_unique)
     """
 
-    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
-    profiles = pd.DataFrame.from_records(profiles.values("twitter_id"))
-    profiles["tweet_text"] = ""
-    for twitter_id in tqdm(profiles["twitter_id"].values, desc="Gathering tweet text", disable=os.environ.get("DISABLE_TQDM", False)):
-        if twitter_id:
-            tweets = (
-                TwitterProfile.objects.get(twitter_id=twitter_id)
-                .tweets.filter(text__isnull=False)
-                .order_by("-created_at")[:most_recent_n]
-            )
-            tweets = " ".join([t.text for t in tweets])
-            profiles.loc[profiles["twitter_id"] == twitter_id, "tweet_text"] = tweets
+    text = get_most_recent_tweet_text(profiles, most_recent_n=most_recent_n)
+    profiles = pd.DataFrame.from_records(
+        profiles.values("pk", "twitter_id"), columns=["pk", "twitter_id"]
+    )
+    profiles["tweet_text"] = profiles["pk"].map(text).fillna("")
+    del profiles["pk"]
     return _identify_unusual_text(profiles, "tweet_text")
 
 
@@ -199,13 +427,12 @@ def get_monthly_twitter_activity(profiles, min_date, max_date=None):
     """
 
     Tweet = get_concrete_model("AbstractTweet")
-    TwitterProfile = get_concrete_model("AbstractTwitterProfile")
     profiles = pd.DataFrame.from_records(
-        profiles.values("pk", "screen_name", "created_at")
-    )
-    profiles["name"] = profiles["pk"].map(
-        lambda x: TwitterProfile.objects.get(pk=x).most_recent_snapshot.name
-    )
+        profiles.values(
+            "pk", "screen_name", "created_at", "most_recent_snapshot__name"
+        ),
+        columns=["pk", "screen_name", "created_at", "most_recent_snapshot__name"],
+    ).rename(columns={"most_recent_snapshot__name": "name"})
     tweets = Tweet.objects.filter(profile_id__in=profiles["pk"].values).filter(
         created_at__gte=min_date
     )
@@ -217,46 +444,16 @@ def get_monthly_twitter_activity(profiles, min_date, max_date=None):
         .annotate(c=Count("pk"))
         .values("profile_id", "month", "c")
     )
-    tweets = pd.DataFrame.from_records(tweets)
+    tweets = pd.DataFrame.from_records(tweets, columns=["profile_id", "month", "c"])
 
-    all_combos = pd.DataFrame(
-        [
-            {"profile_id": a, "month": b}
-            for a, b in itertools.product(
-                profiles["pk"].unique(), tweets["month"].unique()
-            )
-        ]
-    )
+    months = pd.date_range(tweets["month"].min(), tweets["month"].max(), freq="MS")
+    all_combos = pd.MultiIndex.from_product(
+        [profiles["pk"].unique(), months], names=["profile_id", "month"]
+    ).to_frame(index=False)
     tweets = all_combos.merge(tweets, how="left", on=["profile_id", "month"])
+    created_at = tweets["profile_id"].map(profiles.set_index("pk")["created_at"])
+    tweets.loc[tweets["month"] < created_at, "c"] = None
 
-    for index, row in profiles.iterrows():
-        tweets.loc[
-            (tweets["profile_id"] == row["pk"]) & (tweets["month"] < row["created_at"]),
-            "c",
-        ] = None
-        tweets.loc[
-            (tweets["profile_id"] == row["pk"])
-            & (tweets["month"] >= row["created_at"])
-            & (tweets["c"].isnull()),
-            "c",
-        ] = 0
-
-    idx = pd.date_range(tweets["month"].min(), tweets["month"].max())
-    months = tweets[["month"]].drop_duplicates()
-    months.index = pd.DatetimeIndex(months["month"])
-    months = months.reindex(idx, fill_value="NaN")
-    tweets = pd.concat(
-        [
-            tweets,
-            pd.DataFrame(
-                [
-                    {"month": m}
-                    for m in months.index
-                    if m.day == 1 and m not in tweets["month"].values
-                ]
-            ),
-        ]
-    )
     tweets = tweets.pivot(index="profile_id", columns="month", values="c").fillna(0)
     tweets.columns = tweets.columns.map(lambda x: "{}_{}".format(x.year, x.month))
     tweets = tweets.merge(profiles, how="left", left_index=True, right_on="pk")
@@ -270,8 +467,8 @@ def find_missing_date_ranges(
 ):
 
     """
-    Iterates over a set of profiles and finds all periods within a range of dates in which the profile did not
-    produce any tweets. Uses `min_consecutive_missing_dates` to specify the minimum number of days a profile
+    Finds all periods within a range of dates in which each of a set of profiles did not produce any tweets. The days
+    on which each profile was active are selected in a single query. Uses `min_consecutive_missing_dates` to specify the minimum number of days a profile
     must be inactive to be worth including. By default, the function will return all 7+ day periods in which
     a profile in the set did not produce any tweets. Will automatically account for profiles' creation dates.
 
@@ -282,7 +479,7 @@ def find_missing_date_ranges(
     :return: A DataFrame of date ranges and profile IDs
     """
 
-    rows = []
+    Tweet = get_concrete_model("AbstractTweet")
 
     try:
         min_date = min_date.date()
@@ -290,65 +487,90 @@ def find_missing_date_ranges(
         pass
     if not max_date:
         max_date = datetime.datetime.now().date()
-    _min_date = min_date
-    for profile in tqdm(profiles, desc="Scanning profiles for missing dates", disable=os.environ.get("DISABLE_TQDM", False)):
+    try:
+        max_date = max_date.date()
+    except AttributeError:
+        pass
+    first_day = np.datetime64(min_date, "D").astype(np.int64)
+    last_day = np.datetime64(max_date, "D").astype(np.int64)
+
+    days = (
+        Tweet.objects.filter(profile__in=profiles.values("pk"))
+        .filter(created_at__isnull=False)
+        .annotate(date=Cast("created_at", DateField()))
+        .filter(date__gte=min_date, date__lt=max_date)
+        .values_list("profile_id", "date")
+        .distinct()
+    )
+    days = pd.DataFrame.from_records(days, columns=["pk", "day"])
+    days["day"] = pd.to_datetime(days["day"]).values.astype("datetime64[D]").astype(
+        np.int64
+    )
+    profiles = pd.DataFrame.from_records(
+        profiles.values("pk", "twitter_id", "created_at"),
+        columns=["pk", "twitter_id", "created_at"],
+    )
 
-        if profile.created_at:
-            min_date = max([_min_date, profile.created_at.date()])
-        else:
-            min_date = _min_date
+    # Each profile's range starts on the later of `min_date` and the day it was created
+    created = profiles["created_at"].map(
+        lambda x: np.datetime64(x.date(), "D").astype(np.int64)
+        if pd.notnull(x)
+        else first_day
+    )
+    profiles["first_day"] = np.clip(created.astype(np.int64), first_day, last_day)
+    days = days.merge(profiles[["pk", "first_day"]], on="pk")
+    days = days[days["day"] >= days["first_day"]]
 
-        existing_dates = [
-            d.date()
-            for d in profile.tweets.filter(created_at__isnull=False).values_list(
-                "created_at", flat=True
-            )
+    # With the day before each range and the end of the range added as bounds, every gap between two
+    # consecutive active days of the same profile is a period without any tweets
+    bounds = pd.concat(
+        [
+            days[["pk", "day"]],
+            pd.DataFrame({"pk": profiles["pk"], "day": profiles["first_day"] - 1}),
+            pd.DataFrame({"pk": profiles["pk"], "day": last_day}),
         ]
-        date_counts = Counter(existing_dates)
-
-        date = min_date
-        while date < max_date:
-
-            consecutive = 0
-            start_date = date
-            while consecutive < min_consecutive_missing_dates and start_date < max_date:
-
-                while date_counts[start_date] > 0:
-                    start_date = start_date + datetime.timedelta(days=1)
-
-                end_date = start_date + datetime.timedelta(days=1)
-                consecutive = 1
-                while date_counts[end_date] == 0:
-                    end_date = end_date + datetime.timedelta(days=1)
-                    consecutive += 1
-                    if end_date >= max_date:
-                        break
-
-                if consecutive >= min_consecutive_missing_dates:
-                    rows.append(
-                        {
-                            "twitter_id": profile.twitter_id,
-                            "start_date": start_date,
-                            "end_date": end_date,
-                        }
-                    )
-                    break
-                else:
-                    start_date = end_date
-            if start_date >= max_date:
-                break
-            date = end_date
-
-    missing_dates = pd.DataFrame(rows)
-    if len(missing_dates) > 0:
-        missing_dates["range"] = missing_dates.apply(
-            lambda x: (x["end_date"] - x["start_date"]).days, axis=1
-        )
-        missing_dates = missing_dates.sort_values("range", ascending=False)
+    ).sort_values(["pk", "day"], kind="mergesort")
+    pks, bound_days = bounds["pk"].values, bounds["day"].values.astype(np.int64)
+    start, end = bound_days[:-1] + 1, bound_days[1:]
+    gaps = (pks[:-1] == pks[1:]) & (end - start >= max(min_consecutive_missing_dates, 1))
+
+    missing_dates = pd.DataFrame(
+        {
+            "twitter_id": pd.Series(pks[:-1][gaps]).map(
+                profiles.set_index("pk")["twitter_id"]
+            ),
+            "start_date": start[gaps].astype("datetime64[D]").astype(object),
+            "end_date": end[gaps].astype("datetime64[D]").astype(object),
+            "range": end[gaps] - start[gaps],
+        },
+        columns=["twitter_id", "start_date", "end_date", "range"],
+    )
+    missing_dates = missing_dates.sort_values("range", ascending=False, kind="mergesort")
 
     return missing_dates
 
 
+SNAPSHOT_NUMERIC_COLUMNS = [
+    "followers_count",
+    "favorites_count",
+    "followings_count",
+    "listed_count",
+    "statuses_count",
+]
+SNAPSHOT_PADDED_COLUMNS = [
+    "description",
+    "name",
+    "screen_name",
+    "status",
+    "is_verified",
+    "is_protected",
+    "created_at",
+    "location",
+    "twitter_error_code",
+]
+SNAPSHOT_TEXT_COLUMNS = ["description", "name", "screen_name", "status", "location"]
+
+
 def get_twitter_profile_dataframe(
     profiles, start_date, end_date, *extra_values, **kwargs
 ):
@@ -356,24 +578,156 @@ def get_twitter_profile_dataframe(
     Given a QuerySet of TwitterProfile objects, a start date, and an end date, returns a dataframe of profile snapshots.
     The resulting dataframe will contain a row for every date and profile, along with profile data as it appeared on
     that date, based on the available snapshots.  Profile statistics, like follower counts, are linearly interpolated
-    between snapshots.  Dates for which no snapshot yet existed will have null values.
+    between snapshots.  Dates for which no snapshot yet existed will have null values. All of the profiles' snapshots
+    are loaded in a single query, and every profile is resampled and interpolated at once.
 
     :param profiles: A QuerySet of TwitterProfile objects
     :param start_date: The function will attempt to return profiles as they appeared over the timeframe
     :param end_date: The function will attempt to return profiles as they appeared over the timeframe
     :param extra_values: Additional arguments can be used to select additional fields to return (operates the same as
-    requesting fields via `TwitterProfile.objects.values(field1, field2)`
+    requesting fields via `TwitterProfileSnapshot.objects.values(field1, field2)`, e.g. "profile__politician_id")
     :param skip_interpolation: If you pass `skip_interpolation=True` as a kwarg, values will only be returned for the \
     specific dates that have snapshots. By default, values will be interpolated for missing dates.
     :return: A DataFrame representing the TwitterProfiles at every point in time in the range requested
     """
 
-    stats = []
-    for profile in tqdm(profiles, desc="Extracting Twitter profile snapshots", disable=os.environ.get("DISABLE_TQDM", False)):
-        stats.append(
-            profile.get_snapshots(start_date, end_date, *extra_values, **kwargs)
+    TwitterProfileSnapshot = get_concrete_model("AbstractTwitterProfileSnapshot")
+    skip_interpolation = kwargs.get("skip_interpolation", False)
+
+    start_date = datetime.datetime(
+        start_date.year,
+        start_date.month,
+        start_date.day,
+        0,
+        0,
+        0,
+        tzinfo=pytz.timezone("US/Eastern"),
+    )
+    end_date = datetime.datetime(
+        end_date.year,
+        end_date.month,
+        end_date.day,
+        23,
+        59,
+        59,
+        tzinfo=pytz.timezone("US/Eastern"),
+    )
+    snapshot_columns = [
+        "description",
+        "followers_count",
+        "favorites_count",
+        "followings_count",
+        "listed_count",
+        "statuses_count",
+        "name",
+        "screen_name",
+        "status",
+        "is_verified",
+        "is_protected",
+        "location",
+    ]
+    columns = snapshot_columns + ["created_at", "twitter_error_code"] + list(extra_values)
+    fields = (
+        ["profile_id", "profile__twitter_id", "timestamp"]
+        + snapshot_columns
+        + ["profile__created_at", "profile__twitter_error_code"]
+        + list(extra_values)
+    )
+    stats = pd.DataFrame.from_records(
+        TwitterProfileSnapshot.objects.filter(profile__in=profiles.values("pk"))
+        .order_by("profile_id", "-timestamp")
+        .values_list(*fields),
+        columns=["pk", "twitter_id", "timestamp"] + columns,
+    )
+    if len(stats) == 0:
+        return pd.DataFrame(columns=["date"] + columns + ["twitter_id", "pk"])
+
+    try:
+        stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_convert(
+            tz="US/Eastern"
         )
-    return pd.concat(stats)
+    except TypeError:
+        try:
+            stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_localize(
+                tz="US/Eastern"
+            )
+        except:
+            stats["timestamp"] = pd.to_datetime(stats["timestamp"]).dt.tz_localize(
+                tz="US/Eastern", ambiguous=True
+            )
+
+    # Each profile starts with its last snapshot on or before the start date and ends with its first snapshot on or
+    # after the end date; profiles without one get an empty row on that date instead, so their range still gets
+    # filled out
+    before = stats[stats["timestamp"] <= start_date].groupby("pk")["timestamp"].max()
+    after = stats[stats["timestamp"] >= end_date].groupby("pk")["timestamp"].min()
+    lower, upper = stats["pk"].map(before), stats["pk"].map(after)
+    stats = stats[
+        (lower.isnull() | (stats["timestamp"] >= lower))
+        & (upper.isnull() | (stats["timestamp"] <= upper))
+    ]
+    twitter_ids = stats.drop_duplicates("pk").set_index("pk")["twitter_id"]
+    padding = [
+        pd.DataFrame(
+            {
+                "pk": twitter_ids.index[~twitter_ids.index.isin(dates.index)],
+                "timestamp": pd.Timestamp(date).tz_convert("US/Eastern"),
+            }
+        )
+        for date, dates in [(start_date, before), (end_date, after)]
+    ]
+    stats = pd.concat([stats] + [p for p in padding if len(p)], ignore_index=True)
+
+    # Equivalent to resampling each profile by day and taking the first (i.e. most recent) value of each column
+    stats["date"] = stats["timestamp"].dt.tz_localize(None).dt.normalize()
+    stats = stats.sort_values(
+        ["pk", "timestamp"], ascending=[True, False], kind="mergesort"
+    )
+    stats = stats.groupby(["pk", "date"])[columns].first()
+    bounds = stats.reset_index().groupby("pk")["date"].agg(["min", "max"])
+    lengths = ((bounds["max"] - bounds["min"]).dt.days + 1).values
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    stats = stats.reindex(
+        pd.MultiIndex.from_arrays(
+            [
+                np.repeat(bounds.index.values, lengths),
+                np.repeat(bounds["min"].values, lengths)
+                + offsets.astype("timedelta64[D]"),
+            ],
+            names=["pk", "date"],
+        )
+    ).reset_index()
+
+    if not skip_interpolation:
+        # Filling across the whole panel at once is safe as long as values are only kept between two of the same
+        # profile's snapshots (i.e. `limit_area="inside"`)
+        def _inside(values):
+            valid = values.notnull().astype(int)
+            after_first = valid.groupby(stats["pk"]).cummax()
+            before_last = valid[::-1].groupby(stats["pk"][::-1]).cummax()[::-1]
+            return (after_first & before_last).astype(bool)
+
+        numeric = stats[SNAPSHOT_NUMERIC_COLUMNS].astype(float)
+        stats[SNAPSHOT_NUMERIC_COLUMNS] = numeric.interpolate(method="linear").where(
+            _inside(numeric)
+        )
+        padded = stats[SNAPSHOT_PADDED_COLUMNS + list(extra_values)]
+        stats[SNAPSHOT_PADDED_COLUMNS + list(extra_values)] = padded.ffill().where(
+            _inside(padded)
+        )
+
+    stats["date"] = stats["date"].dt.date
+    stats = stats[
+        (stats["date"] >= start_date.date()) & (stats["date"] <= end_date.date())
+    ].copy()
+    stats["twitter_id"] = stats["pk"].map(twitter_ids)
+    stats[SNAPSHOT_TEXT_COLUMNS] = (
+        stats[SNAPSHOT_TEXT_COLUMNS]
+        .fillna("")
+        .apply(lambda x: x.str.replace("\r", " "))
+    )
+
+    return stats[["date"] + columns + ["twitter_id", "pk"]]
 
 
 def get_tweet_dataframe(profiles, start_date, end_date, *extra_values, **kwargs):
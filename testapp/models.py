@@ -7,7 +7,9 @@ from django_twitter.models import (
     AbstractTweet,
     AbstractTwitterFollowerList,
     AbstractTwitterFollowingList,
+    AbstractTwitterProfileListChurn,
     AbstractTwitterHashtag,
+    AbstractTweetDeleteNotice,
     AbstractTweetSet,
     AbstractTwitterProfileSet,
 )
@@ -57,11 +59,21 @@ class TwitterFollowingList(AbstractTwitterFollowingList):
     pass
 
 
+class TwitterProfileListChurn(AbstractTwitterProfileListChurn):
+
+    pass
+
+
 class TwitterHashtag(AbstractTwitterHashtag):
 
     pass
 
 
+class TweetDeleteNotice(AbstractTweetDeleteNotice):
+
+    pass
+
+
 class TweetSet(AbstractTweetSet):
 
     pass
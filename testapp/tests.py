@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import datetime
 import json
+import os
 
 from multiprocessing import Pool
 
@@ -51,9 +52,22 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
             self.assertIsNotNone(snapshot.description)
             self.assertIsNotNone(snapshot.favorites_count)
         self.assertIsNotNone(profile.most_recent_snapshot)
+        self.assertEqual(
+            profile.most_recent_snapshot, profile.snapshots.order_by("-timestamp")[0]
+        )
         profile.most_recent_snapshot.delete()
         profile.refresh_from_db()
         self.assertIsNotNone(profile.pk)
+        self.TwitterProfile.objects.filter(pk=profile.pk).update(
+            most_recent_snapshot=None
+        )
+        call_command("django_twitter_update_most_recent_snapshots")
+        profile.refresh_from_db()
+        if profile.snapshots.count() > 0:
+            self.assertEqual(
+                profile.most_recent_snapshot,
+                profile.snapshots.order_by("-timestamp")[0],
+            )
 
         call_command(
             "django_twitter_get_profile_set",
@@ -65,12 +79,39 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
             profile.twitter_profile_sets.filter(name="get_profile_set").count(), 1
         )
 
+        missing = self.TwitterProfile.objects.create(twitter_id="1")
+        profile_set = self.TwitterProfileSet.objects.get(name="get_profile_set")
+        profile_set.profiles.add(missing)
+        call_command(
+            "django_twitter_get_profile_set",
+            "get_profile_set",
+            add_to_profile_set="get_profile_set_batch",
+            batch_size=100,
+        )
+        missing.refresh_from_db()
+        self.assertEqual(missing.twitter_error_code, 50)
+        self.assertEqual(
+            profile.twitter_profile_sets.filter(name="get_profile_set_batch").count(), 1
+        )
+
         call_command(
             "django_twitter_get_profile_followers",
             profile.twitter_id,
             add_to_profile_set="get_profile_followers",
             limit=5,
         )
+        follower_list = profile.follower_lists.get()
+        self.assertEqual(follower_list.followers.count(), 5)
+        # The first page was cut short by the limit, so it isn't checkpointed and can't be resumed
+        self.assertEqual(follower_list.page_count, 0)
+        self.assertIsNone(follower_list.next_cursor)
+        call_command(
+            "django_twitter_get_profile_followers",
+            profile.twitter_id,
+            limit=5,
+            resume=True,
+        )
+        self.assertEqual(profile.follower_lists.count(), 2)
         # Hard-update finish time since we passed a limit for unit testing
         profile.follower_lists.update(finish_time=datetime.datetime.now())
         self.assertGreater(profile.follower_lists.count(), 0)
@@ -126,6 +167,23 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
         )
         correct_num_tweets = profile.tweets.count()
         self.assertGreater(correct_num_tweets, 0)
+        profile.refresh_from_db()
+        self.assertFalse(profile.tweet_backfilled)
+        self.assertIsNotNone(profile.newest_tweet_id)
+        self.assertLessEqual(profile.oldest_tweet_id, profile.newest_tweet_id)
+
+        # An unfinished backfill resumes from the oldest tweet that was collected
+        oldest_tweet_id = profile.oldest_tweet_id
+        call_command(
+            "django_twitter_get_profile_tweets",
+            profile.twitter_id,
+            limit=50,
+            add_to_profile_set="get_profile_tweets",
+            add_to_tweet_set="get_profile_tweets",
+        )
+        profile.refresh_from_db()
+        self.assertLess(profile.oldest_tweet_id, oldest_tweet_id)
+        correct_num_tweets = profile.tweets.count()
         for tweet in self.TweetSet.objects.get(name="get_profile_tweets").tweets.all()[
             :5
         ]:
@@ -218,6 +276,41 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
         self.assertGreater(self.TwitterFollowingList.objects.count(), 0)
         self.assertGreater(self.TwitterHashtag.objects.count(), 0)
 
+    def test_most_recent_snapshot(self):
+
+        profile = self.TwitterProfile.objects.create(twitter_id="5000")
+        first = self.TwitterProfileSnapshot.objects.create(profile=profile)
+        stale = self.TwitterProfile.objects.get(pk=profile.pk)
+        self.assertEqual(stale.most_recent_snapshot, first)
+
+        # A stale pointer doesn't overwrite the one set by a newer snapshot
+        second = self.TwitterProfileSnapshot.objects.create(profile_id=profile.pk)
+        stale.screen_name = "stale"
+        stale.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.screen_name, "stale")
+        self.assertEqual(profile.most_recent_snapshot, second)
+
+        # Assigning it explicitly still saves it
+        profile.most_recent_snapshot = first
+        profile.save()
+        self.assertEqual(
+            self.TwitterProfile.objects.get(pk=profile.pk).most_recent_snapshot, first
+        )
+        stale.most_recent_snapshot = None
+        stale.save()
+        profile.refresh_from_db()
+        self.assertIsNone(profile.most_recent_snapshot)
+
+        # Profiles that were deleted in the meantime get saved again
+        stale = self.TwitterProfile.objects.create(twitter_id="5001")
+        self.TwitterProfile.objects.filter(pk=stale.pk).delete()
+        stale.screen_name = "restored"
+        stale.save()
+        self.assertEqual(
+            self.TwitterProfile.objects.get(twitter_id="5001").screen_name, "restored"
+        )
+
     def test_profile_set_commands(self):
 
         HANDLES = ["pewresearch", "pewglobal"]
@@ -449,6 +542,7 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
             test=True,
             keyword_query="pew",
             add_to_tweet_set="pew_tweets",
+            flush_seconds=10,
             num_cores=1,
         )
         reset_django_connection()
@@ -456,6 +550,961 @@ class DjangoTwitterTests(DjangoTransactionTestCase):
             self.TweetSet.objects.get(name="pew_tweets").tweets.count(), 0
         )
 
+    def test_average_cosine_similarities(self):
+
+        import numpy as np
+        import pandas as pd
+        from scipy import sparse
+        from sklearn.metrics.pairwise import cosine_similarity
+        from pewanalytics.text import TextDataFrame
+        from django_twitter.utils import (
+            _get_average_cosine_similarities,
+            _identify_unusual_text,
+        )
+
+        random = np.random.RandomState(42)
+        dense = random.rand(7, 20) * (random.rand(7, 20) < 0.3)
+        dense[3] = 0  # A row without any terms
+        tfidf = sparse.csr_matrix(dense)
+        expected = cosine_similarity(tfidf, tfidf).mean(axis=1)
+        for chunk_size in [2, 3, 7, 100]:
+            np.testing.assert_allclose(
+                _get_average_cosine_similarities(tfidf, chunk_size=chunk_size),
+                expected,
+            )
+
+        # The frames match the ones built from the full similarity matrix
+        descriptions = [
+            "Pew Research Center: nonpartisan facts {}".format(i) for i in range(12)
+        ]
+        profiles = pd.DataFrame(
+            {"description": descriptions + ["", "Singer, songwriter, world tour"]}
+        )
+        most_similar, most_unique = _identify_unusual_text(profiles, "description")
+        not_empty = profiles[profiles["description"] != ""].copy()
+        tdf = TextDataFrame(
+            not_empty, "description", min_df=1, analyzer="char", ngram_range=(1, 10)
+        )
+        not_empty["avg_cosine"] = cosine_similarity(tdf.tfidf, tdf.tfidf).mean(axis=1)
+        mean, std = not_empty["avg_cosine"].mean(), not_empty["avg_cosine"].std()
+        pd.testing.assert_frame_equal(
+            most_similar,
+            not_empty[not_empty["avg_cosine"] >= mean + std * 2].sort_values(
+                "avg_cosine", ascending=False
+            ),
+        )
+        pd.testing.assert_frame_equal(
+            most_unique,
+            not_empty[not_empty["avg_cosine"] <= mean - std * 2].sort_values(
+                "avg_cosine", ascending=True
+            ),
+        )
+        self.assertEqual(list(most_unique.index), [13])
+
+    def test_find_missing_date_ranges(self):
+
+        from django_twitter.utils import find_missing_date_ranges
+
+        first = self.TwitterProfile.objects.create(
+            twitter_id="6001", created_at=datetime.datetime(2019, 6, 1)
+        )
+        second = self.TwitterProfile.objects.create(
+            twitter_id="6002", created_at=datetime.datetime(2020, 1, 20)
+        )
+        self.TwitterProfile.objects.create(twitter_id="6003")
+        for profile, dates in [
+            # Tweets outside of the window and before a profile was created don't count
+            (first, [(2019, 12, 30), (2020, 1, 8), (2020, 1, 9), (2020, 1, 16)]),
+            (first, [(2020, 1, 25), (2020, 1, 31), (2020, 2, 3)]),
+            (second, [(2020, 1, 10)]),
+        ]:
+            for date in dates:
+                self.Tweet.objects.create(
+                    twitter_id="{}{:02d}{:02d}{:02d}".format(
+                        profile.twitter_id, date[0] % 100, date[1], date[2]
+                    ),
+                    profile=profile,
+                    created_at=datetime.datetime(*date, 12),
+                )
+        profiles = self.TwitterProfile.objects.filter(
+            twitter_id__in=["6001", "6002", "6003"]
+        )
+
+        def get_ranges(**kwargs):
+            missing = find_missing_date_ranges(
+                profiles,
+                datetime.date(2020, 1, 1),
+                max_date=datetime.date(2020, 1, 31),
+                **kwargs
+            )
+            return [
+                (r["twitter_id"], r["start_date"], r["end_date"], r["range"])
+                for _, r in missing.iterrows()
+            ]
+
+        # Each range ends on the next active day (or the end of the window), so a 7-day gap at the start of the
+        # window is included, while the 6-day gap between the 9th and the 16th and the 5 days at the end are not
+        self.assertEqual(
+            get_ranges(),
+            [
+                ("6003", datetime.date(2020, 1, 1), datetime.date(2020, 1, 31), 30),
+                ("6002", datetime.date(2020, 1, 20), datetime.date(2020, 1, 31), 11),
+                ("6001", datetime.date(2020, 1, 17), datetime.date(2020, 1, 25), 8),
+                ("6001", datetime.date(2020, 1, 1), datetime.date(2020, 1, 8), 7),
+            ],
+        )
+        self.assertEqual(
+            [r[1:] for r in get_ranges(min_consecutive_missing_dates=8)],
+            [
+                (datetime.date(2020, 1, 1), datetime.date(2020, 1, 31), 30),
+                (datetime.date(2020, 1, 20), datetime.date(2020, 1, 31), 11),
+                (datetime.date(2020, 1, 17), datetime.date(2020, 1, 25), 8),
+            ],
+        )
+        self.assertEqual(
+            [r[3] for r in get_ranges(min_consecutive_missing_dates=5)],
+            [30, 11, 8, 7, 6, 5],
+        )
+
+    def test_twitter_profile_dataframe(self):
+
+        import numpy as np
+        import pandas as pd
+        from django_twitter.utils import get_twitter_profile_dataframe
+
+        profiles = {}
+        for twitter_id, snapshots in [
+            (
+                "7001",
+                [
+                    ((2019, 12, 30, 12), 60, "a"),
+                    ((2020, 1, 3, 12), 100, "a"),
+                    # Superseded by the later snapshot on the same day
+                    ((2020, 1, 7, 9), 999, "x"),
+                    ((2020, 1, 7, 12), 140, "b"),
+                ],
+            ),
+            ("7002", [((2020, 1, 5, 12), 500, "solo")]),
+            ("7003", [((2020, 1, 2, 12), 10, "c"), ((2020, 1, 12, 12), 30, "d")]),
+        ]:
+            profile = self.TwitterProfile.objects.create(
+                twitter_id=twitter_id, screen_name="profile_{}".format(twitter_id)
+            )
+            for timestamp, followers_count, description in snapshots:
+                snapshot = self.TwitterProfileSnapshot.objects.create(
+                    profile=profile,
+                    followers_count=followers_count,
+                    description=description,
+                )
+                self.TwitterProfileSnapshot.objects.filter(pk=snapshot.pk).update(
+                    timestamp=datetime.datetime(*timestamp)
+                )
+            profiles[twitter_id] = profile
+        queryset = self.TwitterProfile.objects.filter(twitter_id__in=profiles.keys())
+        start_date, end_date = datetime.date(2020, 1, 1), datetime.date(2020, 1, 10)
+        dates = [datetime.date(2020, 1, d) for d in range(1, 11)]
+
+        for kwargs in [{}, {"skip_interpolation": True}]:
+            panel = get_twitter_profile_dataframe(
+                queryset, start_date, end_date, "profile__screen_name", **kwargs
+            )
+            self.assertEqual(len(panel), 30)
+            for twitter_id, profile in profiles.items():
+                rows = panel[panel["pk"] == profile.pk].reset_index(drop=True)
+                self.assertEqual(list(rows["date"]), dates)
+                self.assertTrue((rows["twitter_id"] == twitter_id).all())
+                pd.testing.assert_frame_equal(
+                    rows,
+                    profile.get_snapshots(
+                        start_date, end_date, "profile__screen_name", **kwargs
+                    ).reset_index(drop=True),
+                    check_dtype=False,
+                )
+            if kwargs:
+                skipped = panel.set_index(["pk", "date"])
+            else:
+                interpolated = panel.set_index(["pk", "date"])
+
+        def get_values(panel, twitter_id, column):
+            return panel.loc[profiles[twitter_id].pk][column].tolist()
+
+        def get_counts(panel, twitter_id):
+            return np.array(
+                get_values(panel, twitter_id, "followers_count"), dtype=float
+            )
+
+        # Values are interpolated between snapshots (including the last one before the range), but never past a
+        # profile's last snapshot, or before the first
+        np.testing.assert_array_equal(
+            get_counts(interpolated, "7001"),
+            [80, 90, 100, 110, 120, 130, 140, np.nan, np.nan, np.nan],
+        )
+        self.assertEqual(
+            get_values(interpolated, "7001", "description"),
+            ["a"] * 6 + ["b", "", "", ""],
+        )
+        screen_names = get_values(interpolated, "7001", "profile__screen_name")
+        self.assertEqual(screen_names[:7], ["profile_7001"] * 7)
+        self.assertTrue(pd.isnull(screen_names[7:]).all())
+        np.testing.assert_array_equal(
+            get_counts(interpolated, "7002"),
+            [np.nan] * 4 + [500] + [np.nan] * 5,
+        )
+        self.assertEqual(
+            get_values(interpolated, "7002", "description"),
+            [""] * 4 + ["solo"] + [""] * 5,
+        )
+        np.testing.assert_array_equal(
+            get_counts(interpolated, "7003"),
+            [np.nan, 10, 12, 14, 16, 18, 20, 22, 24, 26],
+        )
+
+        # Without interpolation, only the days with snapshots have values
+        np.testing.assert_array_equal(
+            get_counts(skipped, "7001"),
+            [np.nan, np.nan, 100, np.nan, np.nan, np.nan, 140, np.nan, np.nan, np.nan],
+        )
+        np.testing.assert_array_equal(
+            get_counts(skipped, "7003"),
+            [np.nan, 10] + [np.nan] * 8,
+        )
+
+    def test_ingest_json_batch(self):
+
+        call_command(
+            "django_twitter_get_profile_tweets", "pewresearch", limit=25,
+        )
+        tweets = list(self.Tweet.objects.filter(profile__screen_name="pewresearch"))
+        self.assertGreater(len(tweets), 0)
+        hashtag_counts = {t.twitter_id: t.hashtags.count() for t in tweets}
+        json = [t.json for t in tweets]
+        self.Tweet.objects.filter(pk__in=[t.pk for t in tweets]).delete()
+
+        saved = self.Tweet.objects.ingest_json_batch(
+            json,
+            tweet_set=self.TweetSet.objects.create(name="ingest_json_batch"),
+            profile_set=self.TwitterProfileSet.objects.create(name="ingest_json_batch"),
+        )
+        self.assertEqual(len(saved), len(tweets))
+        for tweet in tweets:
+            new_tweet = self.Tweet.objects.get(twitter_id=tweet.twitter_id)
+            self.assertEqual(new_tweet.text, tweet.text)
+            self.assertEqual(new_tweet.created_at, tweet.created_at)
+            self.assertEqual(new_tweet.profile_id, tweet.profile_id)
+            self.assertEqual(new_tweet.hashtags.count(), hashtag_counts[tweet.twitter_id])
+        self.assertEqual(
+            self.TweetSet.objects.get(name="ingest_json_batch").tweets.count(),
+            len(tweets),
+        )
+        self.assertEqual(
+            self.TwitterProfileSet.objects.get(name="ingest_json_batch")
+            .profiles.filter(screen_name="pewresearch")
+            .count(),
+            1,
+        )
+
+    def test_bulk_create_history(self):
+
+        from django_twitter.managers import bulk_create_objects, bulk_get_or_create
+
+        self.TwitterProfile.objects.create(twitter_id="1")
+        profiles = bulk_get_or_create(self.TwitterProfile, "twitter_id", ["1", "2", "3"])
+        self.assertEqual(set(profiles.keys()), set(["1", "2", "3"]))
+        for profile in profiles.values():
+            self.assertEqual(profile.history.filter(history_type="+").count(), 1)
+
+        # Rows that turn up in the meantime don't stop the others from getting history
+        created = bulk_create_objects(
+            self.TwitterProfile,
+            [self.TwitterProfile(twitter_id=t) for t in ["3", "4"]],
+            ignore_conflicts=True,
+        )
+        self.assertIn("4", [p.twitter_id for p in created])
+        self.assertEqual(
+            self.TwitterProfile.objects.get(twitter_id="4")
+            .history.filter(history_type="+")
+            .count(),
+            1,
+        )
+
+    def test_load_jsonl_command(self):
+
+        import gzip
+        import tempfile
+
+        call_command(
+            "django_twitter_get_profile_tweets", "pewresearch", limit=25,
+        )
+        tweets = list(self.Tweet.objects.filter(profile__screen_name="pewresearch"))
+        self.assertGreater(len(tweets), 0)
+        hashtag_counts = {t.twitter_id: t.hashtags.count() for t in tweets}
+        path = os.path.join(tempfile.mkdtemp(), "tweets.jsonl.gz")
+        with gzip.open(path, "wt") as outfile:
+            for tweet in tweets:
+                outfile.write(json.dumps(tweet.json) + "\n")
+            outfile.write(json.dumps({"delete": {"status": {"id": 1}}}) + "\n")
+        self.Tweet.objects.filter(pk__in=[t.pk for t in tweets]).delete()
+
+        call_command(
+            "django_twitter_load_jsonl",
+            path,
+            batch_size=10,
+            num_cores=1,
+            add_to_tweet_set="load_jsonl",
+            no_progress_bar=True,
+        )
+        for tweet in tweets:
+            new_tweet = self.Tweet.objects.get(twitter_id=tweet.twitter_id)
+            self.assertEqual(new_tweet.text, tweet.text)
+            self.assertEqual(new_tweet.created_at, tweet.created_at)
+            self.assertEqual(new_tweet.profile_id, tweet.profile_id)
+            self.assertEqual(sorted(new_tweet.links), sorted(tweet.links))
+            self.assertEqual(new_tweet.hashtags.count(), hashtag_counts[tweet.twitter_id])
+        self.assertEqual(
+            self.TweetSet.objects.get(name="load_jsonl").tweets.count(), len(tweets)
+        )
+        profile = self.TwitterProfile.objects.get(screen_name="pewresearch")
+        self.assertEqual(
+            profile.most_recent_snapshot, profile.snapshots.order_by("-timestamp")[0]
+        )
+
+    def test_load_jsonl_parsing(self):
+
+        from django_twitter.management.commands.django_twitter_load_jsonl import (
+            imap_bounded,
+            parse_lines,
+        )
+
+        batch = parse_lines(
+            [
+                "not json",
+                "[1, 2, 3]",
+                '"a string"',
+                '{"delete": {"status": {"id_str": "1"}}}',
+                '{"id_str": "2", "user": {}}',
+                "",
+            ]
+        )
+        self.assertEqual(batch["tweets"], [])
+        self.assertEqual(batch["skipped"], 5)
+
+        class FakeResult(object):
+            def __init__(self, pool, value):
+                self.pool, self.value = pool, value
+
+            def get(self):
+                self.pool.pending -= 1
+                return self.value
+
+        class FakePool(object):
+            pending, max_pending = 0, 0
+
+            def apply_async(self, func, args):
+                self.pending += 1
+                self.max_pending = max(self.max_pending, self.pending)
+                return FakeResult(self, func(*args))
+
+        pool = FakePool()
+        results = list(imap_bounded(pool, lambda x: x * 2, iter(range(20)), 4))
+        self.assertEqual(results, [x * 2 for x in range(20)])
+        self.assertEqual(pool.max_pending, 4)
+
+    def test_writer_queue_delete_batches(self):
+
+        import threading
+        from django_twitter.management.commands.django_twitter_collect_tweet_stream import (
+            WriterQueue,
+        )
+
+        class FakePool(object):
+            callbacks = []
+
+            def apply_async(self, func, args, callback, error_callback):
+                self.callbacks.append(callback)
+
+        pool = FakePool()
+        writer = WriterQueue(pool, max_pending=1, policy="drop")
+        self.assertTrue(writer.submit(print, [{"id_str": "1"}]))
+        self.assertFalse(writer.submit(print, [{"id_str": "2"}]))
+        self.assertEqual(writer.stats()["dropped_batches"], 1)
+
+        # Delete notices wait for room in the queue instead of getting dropped
+        thread = threading.Thread(
+            target=writer.submit, args=(print, [{"id_str": "3"}]), kwargs={"block": True}
+        )
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        pool.callbacks[0](None)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(pool.callbacks), 2)
+        self.assertEqual(writer.stats()["dropped_batches"], 1)
+
+    def test_writer_queue_policies(self):
+
+        import glob
+        import tempfile
+        import threading
+        from django_twitter.management.commands.django_twitter_collect_tweet_stream import (
+            WriterQueue,
+        )
+
+        class FakePool(object):
+            def __init__(self):
+                self.callbacks = []
+
+            def apply_async(self, func, args, callback, error_callback):
+                self.callbacks.append(callback)
+
+        # Once the queue is full, new batches wait for a slot to open up
+        pool = FakePool()
+        writer = WriterQueue(pool, max_pending=1, policy="block")
+        self.assertTrue(writer.submit(print, [{"id_str": "1"}]))
+        thread = threading.Thread(target=writer.submit, args=(print, [{"id_str": "2"}]))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(writer.stats()["pending_batches"], 1)
+        pool.callbacks[0](None)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(pool.callbacks), 2)
+        self.assertEqual(writer.stats()["completed_batches"], 1)
+
+        # Or get written to a file that can be loaded later
+        tweets = [
+            {
+                "id_str": str(twitter_id),
+                "created_at": "Wed Jan 01 12:00:00 +0000 2020",
+                "text": "Spilled tweet {}".format(twitter_id),
+                "user": {
+                    "id_str": "8000",
+                    "screen_name": "spilled",
+                    "created_at": "Mon Jun 01 12:00:00 +0000 2015",
+                    "favourites_count": 0,
+                },
+            }
+            for twitter_id in [8001, 8002]
+        ]
+        directory = tempfile.mkdtemp()
+        pool = FakePool()
+        writer = WriterQueue(
+            pool, max_pending=1, policy="spill", spill_directory=directory
+        )
+        self.assertTrue(writer.submit(print, [{"id_str": "1"}]))
+        self.assertFalse(writer.submit(print, tweets))
+        self.assertEqual(writer.stats()["spilled_batches"], 1)
+        self.assertEqual(writer.stats()["dropped_batches"], 0)
+        self.assertEqual(len(pool.callbacks), 1)
+        spill_files = glob.glob(os.path.join(directory, "stream_spill_*.jsonl.gz"))
+        self.assertEqual(spill_files, writer.spill_files)
+
+        call_command(
+            "django_twitter_load_jsonl", *spill_files, num_cores=1, no_progress_bar=True
+        )
+        self.assertEqual(
+            sorted(
+                self.Tweet.objects.filter(profile__twitter_id="8000").values_list(
+                    "twitter_id", flat=True
+                )
+            ),
+            ["8001", "8002"],
+        )
+
+    def test_rate_limiter(self):
+
+        import tempfile
+        from unittest import mock
+        from django_twitter.ratelimit import FileStore, RateLimiter
+
+        class FakeClock(object):
+            now = 1000.0
+
+            def time(self):
+                return self.now
+
+            def sleep(self, seconds):
+                self.now += seconds
+
+        clock = FakeClock()
+        with mock.patch("django_twitter.ratelimit.time", clock):
+
+            # The bucket starts full and then refills at two requests per two seconds
+            limiter = RateLimiter(limits={"test/endpoint": (2, 2)})
+            self.assertEqual(limiter.acquire("test/endpoint"), 0)
+            self.assertEqual(limiter.acquire("test/endpoint"), 0)
+            self.assertAlmostEqual(limiter.acquire("test/endpoint"), 1)
+            self.assertEqual(clock.now, 1001.0)
+            clock.now += 10
+            self.assertEqual(limiter.acquire("test/endpoint"), 0)
+            self.assertEqual(limiter.acquire("other/endpoint"), 0)
+
+            # Headers saying the window is used up block the bucket until it resets
+            limiter = RateLimiter(limits={"test/endpoint": (2, 2)})
+            limiter.observe("test/endpoint", remaining=0, reset=clock.now + 10)
+            self.assertAlmostEqual(limiter.acquire("test/endpoint"), 10)
+            self.assertEqual(limiter.acquire("test/endpoint", credential="other"), 0)
+
+            # Limiters that use the same directory share the same budget
+            directory = tempfile.mkdtemp()
+            first = RateLimiter(
+                FileStore(directory), limits={"test/endpoint": (2, 60)}
+            )
+            second = RateLimiter(
+                FileStore(directory), limits={"test/endpoint": (2, 60)}
+            )
+            self.assertEqual(first.acquire("test/endpoint"), 0)
+            self.assertEqual(second.acquire("test/endpoint"), 0)
+            self.assertAlmostEqual(first.acquire("test/endpoint"), 30)
+            self.assertAlmostEqual(second.acquire("test/endpoint"), 30)
+
+    def test_credential_pool(self):
+
+        import tweepy
+        from types import SimpleNamespace
+        from django_twitter.credentials import CredentialPool
+
+        class FakeResponse(object):
+            reason = "Unauthorized"
+
+            def __init__(self, status_code, code):
+                self.status_code, self.code = status_code, code
+
+            def json(self):
+                return {"errors": [{"code": self.code, "message": "Error"}]}
+
+        requests = []
+
+        def make_handler(name, error=None):
+            def request(method, endpoint, *args, **kwargs):
+                requests.append(name)
+                if error:
+                    raise error
+                return name
+
+            return SimpleNamespace(name=name, api=SimpleNamespace(request=request))
+
+        pool = CredentialPool([])
+        for handler in [
+            make_handler(
+                "first", error=tweepy.errors.Unauthorized(FakeResponse(401, 89))
+            ),
+            make_handler("second"),
+            make_handler(
+                "third", error=tweepy.errors.TooManyRequests(FakeResponse(429, 88))
+            ),
+        ]:
+            pool._install_failover(handler, handler.name)
+            pool.handlers[handler.name] = handler
+
+        # Attribute lookups go to each set of credentials in turn
+        self.assertEqual([pool.name for i in range(3)], ["first", "second", "third"])
+
+        # Rejected credentials get disabled, and the request is retried with the next set
+        self.assertEqual(pool.api.request("GET", "users/show"), "second")
+        self.assertEqual(requests, ["first", "second"])
+        self.assertEqual(pool.disabled, {"first": 89})
+        self.assertEqual([pool.name for i in range(2)], ["third", "second"])
+
+        # Other errors get raised as usual
+        with self.assertRaises(tweepy.errors.TooManyRequests):
+            pool.api.request("GET", "users/show")
+        self.assertEqual(requests, ["first", "second", "third"])
+        self.assertEqual(pool.disabled, {"first": 89})
+
+        pool.disable("second", 64)
+        pool.disable("third", 326)
+        with self.assertRaises(RuntimeError):
+            pool.get_handler()
+
+    def test_concurrent_collector(self):
+
+        import io
+        import threading
+        from contextlib import redirect_stdout
+        from django_twitter.collectors import ConcurrentCollector
+
+        writer_threads = set()
+
+        def create_profile(twitter_id):
+            writer_threads.add(threading.current_thread().name)
+            if twitter_id == "14":
+                raise ValueError("Write failed")
+            return self.TwitterProfile.objects.create(twitter_id=twitter_id)
+
+        def collect(twitter_id, write=None):
+            if twitter_id == "13":
+                raise ValueError("Collection failed")
+            profile = write(create_profile, twitter_id)
+            self.assertEqual(profile.twitter_id, twitter_id)
+
+        twitter_ids = [str(i) for i in range(10, 30)]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            errors = ConcurrentCollector(
+                concurrency=4, db_writers=2, no_progress_bar=True
+            ).run(collect, twitter_ids)
+
+        # Errors in the collection function and on the writer threads both get counted and reported
+        self.assertEqual(errors, 2)
+        self.assertIn("Error collecting data for 13", output.getvalue())
+        self.assertIn("Collection failed", output.getvalue())
+        self.assertIn("Error collecting data for 14", output.getvalue())
+        self.assertIn("Write failed", output.getvalue())
+        self.assertEqual(
+            set(self.TwitterProfile.objects.values_list("twitter_id", flat=True)),
+            set(twitter_ids) - set(["13", "14"]),
+        )
+        self.assertLessEqual(len(writer_threads), 2)
+        self.assertNotIn(threading.current_thread().name, writer_threads)
+
+    def test_delete_notices(self):
+
+        from django_twitter.utils import get_concrete_model
+
+        TweetDeleteNotice = get_concrete_model("AbstractTweetDeleteNotice")
+        call_command(
+            "django_twitter_get_profile_tweets", "pewresearch", limit=5,
+        )
+        tweet = self.Tweet.objects.filter(profile__screen_name="pewresearch")[0]
+        self.assertEqual(
+            self.Tweet.objects.apply_deletes([tweet.twitter_id, "123"]), (1, 1)
+        )
+        tweet.refresh_from_db()
+        self.assertTrue(tweet.is_deleted)
+        self.assertEqual(TweetDeleteNotice.objects.filter(twitter_id="123").count(), 1)
+
+        tweet_json = dict(tweet.json)
+        tweet_json["id"], tweet_json["id_str"] = 123, "123"
+        self.Tweet.objects.ingest_json_batch([tweet_json])
+        self.assertTrue(self.Tweet.objects.get(twitter_id="123").is_deleted)
+        self.assertEqual(TweetDeleteNotice.objects.count(), 0)
+
+        self.Tweet.objects.apply_deletes(["123"], hard_delete=True)
+        self.assertEqual(self.Tweet.objects.filter(twitter_id="123").count(), 0)
+
+    def test_spool(self):
+
+        import tempfile
+        from django_twitter.spool import SpoolWriter, SpoolReader
+
+        call_command(
+            "django_twitter_get_profile_tweets", "pewresearch", limit=10,
+        )
+        tweets = list(self.Tweet.objects.filter(profile__screen_name="pewresearch"))
+        self.assertGreater(len(tweets), 1)
+        directory = tempfile.mkdtemp()
+        spool = SpoolWriter(directory, segment_size=len(tweets) - 1)
+        for tweet in tweets:
+            spool.write(json.dumps(tweet.json))
+        spool.close()
+        reader = SpoolReader(directory)
+        self.assertEqual(len(reader.segments()), 2)
+        self.Tweet.objects.filter(pk__in=[t.pk for t in tweets]).delete()
+
+        # Commit part of the first segment, as if the replay had been interrupted
+        lines, offset = next(reader.read_batches(reader.segments()[0], batch_size=1))
+        reader.commit(reader.segments()[0], offset)
+        call_command("django_twitter_replay_spool", directory, batch_size=5)
+        self.assertEqual(len(reader.segments()), 0)
+        self.assertEqual(
+            self.Tweet.objects.filter(
+                twitter_id__in=[t.twitter_id for t in tweets]
+            ).count(),
+            len(tweets) - 1,
+        )
+
+    def test_compact_follower_lists(self):
+
+        from django_twitter.managers import ingest_profile_list_batch
+
+        profile = self.TwitterProfile.objects.create(twitter_id="1000")
+        lists = []
+        for twitter_ids in [range(100), range(5, 105), range(50, 250)]:
+            follower_list = self.TwitterFollowerList.objects.create(profile=profile)
+            follower_list.finish(twitter_ids=twitter_ids)
+            lists.append(follower_list)
+        self.assertIsNotNone(lists[0].twitter_ids)
+        self.assertEqual(lists[1].base_list, lists[0])
+        self.assertEqual(lists[1].added_twitter_ids, list(range(100, 105)))
+        self.assertIsNone(lists[2].base_list)
+        self.assertEqual(lists[1].get_twitter_ids(), list(range(5, 105)))
+
+        lists[0].delete()
+        lists[1].refresh_from_db()
+        self.assertEqual(lists[1].twitter_ids, list(range(5, 105)))
+
+        follower_list = self.TwitterFollowerList.objects.create(profile=profile)
+        ingest_profile_list_batch(follower_list, ["1", "2", 3])
+        self.assertEqual(follower_list.followers.count(), 3)
+        self.assertEqual(follower_list.get_twitter_ids(), [1, 2, 3])
+
+        # Lists stored as differences get deleted along with their base lists when the profile is deleted
+        delta_list = self.TwitterFollowerList.objects.create(profile=profile)
+        delta_list.finish(twitter_ids=range(50, 251))
+        self.assertEqual(delta_list.base_list, lists[2])
+        profile_id = profile.pk
+        profile.delete()
+        self.assertEqual(
+            self.TwitterFollowerList.objects.filter(profile_id=profile_id).count(), 0
+        )
+
+    def test_follower_list_pages(self):
+
+        from types import SimpleNamespace
+        from django_twitter.utils import iterate_profile_list_pages
+        from django_twitter.management.commands.django_twitter_get_profile_followers import (
+            collect_profile_followers,
+        )
+
+        pages = {-1: (["1", "2", "3"], 11), 11: (["4", "5"], 0)}
+
+        class FakeAPI(object):
+            # Same return shape as tweepy 4's cursor-paginated methods
+            def get_follower_ids(self, cursor=-1, return_cursors=False, **kwargs):
+                page, next_cursor = pages[cursor]
+                return (page, (0, next_cursor)) if return_cursors else page
+
+        twitter = SimpleNamespace(
+            api=FakeAPI(),
+            get_profile=lambda twitter_id, return_errors=False: SimpleNamespace(
+                id_str="4000"
+            ),
+        )
+        self.assertEqual(
+            list(iterate_profile_list_pages(twitter, "4000", "followers")),
+            [(["1", "2", "3"], 11), (["4", "5"], 0)],
+        )
+
+        collect_profile_followers("4000", twitter, limit=2, no_progress_bar=True)
+        truncated = self.TwitterFollowerList.objects.get(profile__twitter_id="4000")
+        self.assertEqual(truncated.followers.count(), 2)
+        self.assertEqual(truncated.page_count, 0)
+        self.assertIsNone(truncated.next_cursor)
+
+        collect_profile_followers(
+            "4000", twitter, limit=3, resume=True, no_progress_bar=True
+        )
+        follower_list = self.TwitterFollowerList.objects.exclude(pk=truncated.pk).get(
+            profile__twitter_id="4000"
+        )
+        self.assertEqual(follower_list.page_count, 1)
+        self.assertEqual(follower_list.next_cursor, 11)
+
+        collect_profile_followers("4000", twitter, resume=True, no_progress_bar=True)
+        follower_list.refresh_from_db()
+        self.assertEqual(follower_list.page_count, 2)
+        self.assertIsNotNone(follower_list.finish_time)
+        self.assertEqual(follower_list.get_twitter_ids(), [1, 2, 3, 4, 5])
+
+    def test_current_follower_lists(self):
+
+        from django_twitter.managers import ingest_profile_list_batch
+
+        first = self.TwitterProfile.objects.create(twitter_id="2000")
+        second = self.TwitterProfile.objects.create(twitter_id="2001")
+        empty = self.TwitterProfile.objects.create(twitter_id="2002")
+        self.assertIsNone(empty.current_follower_list())
+        self.assertEqual(empty.current_followers().count(), 0)
+
+        for twitter_ids in [["1", "2"], ["2", "3", "4"]]:
+            follower_list = self.TwitterFollowerList.objects.create(profile=first)
+            ingest_profile_list_batch(follower_list, twitter_ids)
+            follower_list.finish()
+        compact = self.TwitterFollowerList.objects.create(profile=second)
+        compact.finish(twitter_ids=[4, 5])
+
+        profiles = self.TwitterProfile.objects.filter(pk__in=[first.pk, second.pk, empty.pk])
+        current = self.TwitterFollowerList.objects.current_lists(profiles)
+        self.assertEqual(
+            set(current.values_list("pk", flat=True)),
+            set([first.current_follower_list().pk, compact.pk]),
+        )
+        self.assertEqual(
+            dict(self.TwitterFollowerList.objects.iterate_current_twitter_ids(profiles)),
+            {first.pk: [2, 3, 4], second.pk: [4, 5]},
+        )
+        self.assertEqual(second.current_followers().count(), 1)
+
+    def test_follower_churn(self):
+
+        from django_twitter.managers import ingest_profile_list_batch
+
+        profile = self.TwitterProfile.objects.create(twitter_id="3000")
+        lists = []
+        for twitter_ids in [["1", "2", "3"], ["2", "3", "4", "5"]]:
+            follower_list = self.TwitterFollowerList.objects.create(profile=profile)
+            ingest_profile_list_batch(follower_list, twitter_ids)
+            follower_list.finish()
+            lists.append(follower_list)
+        self.assertEqual(lists[1].get_changes(), ([4, 5], [1]))
+        self.assertEqual(lists[0].get_changes(), ([1, 2, 3], []))
+
+        compact = self.TwitterFollowerList.objects.create(profile=profile)
+        compact.finish(twitter_ids=[2, 3, 4, 5, 6])
+        self.assertEqual(compact.get_changes(), ([6], []))
+        self.assertEqual(compact.churn.added_twitter_ids, [6])
+        self.assertEqual(lists[1].churn.added_count, 2)
+        self.assertEqual(lists[1].churn.removed_twitter_ids, [1])
+
+        lists[1].delete()
+        compact.churn.refresh_from_db()
+        self.assertEqual(compact.churn.added_twitter_ids, [4, 5, 6])
+        self.assertEqual(compact.churn.removed_twitter_ids, [1])
+
+    def test_follower_graph(self):
+
+        import tempfile
+        import numpy as np
+        from scipy import sparse
+        from django_twitter.graph import FollowerGraph
+        from django_twitter.managers import ingest_profile_list_batch
+
+        profiles = {}
+        for twitter_id in ["101", "102", "103", "104"]:
+            profiles[twitter_id] = self.TwitterProfile.objects.create(
+                twitter_id=twitter_id
+            )
+        follower_list = self.TwitterFollowerList.objects.create(profile=profiles["101"])
+        ingest_profile_list_batch(follower_list, ["102", "103", "1", "2"])
+        follower_list.finish()
+        for twitter_id, twitter_ids in [
+            ("102", [101, 103, 1, 2, 3]),
+            ("103", [101, 2]),
+        ]:
+            follower_list = self.TwitterFollowerList.objects.create(
+                profile=profiles[twitter_id]
+            )
+            follower_list.finish(twitter_ids=twitter_ids)
+        queryset = self.TwitterProfile.objects.filter(twitter_id__in=profiles.keys())
+
+        cache_path = os.path.join(tempfile.mkdtemp(), "graph.npz")
+        graph = FollowerGraph.from_profiles(queryset, cache_path=cache_path)
+        self.assertEqual(list(graph.profile_ids), ["101", "102", "103", "104"])
+        self.assertEqual(list(graph.node_ids), [1, 2, 3, 101, 102, 103])
+
+        overlap = graph.overlap_matrix()
+        self.assertEqual(
+            overlap.values.tolist(),
+            [[4, 3, 1, 0], [3, 5, 2, 0], [1, 2, 2, 0], [0, 0, 0, 0]],
+        )
+        jaccard = graph.overlap_matrix(normalize="jaccard")
+        self.assertAlmostEqual(jaccard.loc["101", "102"], 0.5)
+        self.assertAlmostEqual(jaccard.loc["101", "103"], 0.2)
+        self.assertAlmostEqual(jaccard.loc["102", "103"], 0.4)
+        self.assertAlmostEqual(jaccard.loc["102", "102"], 1.0)
+        self.assertEqual(jaccard.loc["104", "104"], 0)
+
+        degree = graph.in_set_degree()
+        self.assertEqual(degree["in_set"].tolist(), [2, 2, 1, 0])
+        self.assertEqual(degree["on_lists"].tolist(), [2, 1, 2, 0])
+
+        reciprocity = graph.reciprocity()
+        self.assertEqual(reciprocity["mutual"].tolist(), [2, 1, 1, 0])
+        self.assertEqual(reciprocity["reciprocity"].tolist(), [1.0, 0.5, 1.0, 0.0])
+
+        top = graph.top_shared()
+        self.assertEqual(list(top.index), ["2", "1", "101", "103"])
+        self.assertEqual(top.tolist(), [3, 2, 2, 2])
+        self.assertEqual(list(graph.top_shared(n=2).index), ["2", "1"])
+
+        # The cached graph gets used as long as the same lists are current
+        FollowerGraph(
+            graph.profile_ids,
+            graph.node_ids[:1],
+            sparse.csr_matrix((4, 1)),
+            list_ids=graph.list_ids,
+        ).save(cache_path)
+        cached = FollowerGraph.from_profiles(queryset, cache_path=cache_path)
+        self.assertEqual(list(cached.node_ids), [1])
+
+        # Once a new list is finished, the graph gets rebuilt and the cache overwritten
+        follower_list = self.TwitterFollowerList.objects.create(profile=profiles["104"])
+        follower_list.finish(twitter_ids=[1, 101])
+        rebuilt = FollowerGraph.from_profiles(queryset, cache_path=cache_path)
+        self.assertEqual(len(rebuilt.list_ids), 4)
+        self.assertEqual(list(rebuilt.node_ids), [1, 2, 3, 101, 102, 103])
+        self.assertEqual(rebuilt.in_set_degree()["on_lists"].tolist(), [3, 1, 2, 0])
+        self.assertTrue(
+            np.array_equal(FollowerGraph.load(cache_path).list_ids, rebuilt.list_ids)
+        )
+
+    def test_tweet_text_assembly(self):
+
+        from django_twitter.parsers import get_tweet_text
+
+        # Expected values are the output of the original SequenceMatcher-based implementation
+        full = "A new Pew Research Center survey finds that most Americans say social media companies have too much power and influence in politics today https://t.co/abc123XYZ0"
+        quote = "How Americans get their news on social media"
+        plain = "Most U.S. adults get news from digital devices https://t.co/q1w2e3r4t5"
+        truncated = full[:100] + "\u2026 https://t.co/zzzzzzzzzz"
+        retweet = ("RT @pewresearch: " + full)[:139] + "\u2026"
+        corpus = [
+            ({"full_text": plain}, plain),
+            ({"text": plain}, plain),
+            (
+                {"text": truncated, "extended_tweet": {"full_text": full}},
+                " ".join([truncated, full]),
+            ),
+            (
+                {"full_text": retweet, "retweeted_status": {"full_text": full}},
+                "RT @pewresearch: " + full,
+            ),
+            (
+                {
+                    "full_text": "RT @pewresearch: " + quote,
+                    "retweeted_status": {"full_text": quote},
+                },
+                "RT @pewresearch: " + quote,
+            ),
+            (
+                {
+                    "text": retweet,
+                    "retweeted_status": {
+                        "text": truncated,
+                        "extended_tweet": {"full_text": full},
+                    },
+                },
+                " ".join([truncated, "RT @pewresearch: " + full]),
+            ),
+            (
+                {
+                    "full_text": "Worth a read https://t.co/yyyyyyyyyy",
+                    "quoted_status": {"full_text": quote},
+                },
+                "Worth a read https://t.co/yyyyyyyyyy " + quote,
+            ),
+            (
+                {
+                    "full_text": "RT @pewmethods: Worth a read https://t.co/yyyyyyyyyy",
+                    "retweeted_status": {
+                        "full_text": "Worth a read https://t.co/yyyyyyyyyy",
+                        "quoted_status": {"full_text": quote},
+                    },
+                },
+                quote + " RT @pewmethods: Worth a read https://t.co/yyyyyyyyyy",
+            ),
+            ({}, None),
+        ]
+        for tweet_data, expected in corpus:
+            self.assertEqual(get_tweet_text(tweet_data), expected)
+
+    def test_flatten_tweet_json(self):
+
+        from django_twitter.parsers import flatten_tweet_json
+
+        original = {"id_str": "1", "user": {"id_str": "10"}, "retweet_count": 1}
+        updated = {"id_str": "1", "user": {"id_str": "10"}, "retweet_count": 2}
+        quote = {"id_str": "2", "user": {"id_str": "20"}, "quoted_status": original}
+        retweet = {"id_str": "3", "user": {"id_str": "30"}, "retweeted_status": quote}
+        tweets, users = flatten_tweet_json(
+            [retweet, {"id_str": "4", "user": {"id_str": "10"}, "retweeted_status": updated}]
+        )
+        self.assertEqual(list(tweets.keys()), ["1", "2", "3", "4"])
+        self.assertEqual(tweets["1"]["retweet_count"], 2)
+        self.assertEqual(sorted(users.keys()), ["10", "20", "30"])
+
     def test_multiprocessing_race_condition(self):
 
         from django_pewtils import reset_django_connection